@@ -0,0 +1,166 @@
+"""Packet-in admission control
+
+PacketInAdmission sits in front of packet_in_handler and decides, before
+a packet is parsed, whether it is worth handling at all:
+
+1. an identical frame from the same datapath seen less than
+   `duplicate_window` seconds ago is dropped (repeated gratuitous ARPs,
+   retransmitted requests for an unknown target, ...);
+2. every source MAC has a token bucket, so one chatty host cannot starve
+   the others;
+3. every datapath has a token bucket, so one switch cannot starve the
+   controller.
+
+Dropped packets are counted per reason.  Switches speaking OpenFlow 1.3
+can additionally meter their controller-bound traffic (see
+OfCtl_v1_3.set_meter), which caps a storm before it reaches the
+controller at all.
+
+"""
+
+import time
+
+
+class TokenBucket():
+    """
+    :param rate: tokens added per second
+    :param burst: bucket size
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def take(self, now: float) -> bool:
+        """Remove one token if there is one"""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def idle(self, now: float) -> bool:
+        """True once the bucket has refilled, i.e. it is as good as a new one"""
+        return self.tokens + (now - self.stamp) * self.rate >= self.burst
+
+
+class AdmissionStats():
+    """What was admitted and what was dropped, and why"""
+
+    def __init__(self):
+        self.admitted = 0
+        self.duplicate = 0
+        self.source_rate = 0
+        self.switch_rate = 0
+
+    def dropped(self):
+        return self.duplicate + self.source_rate + self.switch_rate
+
+    def as_dict(self):
+        return {
+            'admitted': self.admitted,
+            'dropped': self.dropped(),
+            'duplicate': self.duplicate,
+            'source_rate': self.source_rate,
+            'switch_rate': self.switch_rate,
+        }
+
+
+class PacketInAdmission():
+    """
+    :param switch_rate: packet-ins per second accepted from one datapath (0: unlimited)
+    :param source_rate: packet-ins per second accepted from one source MAC (0: unlimited)
+    :param duplicate_window: seconds during which an identical frame is dropped (0: off)
+    :param report_interval: minimum seconds between two drop reports in the log
+    """
+
+    def __init__(self, switch_rate=1000.0, source_rate=100.0, duplicate_window=0.5,
+                 logger=None, report_interval=10.0, clock=time.monotonic):
+        self.switch_rate = switch_rate
+        self.source_rate = source_rate
+        self.duplicate_window = duplicate_window
+        self.logger = logger
+        self.report_interval = report_interval
+        self.clock = clock
+
+        self.switch_buckets = {}  # dpid : TokenBucket
+        self.source_buckets = {}  # source MAC (6 bytes) : TokenBucket
+        self.recent = {}  # (dpid, frame) : time it was last admitted
+        self.stats = AdmissionStats()
+        self.per_switch = {}  # dpid : AdmissionStats
+
+        self._last_sweep = clock()
+        self._last_report = self._last_sweep
+        self._reported_drops = 0
+
+    def admit(self, dpid: int, data) -> bool:
+        """Decide whether the packet-in carrying frame `data` from `dpid` gets handled"""
+        now = self.clock()
+        if now - self._last_sweep >= max(self.duplicate_window, 1.0):
+            self._sweep(now)
+
+        stats = self.per_switch.get(dpid)
+        if stats is None:
+            stats = self.per_switch[dpid] = AdmissionStats()
+
+        if self.duplicate_window:
+            key = (dpid, bytes(data))
+            seen = self.recent.get(key)
+            if seen is not None and now - seen < self.duplicate_window:
+                return self._drop(stats, 'duplicate', now)
+
+        if self.source_rate:
+            src = bytes(data[6:12])
+            bucket = self.source_buckets.get(src)
+            if bucket is None:
+                bucket = self.source_buckets[src] = TokenBucket(self.source_rate,
+                                                                max(self.source_rate, 1), now)
+            if not bucket.take(now):
+                return self._drop(stats, 'source_rate', now)
+
+        if self.switch_rate:
+            bucket = self.switch_buckets.get(dpid)
+            if bucket is None:
+                bucket = self.switch_buckets[dpid] = TokenBucket(self.switch_rate,
+                                                                 max(self.switch_rate, 1), now)
+            if not bucket.take(now):
+                return self._drop(stats, 'switch_rate', now)
+
+        if self.duplicate_window:
+            self.recent[key] = now
+        stats.admitted += 1
+        self.stats.admitted += 1
+        return True
+
+    def forget(self, dpid: int):
+        """Drop the state of a datapath that left"""
+        self.switch_buckets.pop(dpid, None)
+        self.per_switch.pop(dpid, None)
+        for key in [key for key in self.recent if key[0] == dpid]:
+            del self.recent[key]
+
+    def _drop(self, stats: AdmissionStats, reason: str, now: float) -> bool:
+        setattr(stats, reason, getattr(stats, reason) + 1)
+        setattr(self.stats, reason, getattr(self.stats, reason) + 1)
+        if self.logger is not None and now - self._last_report >= self.report_interval:
+            dropped = self.stats.dropped()
+            self.logger.warning("Packet-in admission dropped %d packets in the last %.0f s "
+                                "(total: %d duplicate, %d source rate, %d switch rate)",
+                                dropped - self._reported_drops, now - self._last_report,
+                                self.stats.duplicate, self.stats.source_rate, self.stats.switch_rate)
+            self._last_report = now
+            self._reported_drops = dropped
+        return False
+
+    def _sweep(self, now: float):
+        """Forget expired duplicates and source buckets that are full again"""
+        self._last_sweep = now
+        window = self.duplicate_window
+        self.recent = {key: seen for key, seen in self.recent.items() if now - seen < window}
+        self.source_buckets = {src: bucket for src, bucket in self.source_buckets.items()
+                               if not bucket.idle(now)}
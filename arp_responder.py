@@ -0,0 +1,78 @@
+"""ARP proxy with prebuilt reply frames
+
+ArpResponder keeps {ip: host} in a dict, so answering a request is one
+lookup instead of a scan of every known address.  Everything in a reply
+that depends only on the host (its MAC and IP, the ARP header constants)
+is packed once when the host is learned.  A reply is then produced by
+copying those bytes and the requester's address fields into one reusable
+60 byte buffer; no ryu packet objects are built or serialized.
+
+Requests come in as packet_parser.FrameInfo, untagged or tagged.
+Replies are always sent untagged, like OfCtl.send_arp with VLANID_NONE.
+
+"""
+
+import socket
+import struct
+
+from packet_parser import ETH_HEADER, ETH_TYPE_ARP, ETH_TYPE_IP, ARP_REPLY, FrameInfo
+
+FRAME_LEN = 60  # minimum Ethernet frame without FCS, the tail is zero padding
+
+# Offsets inside the untagged reply frame
+_ETH_DST = 0
+_ETH_SRC = 6
+_ARP = ETH_HEADER.size  # 14
+_ARP_THA = _ARP + 18  # 32
+_ARP_TPA = _ARP + 24  # 38
+_ARP_FIXED = struct.pack('!HHBBH', 1, ETH_TYPE_IP, 6, 4, ARP_REPLY)
+
+
+class ArpResponder():
+    """
+    Answer ARP requests for known hosts from precomputed frames.
+
+    hosts[ip_bytes] is (mac_bytes, sender_fields), where sender_fields is
+    the prepacked ARP header up to and including the sender address.
+    """
+
+    def __init__(self):
+        self.hosts = {}  # 4 byte IP : (6 byte MAC, 18 byte ARP header + sender)
+        self.buffer = bytearray(FRAME_LEN)
+        self.buffer[12:14] = struct.pack('!H', ETH_TYPE_ARP)
+        self.replies = 0
+        self.misses = 0
+
+    def learn(self, ip: str, mac: str):
+        """Remember that ip is at mac (both in text form)"""
+        mac_bin = bytes.fromhex(mac.replace(':', ''))
+        ip_bin = socket.inet_aton(ip)
+        self.hosts[ip_bin] = (mac_bin, _ARP_FIXED + mac_bin + ip_bin)
+
+    def forget(self, ip: str):
+        self.hosts.pop(socket.inet_aton(ip), None)
+
+    def lookup(self, ip: str) -> str:
+        """MAC of a known ip in text form, None if unknown"""
+        entry = self.hosts.get(socket.inet_aton(ip))
+        return None if entry is None else entry[0].hex(':')
+
+    def reply(self, request: FrameInfo):
+        """
+        Build the reply to a parsed ARP request in the shared buffer.
+        :return: the buffer (valid until the next call), or None if the
+                 target address is unknown
+        """
+        entry = self.hosts.get(request.arp_tpa)
+        if entry is None:
+            self.misses += 1
+            return None
+        mac, sender = entry
+        buf = self.buffer
+        buf[_ETH_DST:_ETH_DST + 6] = request.arp_sha
+        buf[_ETH_SRC:_ETH_SRC + 6] = mac
+        buf[_ARP:_ARP_THA] = sender
+        buf[_ARP_THA:_ARP_TPA] = request.arp_sha
+        buf[_ARP_TPA:_ARP_TPA + 4] = request.arp_spa
+        self.replies += 1
+        return buf
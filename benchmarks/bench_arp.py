@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Benchmark ARP replies per second on one controller core
+
+Usage:  python3 benchmarks/bench_arp.py [host counts ...]
+
+For every host count a table of hosts is learned and a stream of ARP
+requests for random known hosts is answered, with
+
+legacy -- the original packet_in path: packet.Packet() parse, a scan of
+          every key of ip_host_mac, and a ryu packet built and
+          serialized for the reply (needs ryu)
+new    -- packet_parser.parse_frame() + ArpResponder.reply()
+
+Only the frame handling is timed; sending the packet out is the same for
+both.
+
+"""
+
+import os
+import random
+import socket
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from arp_responder import ArpResponder  # noqa: E402
+from packet_parser import parse_frame  # noqa: E402
+
+try:
+    from ryu.lib.packet import packet, ethernet, arp
+    from ryu.ofproto import ether
+except ImportError:
+    packet = None
+
+REQUESTS = 100000
+
+
+def make_hosts(n):
+    hosts = {}
+    for i in range(n):
+        ip = socket.inet_ntoa(struct.pack('!I', 0x0a000000 + i + 1))
+        hosts[ip] = '02:00:{:02x}:{:02x}:{:02x}:{:02x}'.format(*struct.pack('!I', i + 1))
+    return hosts
+
+
+def make_requests(hosts, count, seed=1):
+    rnd = random.Random(seed)
+    ips = list(hosts)
+    requester_mac = bytes.fromhex('02ffffffff01')
+    requester_ip = socket.inet_aton('10.255.255.254')
+    frames = []
+    for _ in range(count):
+        target = socket.inet_aton(rnd.choice(ips))
+        frame = b'\xff' * 6 + requester_mac + struct.pack('!H', 0x0806) + \
+            struct.pack('!HHBBH6s4s6s4s', 1, 0x0800, 6, 4, 1,
+                        requester_mac, requester_ip, b'\x00' * 6, target)
+        frames.append(frame + b'\x00' * (60 - len(frame)))
+    return frames
+
+
+def legacy(ip_host_mac, frames):
+    for data in frames:
+        pkt = packet.Packet(data)
+        arp_msg = pkt.get_protocols(arp.arp)[0]
+        mac_answer = 0
+        for ip in ip_host_mac:
+            if ip == arp_msg.dst_ip:
+                mac_answer = ip_host_mac[ip]
+                break
+        reply = packet.Packet()
+        reply.add_protocol(ethernet.ethernet(arp_msg.src_mac, mac_answer, ether.ETH_TYPE_ARP))
+        reply.add_protocol(arp.arp(1, ether.ETH_TYPE_IP, 6, 4, arp.ARP_REPLY,
+                                   mac_answer, arp_msg.dst_ip, arp_msg.src_mac, arp_msg.src_ip))
+        reply.serialize()
+
+
+def new(responder, frames):
+    for data in frames:
+        frame = parse_frame(data)
+        if frame.is_arp_request():
+            responder.reply(frame)
+
+
+def rate(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return REQUESTS / (time.perf_counter() - start)
+
+
+def main(counts):
+    print("{:>7} | {:>14} {:>14} {:>8}".format("hosts", "legacy/s", "new/s", "speedup"))
+    for n in counts:
+        hosts = make_hosts(n)
+        frames = make_requests(hosts, REQUESTS)
+        responder = ArpResponder()
+        for ip, mac in hosts.items():
+            responder.learn(ip, mac)
+        new_rate = rate(new, responder, frames)
+        assert responder.replies == REQUESTS
+        if packet is None:
+            print("{:>7} | {:>14} {:>14.0f} {:>8}".format(n, "n/a (no ryu)", new_rate, "-"))
+            continue
+        legacy_rate = rate(legacy, hosts, frames)
+        print("{:>7} | {:>14.0f} {:>14.0f} {:>7.1f}x".format(n, legacy_rate, new_rate,
+                                                             new_rate / legacy_rate))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100, 1000, 10000])
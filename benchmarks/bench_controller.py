@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Benchmark the controller app on synthetic fabrics, without a network
+
+Usage:  python3 benchmarks/bench_controller.py [--of 1.0|1.3] [--json FILE]
+                                               [--config-file ryu.conf] [name ...]
+
+ShortestPathSwitching is instantiated on its own and fed the events of a
+generated fabric: every switch is a MockDatapath, which records the
+OpenFlow messages it would have written instead of sending them, and
+MockTopology answers the ryu.topology.api calls that get_topology_data()
+makes.  The real handlers (switch_features_handler, handle_switch_add,
+handle_link_add, handle_host_add, handle_link_delete) get real ryu
+topology events, so a recompute goes through the same path engine,
+flow table, spanning tree, reconcile and serialization code as in a
+Mininet run.  Barrier requests are answered right away.
+
+For every fabric two recomputes are measured:
+
+cold start -- all switches, links and hosts came up at once
+link down  -- one switch link in the middle of the fabric went down
+
+with the wall time of the recompute, the peak memory allocated during
+it (tracemalloc, in a second run so tracing does not skew the times)
+and the number of flow mods and group mods written to the switches.
+--json writes the same numbers to a file, for comparing CI runs.
+
+Options of the app (path-backend, forwarding-mode, ...) are read from
+the ryu configuration file given with --config-file.  Only the inline
+recompute is timed, so leave route-workers at 0.
+
+ryu has to be installed (messages are built and serialized with its
+parsers), but no switch, Mininet or root access is needed.
+
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import logging
+import os
+import struct
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ryu import cfg  # noqa: E402
+from ryu.lib import hub  # noqa: E402
+from ryu.ofproto import ofproto_v1_0, ofproto_v1_0_parser, ofproto_v1_3, ofproto_v1_3_parser  # noqa: E402
+from ryu.topology import event, switches  # noqa: E402
+
+import shortest_paths  # noqa: E402
+import topologies  # noqa: E402
+
+VERSIONS = {'1.0': (ofproto_v1_0, ofproto_v1_0_parser),
+            '1.3': (ofproto_v1_3, ofproto_v1_3_parser)}
+
+OFP_HEADER = struct.Struct('!BBHI')  # version, type, length, xid
+
+# name : builder
+FABRICS = collections.OrderedDict([
+    ('linear 16', lambda: topologies.linear(16, 2)),
+    ('linear 64', lambda: topologies.linear(64, 2)),
+    ('tree 5 fanout 2', lambda: topologies.tree(5, 2)),
+    ('tree 4 fanout 4', lambda: topologies.tree(4, 4)),
+    ('mesh 8', lambda: topologies.mesh(8)),
+    ('mesh 16', lambda: topologies.mesh(16)),
+    ('fat-tree 4', lambda: topologies.fat_tree(4)),
+    ('fat-tree 8', lambda: topologies.fat_tree(8)),
+    ('random 32 x 4', lambda: topologies.random_regular(32, 4)),
+    ('random 128 x 4', lambda: topologies.random_regular(128, 4)),
+])
+
+# The part of an OpenFlow port description ryu.topology.switches.Port reads
+OfpPort = collections.namedtuple('OfpPort', 'port_no hw_addr name config state')
+
+
+class Message():
+    """The attributes of a switch message the handlers read"""
+
+    def __init__(self, datapath, xid=0):
+        self.datapath = datapath
+        self.xid = xid
+
+
+class Event():
+
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class MockDatapath():
+    """
+    Stands in for ryu.controller.controller.Datapath: messages are
+    serialized as usual, then counted by type instead of being sent.
+    """
+
+    def __init__(self, dpid, ofproto, ofproto_parser):
+        self.id = dpid
+        self.ofproto = ofproto
+        self.ofproto_parser = ofproto_parser
+        self.xid = 0
+        self.counts = collections.Counter()  # message type name : messages written
+        self.bytes = 0
+        self.barriers = []  # xids of the barrier requests not answered yet
+        self._types = {value: name for name, value in vars(ofproto).items()
+                       if name.startswith('OFPT_')}
+
+    def set_xid(self, msg):
+        self.xid = (self.xid + 1) & 0xffffffff
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        return self.send(msg.buf)
+
+    def send(self, buf):
+        """Account for every OpenFlow message in buf"""
+        offset = 0
+        while offset < len(buf):
+            _, msg_type, length, xid = OFP_HEADER.unpack_from(buf, offset)
+            name = self._types.get(msg_type, str(msg_type))
+            self.counts[name] += 1
+            if name == 'OFPT_BARRIER_REQUEST':
+                self.barriers.append(xid)
+            offset += length
+        self.bytes += len(buf)
+        return True
+
+    def send_packet_out(self, buffer_id, in_port, actions, data=None):
+        self.send_msg(self.ofproto_parser.OFPPacketOut(self, buffer_id, in_port, actions, data))
+
+
+class MockTopology():
+    """Answers the ryu.topology.api calls of get_topology_data() from its own lists"""
+
+    def __init__(self):
+        self.switches = {}  # dpid : switches.Switch
+        self.links = {}  # (src_dpid, dst_dpid) : switches.Link
+
+    def get_switch(self, app, dpid=None):
+        if dpid is None:
+            return list(self.switches.values())
+        return [self.switches[dpid]] if dpid in self.switches else []
+
+    def get_link(self, app, dpid=None):
+        return [link for link in self.links.values() if dpid is None or link.src.dpid == dpid]
+
+
+def hw_addr(dpid, port_no):
+    return '02:{:02x}:{:02x}:{:02x}:{:02x}:{:02x}'.format(
+        dpid >> 16 & 0xff, dpid >> 8 & 0xff, dpid & 0xff, port_no >> 8 & 0xff, port_no & 0xff)
+
+
+class Harness():
+    """One controller app driving one synthetic fabric"""
+
+    def __init__(self, topo, version):
+        ofproto, parser = VERSIONS[version]
+        self.topo = topo
+        self.api = MockTopology()
+        shortest_paths.topo = self.api
+        # nothing answers the flow stats requests a MockDatapath gets
+        cfg.CONF.set_override('adopt_flows', False)
+        self.app = shortest_paths.ShortestPathSwitching()
+        self.app.logger.setLevel(logging.ERROR)
+        self.datapaths = {dpid: MockDatapath(dpid, ofproto, parser) for dpid in topo.switches}
+        self.ports = {}  # (dpid, port_no) : switches.Port
+
+        switch_ports = collections.defaultdict(list)
+        for u, v, pu, pv in topo.links:
+            switch_ports[u].append(pu)
+            switch_ports[v].append(pv)
+        for _, dpid, port_no in topo.host_links:
+            switch_ports[dpid].append(port_no)
+        for dpid, dp in self.datapaths.items():
+            switch = switches.Switch(dp)
+            for port_no in sorted(switch_ports[dpid]):
+                switch.add_port(OfpPort(port_no, hw_addr(dpid, port_no),
+                                        's{}-eth{}'.format(dpid, port_no), 0, 0))
+            for port in switch.ports:
+                self.ports[(dpid, port.port_no)] = port
+            self.api.switches[dpid] = switch
+
+    def connect(self):
+        """Bring up every switch, then the links, then the hosts"""
+        for dpid, switch in self.api.switches.items():
+            self.app.switch_features_handler(Event(Message(self.datapaths[dpid])))
+            self.app.handle_switch_add(event.EventSwitchEnter(switch))
+        for u, v, pu, pv in self.topo.links:
+            for src, dst in (((u, pu), (v, pv)), ((v, pv), (u, pu))):
+                link = switches.Link(self.ports[src], self.ports[dst])
+                self.api.links[(src[0], dst[0])] = link
+                self.app.handle_link_add(event.EventLinkAdd(link))
+        for name, dpid, port_no in self.topo.host_links:
+            mac, ip = self.topo.hosts[name]
+            host = switches.Host(mac, self.ports[(dpid, port_no)])
+            host.ipv4.append(ip)
+            self.app.handle_host_add(event.EventHostAdd(host))
+
+    def fail_link(self, u, v):
+        """Take the switch link u <-> v down, in both directions"""
+        for key in ((u, v), (v, u)):
+            self.app.handle_link_delete(event.EventLinkDelete(self.api.links.pop(key)))
+
+    def recompute(self, trace=False) -> dict:
+        """Run the pending recompute and answer its barriers"""
+        for dp in self.datapaths.values():
+            dp.counts.clear()
+            dp.bytes = 0
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        self.app.scheduler.flush()
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        for dp in self.datapaths.values():
+            for xid in dp.barriers:
+                self.app.barrier_reply_handler(Event(Message(dp, xid)))
+            dp.barriers = []
+        hub.sleep(0)  # let wait_convergence() see the replies
+
+        counts = collections.Counter()
+        for dp in self.datapaths.values():
+            counts.update(dp.counts)
+        return {'seconds': elapsed,
+                'peak_bytes': peak,
+                'flow_mods': counts['OFPT_FLOW_MOD'],
+                'group_mods': counts['OFPT_GROUP_MOD'],
+                'messages': sum(counts.values()),
+                'bytes': sum(dp.bytes for dp in self.datapaths.values())}
+
+
+def scenario(topo, version, trace=False) -> dict:
+    """Cold start, then one link failure"""
+    harness = Harness(topo, version)
+    harness.connect()
+    results = {'cold start': harness.recompute(trace)}
+    if topo.links:
+        u, v, _, _ = topo.links[len(topo.links) // 2]
+        harness.fail_link(u, v)
+        results['link down'] = harness.recompute(trace)
+    return results
+
+
+def measure(topo, version) -> dict:
+    # The app prints the topology and every path on each recompute
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results = scenario(topo, version)
+        traced = scenario(topo, version, trace=True)
+    for phase, result in results.items():
+        result['peak_bytes'] = traced[phase]['peak_bytes']
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark recomputes on synthetic fabrics")
+    parser.add_argument('names', nargs='*', help="fabrics to run (default: all of them)")
+    parser.add_argument('--of', default='1.3', choices=sorted(VERSIONS),
+                        help="OpenFlow version of the mock switches")
+    parser.add_argument('--json', help="also write the results to this file")
+    args, ryu_args = parser.parse_known_args(argv)
+    cfg.CONF(args=ryu_args, project='ryu', default_config_files=[])
+    logging.basicConfig(level=logging.ERROR)
+
+    names = args.names or list(FABRICS)
+    unknown = [name for name in names if name not in FABRICS]
+    if unknown:
+        parser.error("unknown fabric(s): {} (choose from: {})".format(
+            ", ".join(unknown), ", ".join(FABRICS)))
+
+    print("OpenFlow {}, path backend {}, forwarding mode {}".format(
+        args.of, cfg.CONF.path_backend, cfg.CONF.forwarding_mode))
+    print("{:<16} {:>8} {:>5} {:>5} | {:<10} {:>10} {:>11} {:>9} {:>10}".format(
+        "fabric", "switches", "hosts", "links", "", "recompute", "peak", "flow mods", "group mods"))
+    report = []
+    for name in names:
+        topo = FABRICS[name]()
+        results = measure(topo, args.of)
+        for phase, result in results.items():
+            print("{:<16} {:>8} {:>5} {:>5} | {:<10} {:>7.1f} ms {:>7.0f} KiB {:>9} {:>10}".format(
+                name, len(topo.switches), len(topo.hosts), len(topo.links), phase,
+                result['seconds'] * 1000, result['peak_bytes'] / 1024,
+                result['flow_mods'], result['group_mods']))
+            report.append(dict(result, fabric=name, phase=phase, switches=len(topo.switches),
+                               hosts=len(topo.hosts), links=len(topo.links), of=args.of))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
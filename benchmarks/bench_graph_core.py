@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Benchmark the CSR/heapq graph core against the original PriorityQueue code
+
+Usage:  python3 benchmarks/bench_graph_core.py [sizes ...]
+
+For every fabric size a random connected graph (a ring plus random
+chords, average degree ~4) is built and single source Dijkstra, Prim and
+the tree query are timed with both implementations.
+
+"""
+
+import os
+import random
+import sys
+import time
+from queue import PriorityQueue, Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from graph_core import Graph  # noqa: E402
+
+INF = 0x3f3f3f3f
+
+
+class node:
+    def __init__(self, id, w):
+        self.id = id
+        self.w = w
+
+    def __lt__(self, other):
+        return True if self.w < other.w else False
+
+
+def legacy_dijkstra(n, S, para_edges):
+    Graph = [[] for i in range(n + 1)]
+    for u, v in para_edges:
+        Graph[u].append(node(v, 1))
+    dis = [INF for i in range(n + 1)]
+    dis[S] = 0
+    via = {}
+    pre = [0 for i in range(n + 1)]
+    paths = [[] for i in range(n + 1)]
+    paths[S].append(S)
+    pq = PriorityQueue()
+    pq.put(node(S, 0))
+    while not pq.empty():
+        top = pq.get()
+        if dis[top.id] < top.w:
+            continue
+        if top.id != S:
+            paths[top.id] = paths[pre[top.id]].copy()
+            paths[top.id].append(top.id)
+        for i in Graph[top.id]:
+            if dis[i.id] > dis[top.id] + i.w:
+                dis[i.id] = dis[top.id] + i.w
+                pre[i.id] = top.id
+                via[i.id] = via[top.id] if top.id != S else i.id
+                pq.put(node(i.id, dis[i.id]))
+    return via, paths
+
+
+def legacy_prim(n, S, para_edges):
+    Graph = [[] for i in range(n + 1)]
+    for u, v in para_edges:
+        Graph[u].append(node(v, 1))
+    dis = [INF for i in range(n + 1)]
+    dis[S] = 0
+    pre = [-1] * (n + 1)
+    pq = PriorityQueue()
+    pq.put(node(S, 0))
+    while not pq.empty():
+        top = pq.get()
+        for i in Graph[top.id]:
+            if dis[i.id] > i.w:
+                dis[i.id] = i.w
+                pre[i.id] = top.id
+                pq.put(node(i.id, dis[i.id]))
+    tree_edges = []
+    for i in range(n + 1):
+        if pre[i] != -1:
+            tree_edges.append((i, pre[i]))
+            tree_edges.append((pre[i], i))
+    return tree_edges
+
+
+def legacy_query(n, S, tree_edges):
+    Graph = [[] for i in range(n + 1)]
+    for u, v in tree_edges:
+        Graph[u].append(node(v, 1))
+    neighbours = {i: [] for i in range(n + 1)}
+    q = Queue()
+    q.put(node(S, -1))
+    while not q.empty():
+        top = q.get()
+        for i in Graph[top.id]:
+            if i.id != top.w:
+                neighbours[top.id].append(i.id)
+                q.put(node(i.id, top.id))
+    return neighbours
+
+
+def random_fabric(n, degree=4, seed=1):
+    rnd = random.Random(seed)
+    edges = set()
+    for u in range(1, n + 1):
+        v = u % n + 1
+        edges.add((u, v))
+        edges.add((v, u))
+    while len(edges) < n * degree:
+        u, v = rnd.randint(1, n), rnd.randint(1, n)
+        if u != v:
+            edges.add((u, v))
+            edges.add((v, u))
+    return sorted(edges)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def new_dijkstra(edges, S):
+    graph = Graph(edges)
+    dist, pred = graph.dijkstra(S)
+    return graph.first_hops(S, dist, pred)
+
+
+def new_prim(edges, S):
+    return Graph(edges).prim(S)
+
+
+def new_query(tree, S):
+    return Graph(tree).bfs_children(S)
+
+
+def main(sizes):
+    print("{:>7} {:>10} | {:>11} {:>11} {:>7} | {:>11} {:>11} {:>7} | {:>11} {:>11} {:>7}".format(
+        "switches", "links", "dijkstra", "heapq", "x", "prim", "heapq", "x", "query", "csr", "x"))
+    for n in sizes:
+        edges = random_fabric(n)
+        t_old_d, _ = timed(legacy_dijkstra, n, 1, edges)
+        t_new_d, _ = timed(new_dijkstra, edges, 1)
+        t_old_p, tree = timed(legacy_prim, n, 1, edges)
+        t_new_p, _ = timed(new_prim, edges, 1)
+        t_old_q, _ = timed(legacy_query, n, 1, tree)
+        t_new_q, _ = timed(new_query, tree, 1)
+        print("{:>8} {:>10} | {:>9.1f}ms {:>9.1f}ms {:>6.1f}x | {:>9.1f}ms {:>9.1f}ms {:>6.1f}x | "
+              "{:>9.1f}ms {:>9.1f}ms {:>6.1f}x".format(
+                  n, len(edges),
+                  t_old_d * 1e3, t_new_d * 1e3, t_old_d / t_new_d,
+                  t_old_p * 1e3, t_new_p * 1e3, t_old_p / t_new_p,
+                  t_old_q * 1e3, t_new_q * 1e3, t_old_q / t_new_q))
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 2000, 5000, 10000])
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Benchmark the fast path packet-in parser against full ryu decoding
+
+Usage:  python3 benchmarks/bench_packet_parser.py [corpus.pcap]
+
+The corpus is a classic libpcap file of recorded packet-ins (for example
+`tcpdump -w corpus.pcap` on a controller-facing port, or the packet-ins
+dumped by a Mininet run).  Without one, a synthetic corpus is generated
+with the mix a fresh fabric sends to the controller: mostly ARP requests
+and replies, some of them VLAN tagged, plus IPv4/ICMP, IPv6 neighbour
+discovery and LLDP frames.
+
+Both parsers extract what packet_in_handler needs: the ethertype and,
+for ARP, the opcode and addresses.
+
+"""
+
+import os
+import random
+import socket
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from packet_parser import parse_frame  # noqa: E402
+
+try:
+    from ryu.lib.packet import packet, ethernet, arp
+except ImportError:
+    packet = None
+
+PCAP_HEADER = struct.Struct('<IHHiIII')
+ROUNDS = 5
+
+
+def read_pcap(path):
+    """Frames of a libpcap file (either byte order, Ethernet link type)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic = struct.unpack_from('<I', data, 0)[0]
+    endian = '<' if magic in (0xa1b2c3d4, 0xa1b23c4d) else '>'
+    record = struct.Struct(endian + 'IIII')
+    frames = []
+    offset = PCAP_HEADER.size
+    while offset + record.size <= len(data):
+        _, _, caplen, _ = record.unpack_from(data, offset)
+        offset += record.size
+        frames.append(data[offset:offset + caplen])
+        offset += caplen
+    return frames
+
+
+def arp_frame(rnd, opcode, vlan=None):
+    src = bytes([2, 0]) + rnd.getrandbits(32).to_bytes(4, 'big')
+    dst = b'\xff' * 6 if opcode == 1 else bytes([2, 0]) + rnd.getrandbits(32).to_bytes(4, 'big')
+    spa = socket.inet_aton('10.0.{}.{}'.format(rnd.randrange(256), rnd.randrange(1, 255)))
+    tpa = socket.inet_aton('10.0.{}.{}'.format(rnd.randrange(256), rnd.randrange(1, 255)))
+    tha = b'\x00' * 6 if opcode == 1 else dst
+    header = dst + src
+    if vlan is not None:
+        header += struct.pack('!HH', 0x8100, vlan)
+    frame = header + struct.pack('!H', 0x0806) + \
+        struct.pack('!HHBBH6s4s6s4s', 1, 0x0800, 6, 4, opcode, src, spa, tha, tpa)
+    return frame + b'\x00' * max(0, 60 - len(frame))
+
+
+def ipv4_icmp_frame(rnd):
+    src = bytes([2, 0]) + rnd.getrandbits(32).to_bytes(4, 'big')
+    dst = bytes([2, 0]) + rnd.getrandbits(32).to_bytes(4, 'big')
+    payload = struct.pack('!BBHHH', 8, 0, 0, rnd.getrandbits(16), 1) + bytes(56)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(payload), 0, 0, 64, 1, 0,
+                     socket.inet_aton('10.0.0.1'), socket.inet_aton('10.0.0.2'))
+    return dst + src + struct.pack('!H', 0x0800) + ip + payload
+
+
+def ipv6_nd_frame(rnd):
+    src = bytes([2, 0]) + rnd.getrandbits(32).to_bytes(4, 'big')
+    dst = bytes.fromhex('3333ff000001')
+    payload = struct.pack('!BBH4x', 135, 0, 0) + bytes(16) + bytes([1, 1]) + src
+    ip6 = struct.pack('!IHBB16s16s', 6 << 28, len(payload), 58, 255, bytes(16), bytes(16))
+    return dst + src + struct.pack('!H', 0x86dd) + ip6 + payload
+
+
+def lldp_frame(rnd):
+    src = bytes([2, 0]) + rnd.getrandbits(32).to_bytes(4, 'big')
+    tlvs = struct.pack('!HB8s', (1 << 9) | 9, 7, b'dpid:001') + \
+        struct.pack('!HB4s', (2 << 9) | 5, 7, b'0001') + struct.pack('!HH', (3 << 9) | 2, 120) + \
+        b'\x00\x00'
+    return bytes.fromhex('0180c200000e') + src + struct.pack('!H', 0x88cc) + tlvs
+
+
+def synthetic_corpus(count=20000, seed=1):
+    rnd = random.Random(seed)
+    kinds = [(0.45, lambda: arp_frame(rnd, 1)),
+             (0.15, lambda: arp_frame(rnd, 2)),
+             (0.10, lambda: arp_frame(rnd, 1, vlan=rnd.randrange(2, 4095))),
+             (0.15, lambda: ipv4_icmp_frame(rnd)),
+             (0.10, lambda: ipv6_nd_frame(rnd)),
+             (0.05, lambda: lldp_frame(rnd))]
+    frames = []
+    for _ in range(count):
+        r = rnd.random()
+        for share, make in kinds:
+            r -= share
+            if r < 0:
+                break
+        frames.append(make())
+    return frames
+
+
+def ryu_parse(frames):
+    requests = 0
+    for data in frames:
+        pkt = packet.Packet(data)
+        eth = pkt.get_protocols(ethernet.ethernet)[0]
+        arp_msg = pkt.get_protocol(arp.arp)
+        if arp_msg is not None and arp_msg.opcode == arp.ARP_REQUEST:
+            requests += 1
+        eth.ethertype
+    return requests
+
+
+def fast_parse(frames):
+    requests = 0
+    for data in frames:
+        frame = parse_frame(data)
+        if frame is not None and frame.is_arp_request():
+            requests += 1
+    return requests
+
+
+def best_rate(fn, frames):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = fn(frames)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(frames) / best, result
+
+
+def main(args):
+    if args:
+        frames = read_pcap(args[0])
+        source = args[0]
+    else:
+        frames = synthetic_corpus()
+        source = "synthetic"
+    print("corpus: {} ({} frames)".format(source, len(frames)))
+
+    fast_rate, fast_requests = best_rate(fast_parse, frames)
+    print("{:>8}: {:>10.0f} frames/s  {:>7.2f} us/frame  ({} ARP requests)".format(
+        "fast", fast_rate, 1e6 / fast_rate, fast_requests))
+    if packet is None:
+        print("{:>8}: n/a (ryu not installed)".format("ryu"))
+        return
+    ryu_rate, ryu_requests = best_rate(ryu_parse, frames)
+    print("{:>8}: {:>10.0f} frames/s  {:>7.2f} us/frame  ({} ARP requests)".format(
+        "ryu", ryu_rate, 1e6 / ryu_rate, ryu_requests))
+    print("speedup: {:.1f}x".format(fast_rate / ryu_rate))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Count the broadcast flood rules of both flood modes
+
+Usage:  python3 benchmarks/flood_rules.py
+
+For every topology bundled with run_mininet.py (and a few larger
+generated fabrics), report the number of flood rules installed by
+
+per-source -- one ARP rule per (root switch, switch, source IP of the root)
+shared     -- one rule per spanning tree port on every switch
+
+It then fails every tree link in turn and reports the mean number of
+shared flood rules that have to be rewritten, when SpanningTree repairs
+the tree versus when Prim recomputes it from scratch.
+
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from broadcast_tree import SpanningTree, tree_ports, flood_rules  # noqa: E402
+from graph_core import Graph  # noqa: E402
+import topologies  # noqa: E402
+
+
+def spanning_tree(topo, links=None):
+    graph = Graph(topo.directed_links() if links is None else links, nodes=topo.switches)
+    ids = graph.ids
+    edges = []
+    for child, parent in graph.prim(min(topo.switches)):
+        edges.append((ids[child], ids[parent]))
+        edges.append((ids[parent], ids[child]))
+    return edges
+
+
+def count(topo):
+    switches = len(topo.switches)
+    per_source = switches * len(topo.hosts)
+    ports = tree_ports(spanning_tree(topo), topo.link_port_dict(), topo.host_ports())
+    shared = sum(len(rules) for rules in flood_rules(ports).values())
+    return switches, len(topo.hosts), per_source, shared
+
+
+def rules_of(topo, tree):
+    ports = tree_ports(tree, topo.link_port_dict(), topo.host_ports())
+    return {(dpid, in_port): out for dpid, rules in flood_rules(ports).items()
+            for in_port, out in rules.items()}
+
+
+def rewritten(before, after):
+    return sum(1 for key in set(before) | set(after) if before.get(key) != after.get(key))
+
+
+def failure_churn(topo):
+    """Mean rules rewritten per tree link failure: (incremental, full Prim)"""
+    links = topo.directed_links()
+    base = SpanningTree()
+    base.sync(topo.switches, links)
+    before = rules_of(topo, base.edges())
+    incremental, full, failures = 0, 0, 0
+    for u, v in [(u, v) for u, v in base.edges() if u < v]:
+        remaining = [link for link in links if link not in ((u, v), (v, u))]
+        tree = SpanningTree()
+        tree.sync(topo.switches, links)
+        tree.sync(topo.switches, remaining)
+        incremental += rewritten(before, rules_of(topo, tree.edges()))
+        full += rewritten(before, rules_of(topo, spanning_tree(topo, remaining)))
+        failures += 1
+    if not failures:
+        return 0.0, 0.0
+    return incremental / failures, full / failures
+
+
+def main():
+    cases = list(topologies.BUNDLED.items())
+    cases += [('linear 20 x 5 hosts', lambda: topologies.linear(20, 5)),
+              ('tree 4 fanout 4', lambda: topologies.tree(4, 4)),
+              ('mesh 16', lambda: topologies.mesh(16))]
+    print("{:<22} {:>8} {:>6} | {:>11} {:>8} | {:>16} {:>10}".format(
+        "topology", "switches", "hosts", "per-source", "shared", "failure: repair", "full Prim"))
+    for name, build in cases:
+        topo = build()
+        switches, hosts, per_source, shared = count(topo)
+        incremental, full = failure_churn(topo)
+        print("{:<22} {:>8} {:>6} | {:>11} {:>8} | {:>16.1f} {:>10.1f}".format(
+            name, switches, hosts, per_source, shared, incremental, full))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Replay a recorded event trace into the controller app
+
+Usage:  python3 benchmarks/replay_trace.py [--speed X] [--dump] [--config-file ryu.conf] trace
+
+The trace is recorded by a running controller started with the
+event-trace option (see event_trace.py):
+
+    [DEFAULT]
+    event-trace = /tmp/startup.trace.gz
+
+Every record is turned back into the ryu event the handler got --
+switch enter/leave, link add/delete, host add/delete, port modify and
+packet-in -- against the MockDatapath / MockTopology of
+bench_controller.py, so startup storms and failure cascades seen in
+production can be rerun offline, as often as needed.
+
+--speed 1 replays at the recorded pacing, --speed 10 ten times faster,
+and --speed 0 (the default) as fast as possible.  The debounced
+recompute runs in between events exactly as in the controller, on the
+real clock, so a faster replay folds more events into each recompute.
+
+Reported: the time spent per event type (handlers plus the recomputes
+that ran right after them), the throughput, and the queueing delay --
+how long each event waited behind the ones before it.  At a speed of 0
+the delay is computed from the recorded arrival times and the measured
+processing times, as if the events had come in at the recorded pace.
+
+--dump prints the records instead of replaying them.
+
+"""
+
+import argparse
+import collections
+import contextlib
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ryu import cfg  # noqa: E402
+from ryu.controller import ofp_event  # noqa: E402
+from ryu.lib import hub  # noqa: E402
+from ryu.topology import event, switches  # noqa: E402
+
+import event_trace  # noqa: E402
+import shortest_paths  # noqa: E402
+from bench_controller import VERSIONS, Event, Message, MockDatapath, MockTopology, OfpPort  # noqa: E402
+
+PROTOCOLS = {ofproto.OFP_VERSION: (ofproto, parser) for ofproto, parser in VERSIONS.values()}
+DEFAULT_VERSION = VERSIONS['1.3'][0].OFP_VERSION
+
+MatchField = collections.namedtuple('MatchField', 'header value')
+
+
+class Match(dict):
+    """An OFPMatch: both the old (fields) and the dictionary API"""
+
+    def __init__(self, fields, **kwargs):
+        super(Match, self).__init__(**kwargs)
+        self.fields = fields
+
+
+class PacketIn(Message):
+    """An OFPPacketIn, as far as packet_in_handler and OfCtl.get_packetin_inport read it"""
+
+    def __init__(self, datapath, in_port, buffer_id, data):
+        super(PacketIn, self).__init__(datapath)
+        self.in_port = in_port  # OpenFlow 1.0
+        self.buffer_id = buffer_id
+        self.data = data
+        self.total_len = len(data)
+        self.match = None  # OpenFlow 1.2+
+        in_port_field = getattr(datapath.ofproto, 'OXM_OF_IN_PORT', None)
+        if in_port_field is not None:
+            self.match = Match([MatchField(in_port_field, in_port)], in_port=in_port)
+
+
+class HandlerStats():
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+class Replay():
+    """Feeds trace records to one ShortestPathSwitching instance"""
+
+    def __init__(self):
+        self.api = MockTopology()
+        shortest_paths.topo = self.api
+        # nothing answers the flow stats requests a MockDatapath gets
+        cfg.CONF.set_override('adopt_flows', False)
+        self.app = shortest_paths.ShortestPathSwitching()
+        self.app.logger.setLevel(logging.ERROR)
+        self.datapaths = {}  # dpid : MockDatapath of the current connection
+        self.disconnected = []  # MockDatapaths of earlier connections
+        self.skipped = 0  # packet-ins from switches that never connected
+        self._recomputes = 0
+        self._handlers = {
+            event_trace.SWITCH_ENTER: self.switch_enter,
+            event_trace.SWITCH_LEAVE: self.switch_leave,
+            event_trace.LINK_ADD: self.link_add,
+            event_trace.LINK_DELETE: self.link_delete,
+            event_trace.HOST_ADD: self.host_add,
+            event_trace.PORT_MODIFY: self.port_modify,
+            event_trace.PACKET_IN: self.packet_in,
+            event_trace.HOST_DELETE: self.host_delete,
+        }
+
+    def port(self, record, live=True):
+        dp = self.datapaths.get(record.dpid)
+        ofproto = dp.ofproto if dp is not None else PROTOCOLS[DEFAULT_VERSION][0]
+        state = 0 if live else ofproto.OFPPS_LINK_DOWN
+        return switches.Port(record.dpid, ofproto, OfpPort(
+            record.port_no, record.hw_addr, 's{}-eth{}'.format(record.dpid, record.port_no), 0, state))
+
+    def switch_enter(self, record):
+        old = self.datapaths.get(record.dpid)
+        if old is not None:
+            self.disconnected.append(old)
+        dp = self.datapaths[record.dpid] = MockDatapath(record.dpid, *PROTOCOLS[record.version])
+        switch = switches.Switch(dp)
+        for port_no, hw_addr in record.ports:
+            switch.add_port(OfpPort(port_no, hw_addr, 's{}-eth{}'.format(record.dpid, port_no), 0, 0))
+        self.api.switches[record.dpid] = switch
+        self.app.switch_features_handler(Event(Message(dp)))
+        self.app.handle_switch_add(event.EventSwitchEnter(switch))
+
+    def switch_leave(self, record):
+        switch = self.api.switches.pop(record.dpid, None)
+        if switch is None:
+            return
+        for key in [key for key in self.api.links if record.dpid in key]:
+            del self.api.links[key]
+        self.app.handle_switch_delete(event.EventSwitchLeave(switch))
+
+    def link_add(self, record):
+        link = switches.Link(self.port(record.src), self.port(record.dst))
+        self.api.links[(record.src.dpid, record.dst.dpid)] = link
+        self.app.handle_link_add(event.EventLinkAdd(link))
+
+    def link_delete(self, record):
+        link = self.api.links.pop((record.src.dpid, record.dst.dpid), None)
+        if link is None:
+            link = switches.Link(self.port(record.src), self.port(record.dst))
+        self.app.handle_link_delete(event.EventLinkDelete(link))
+
+    def host_add(self, record):
+        host = switches.Host(record.mac, self.port(record.port))
+        host.ipv4.extend(record.ipv4)
+        self.app.handle_host_add(event.EventHostAdd(host))
+
+    def host_delete(self, record):
+        host = switches.Host(record.mac, self.port(record.port))
+        host.ipv4.extend(record.ipv4)
+        self.app.handle_host_delete(event.EventHostDelete(host))
+
+    def port_modify(self, record):
+        self.app.handle_port_modify(event.EventPortModify(self.port(record.port, record.live)))
+
+    def packet_in(self, record):
+        dp = self.datapaths.get(record.dpid)
+        if dp is None:
+            self.skipped += 1
+            return
+        msg = PacketIn(dp, record.in_port, record.buffer_id, record.data)
+        self.app.packet_in_handler(ofp_event.EventOFPPacketIn(msg))
+
+    def handle(self, record):
+        self._handlers[record.type](record.event)
+
+    def settle(self):
+        """Let a due recompute run, and answer the barriers it sent"""
+        hub.sleep(0)
+        recomputes = self.app.scheduler.stats.recomputes
+        if recomputes == self._recomputes:
+            return
+        self._recomputes = recomputes
+        for dp in self.datapaths.values():
+            for xid in dp.barriers:
+                self.app.barrier_reply_handler(Event(Message(dp, xid)))
+            dp.barriers = []
+
+    def run(self, records, speed=0.0):
+        """
+        :param speed: replay speed relative to the recording, 0 for as fast as possible
+        :return: ({record type: HandlerStats}, queueing delays, wall time)
+        """
+        stats = collections.defaultdict(HandlerStats)
+        delays = []
+        finished = 0.0  # when the previous event was done, on the replay clock
+        start = time.perf_counter()
+        for record in records:
+            if speed:
+                arrival = record.time / speed
+                ahead = arrival - (time.perf_counter() - start)
+                if ahead > 0:
+                    hub.sleep(ahead)  # recomputes that are due run meanwhile
+                began = time.perf_counter() - start
+                delays.append(max(began - arrival, 0.0))
+            else:
+                arrival = record.time
+                began = max(arrival, finished)
+                delays.append(began - arrival)
+
+            t0 = time.perf_counter()
+            self.handle(record)
+            self.settle()
+            elapsed = time.perf_counter() - t0
+            stats[record.type].add(elapsed)
+            finished = began + elapsed
+
+        self.app.scheduler.flush()
+        self.settle()
+        return stats, delays, time.perf_counter() - start
+
+    def sent(self) -> collections.Counter:
+        counts = collections.Counter()
+        for dp in self.disconnected + list(self.datapaths.values()):
+            counts.update(dp.counts)
+        return counts
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def dump(reader):
+    for record in reader:
+        print("{:>12.6f}  {:<12}  {}".format(record.time, event_trace.NAMES[record.type], record.event))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Replay an event trace into the controller")
+    parser.add_argument('trace', help="file recorded with the event-trace option")
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help="replay speed relative to the recording (0: as fast as possible)")
+    parser.add_argument('--dump', action='store_true', help="print the records and exit")
+    args, ryu_args = parser.parse_known_args(argv)
+
+    reader = event_trace.TraceReader(args.trace)
+    if args.dump:
+        dump(reader)
+        return
+    records = list(reader)
+    cfg.CONF(args=ryu_args, project='ryu', default_config_files=[])
+    logging.basicConfig(level=logging.ERROR)
+
+    replay = Replay()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        stats, delays, wall = replay.run(records, args.speed)
+
+    duration = records[-1].time if records else 0.0
+    print("trace: {} ({} events over {:.1f} s, recorded {})".format(
+        args.trace, len(records), duration, time.strftime('%Y-%m-%d %H:%M:%S',
+                                                          time.localtime(reader.started))))
+    print("replayed at {} in {:.2f} s: {:.0f} events/s".format(
+        "{}x".format(args.speed) if args.speed else "full speed", wall,
+        len(records) / wall if wall else 0.0))
+    print("{:<14} {:>8} {:>10} {:>10}".format("event", "count", "mean", "max"))
+    for record_type, handler in sorted(stats.items()):
+        print("{:<14} {:>8} {:>7.1f} us {:>7.2f} ms".format(
+            event_trace.NAMES[record_type], handler.count,
+            handler.total / handler.count * 1e6, handler.max * 1000))
+    print("queueing delay: mean {:.2f} ms, p50 {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms".format(
+        sum(delays) / len(delays) * 1000 if delays else 0.0, percentile(delays, 0.5) * 1000,
+        percentile(delays, 0.99) * 1000, max(delays, default=0.0) * 1000))
+    coalescing = replay.app.scheduler.stats
+    sent = replay.sent()
+    print("recomputes: {} ({:.1f} events each), flow mods: {}, group mods: {}".format(
+        coalescing.recomputes, coalescing.events_per_recompute(),
+        sent['OFPT_FLOW_MOD'], sent['OFPT_GROUP_MOD']))
+    admission = replay.app.admission.stats
+    print("packet-ins: {} admitted, {} duplicate, {} over source rate, {} over switch rate, "
+          "{} from unknown switches".format(admission.admitted, admission.duplicate,
+                                            admission.source_rate, admission.switch_rate,
+                                            replay.skipped))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,210 @@
+"""The topologies of run_mininet.py, without Mininet
+
+Topology mimics the parts of mininet.topo.Topo that run_mininet.py uses,
+numbering ports per node in addLink() order the way Mininet does, so
+that port numbers match a real run.  Hosts get the MAC/IP Mininet hands
+out with autoSetMacs=True (h<i> -> 00:00:00:00:00:<i>, 10.0.0.<i>).
+
+"""
+
+import random
+import re
+
+
+class Topology():
+
+    def __init__(self):
+        self.switches = []  # dpids
+        self.hosts = {}  # name : (mac, ip)
+        self.links = []  # (src_dpid, dst_dpid, src_port, dst_port), one direction
+        self.host_links = []  # (host name, dpid, switch port)
+        self._ports = {}
+
+    def addSwitch(self, name):
+        dpid = int(name[1:])
+        self.switches.append(dpid)
+        return ('s', dpid)
+
+    def addHost(self, name):
+        i = int(re.sub(r'\D', '', name))
+        self.hosts[name] = ('00:00:00:{:02x}:{:02x}:{:02x}'.format(i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff),
+                            '10.{}.{}.{}'.format(i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff))
+        return ('h', name)
+
+    def _port(self, node):
+        self._ports[node] = self._ports.get(node, 0) + 1
+        return self._ports[node]
+
+    def addLink(self, a, b):
+        pa, pb = self._port(a), self._port(b)
+        if a[0] == 's' and b[0] == 's':
+            self.links.append((a[1], b[1], pa, pb))
+        elif a[0] == 'h':
+            self.host_links.append((a[1], b[1], pb))
+        else:
+            self.host_links.append((b[1], a[1], pa))
+
+    def link_port_dict(self) -> dict:
+        """{src_dpid: {dst_dpid: src_port}} in both directions"""
+        ports = {dpid: {} for dpid in self.switches}
+        for u, v, pu, pv in self.links:
+            ports[u][v] = pu
+            ports[v][u] = pv
+        return ports
+
+    def directed_links(self) -> list:
+        return [(u, v) for u, v, _, _ in self.links] + [(v, u) for u, v, _, _ in self.links]
+
+    def host_ports(self) -> dict:
+        """{dpid: [switch ports with a host]}"""
+        ports = {dpid: [] for dpid in self.switches}
+        for _, dpid, port in self.host_links:
+            ports[dpid].append(port)
+        return ports
+
+
+def single(k=3):
+    t = Topology()
+    s = t.addSwitch('s1')
+    for i in range(1, k + 1):
+        t.addLink(t.addHost('h%d' % i), s)
+    return t
+
+
+def linear(k=4, n=1):
+    t = Topology()
+    last = None
+    for i in range(1, k + 1):
+        s = t.addSwitch('s%d' % i)
+        for j in range(1, n + 1):
+            t.addLink(t.addHost('h%d' % ((i - 1) * n + j)), s)
+        if last:
+            t.addLink(s, last)
+        last = s
+    return t
+
+
+def tree(depth=2, fanout=2):
+    t = Topology()
+    counters = {'s': 1, 'h': 1}
+
+    def add_tree(d):
+        if d > 0:
+            node = t.addSwitch('s%d' % counters['s'])
+            counters['s'] += 1
+            for _ in range(fanout):
+                t.addLink(node, add_tree(d - 1))
+        else:
+            node = t.addHost('h%d' % counters['h'])
+            counters['h'] += 1
+        return node
+
+    add_tree(depth)
+    return t
+
+
+def _build(hosts, switches, host_links, switch_links):
+    t = Topology()
+    h = {i: t.addHost('h%d' % i) for i in range(1, hosts + 1)}
+    s = {i: t.addSwitch('s%d' % i) for i in range(1, switches + 1)}
+    for hi, si in host_links:
+        t.addLink(h[hi], s[si])
+    for a, b in switch_links:
+        t.addLink(s[a], s[b])
+    return t
+
+
+def assign1():
+    return _build(10, 6,
+                  [(1, 1), (7, 1), (8, 1), (2, 2), (3, 3), (4, 4), (9, 4), (10, 4), (5, 5), (6, 6)],
+                  [(1, 2), (2, 3), (3, 4), (2, 5), (3, 6)])
+
+
+def triangle():
+    return _build(3, 3, [(1, 1), (2, 2), (3, 3)], [(1, 2), (2, 3), (3, 1)])
+
+
+def someloops():
+    return _build(4, 6, [(1, 1), (2, 5), (3, 4), (4, 6)],
+                  [(1, 2), (2, 3), (3, 4), (3, 6), (2, 5), (5, 4), (4, 6), (6, 1)])
+
+
+def mesh(n=4):
+    t = Topology()
+    switches = []
+    for i in range(1, n + 1):
+        h = t.addHost('h%d' % i)
+        s = t.addSwitch('s%d' % i)
+        t.addLink(h, s)
+        switches.append(s)
+    for i in range(0, n - 1):
+        for j in range(i + 1, n):
+            t.addLink(switches[i], switches[j])
+    return t
+
+
+def fat_tree(k=4):
+    """k-ary fat tree: (k/2)^2 core switches, k pods of k/2 aggregation and
+    k/2 edge switches, k/2 hosts on every edge switch"""
+    half = k // 2
+    t = Topology()
+    counters = {'s': 1, 'h': 1}
+
+    def switch():
+        node = t.addSwitch('s%d' % counters['s'])
+        counters['s'] += 1
+        return node
+
+    core = [switch() for _ in range(half * half)]
+    for _ in range(k):
+        aggregation = [switch() for _ in range(half)]
+        for i, agg in enumerate(aggregation):
+            for c in core[i * half:(i + 1) * half]:
+                t.addLink(agg, c)
+        for _ in range(half):
+            edge = switch()
+            for agg in aggregation:
+                t.addLink(edge, agg)
+            for _ in range(half):
+                t.addLink(t.addHost('h%d' % counters['h']), edge)
+                counters['h'] += 1
+    return t
+
+
+def random_regular(n=16, degree=3, seed=1):
+    """Connected random graph where every switch has `degree` neighbours
+    (n * degree must be even), one host per switch"""
+    rnd = random.Random(seed)
+    while True:
+        # pair up n * degree stubs, retry on self loops, double links or a split graph
+        stubs = [u for u in range(1, n + 1) for _ in range(degree)]
+        rnd.shuffle(stubs)
+        pairs = {(min(u, v), max(u, v)) for u, v in zip(stubs[::2], stubs[1::2]) if u != v}
+        if len(pairs) * 2 != len(stubs):
+            continue
+        adj = {u: [] for u in range(1, n + 1)}
+        for u, v in pairs:
+            adj[u].append(v)
+            adj[v].append(u)
+        seen, frontier = {1}, [1]
+        while frontier:
+            for v in adj[frontier.pop()]:
+                if v not in seen:
+                    seen.add(v)
+                    frontier.append(v)
+        if len(seen) == n:
+            break
+    return _build(n, n, [(i, i) for i in range(1, n + 1)], sorted(pairs))
+
+
+# name : builder, the topologies of run_mininet.ALL_TOPOLOGIES
+BUNDLED = {
+    'single 3': lambda: single(3),
+    'linear 4': lambda: linear(4),
+    'tree 2': lambda: tree(2),
+    'tree 3': lambda: tree(3),
+    'assign1': assign1,
+    'triangle': triangle,
+    'mesh 4': lambda: mesh(4),
+    'someloops': someloops,
+}
@@ -0,0 +1,161 @@
+"""Flood rules for one broadcast tree shared by all sources
+
+Every broadcast follows the same spanning tree, whichever host sent it.
+A switch therefore only needs one rule per port that is on the tree (its
+tree links and its host ports): a broadcast that comes in on that port is
+copied to all the other tree ports.  That is O(ports) rules per switch,
+independent of how many hosts or roots there are, and a broadcast that
+comes in on a port that is not on the tree matches no flood rule at all.
+
+SpanningTree keeps that tree across topology changes instead of running
+Prim again: losing a link that is not on the tree changes nothing, and
+losing a tree link reconnects the two halves with one replacement link,
+so only the switches at the ends of the changed links get new rules.
+
+"""
+
+from graph_core import Graph
+
+BROADCAST = 'ff:ff:ff:ff:ff:ff'
+
+
+def tree_ports(tree_edges, link_port_dict: dict, host_ports: dict) -> dict:
+    """
+    :param tree_edges: spanning tree links, in both directions
+    :param link_port_dict: {src_dpid: {dst_dpid: src_port}}
+    :param host_ports: {dpid: [ports with a host behind them]}
+    :return: {dpid: sorted list of the ports of dpid that are on the tree}
+    """
+    ports = {dpid: set(host) for dpid, host in host_ports.items()}
+    for u, v in tree_edges:
+        ports.setdefault(u, set()).add(link_port_dict[u][v])
+    return {dpid: sorted(p) for dpid, p in ports.items()}
+
+
+def flood_rules(ports: dict) -> dict:
+    """
+    :param ports: result of tree_ports()
+    :return: {dpid: {in_port: tuple of output ports}}
+    """
+    rules = {}
+    for dpid, tree in ports.items():
+        rules[dpid] = {in_port: tuple(p for p in tree if p != in_port) for in_port in tree}
+    return rules
+
+
+class SpanningTree():
+    """
+    Spanning forest of the switch graph, repaired incrementally.
+
+    Only links that were discovered in both directions are used, since a
+    tree port has to work both ways.
+    """
+
+    def __init__(self):
+        self.adj = {}  # dpid : set of neighbours
+        self.tree = {}  # dpid : set of tree neighbours
+        self.repairs = 0  # tree links replaced after a failure
+        self.rebuilds = 0
+
+    def sync(self, switches: list, links: list) -> set:
+        """
+        Bring the tree in line with a full topology listing.
+        :param switches: list of dpids
+        :param links: list of (src_dpid, dst_dpid), as in get_topology_data()
+        :return: the switches whose tree neighbours changed
+        """
+        directed = set(links)
+        wanted = {(u, v) for u, v in directed if u < v and (v, u) in directed}
+        current = {(u, v) for u in self.adj for v in self.adj[u] if u < v}
+        nodes = set(switches).union(*wanted) if wanted else set(switches)
+        if len(wanted ^ current) > max(len(nodes), 1):
+            # Too many updates (e.g. at startup): one full rebuild is cheaper
+            return self.rebuild(nodes, wanted)
+
+        changed = set()
+        for u, v in sorted(current - wanted):
+            self._remove_link(u, v, changed)
+        for u in set(self.adj) - nodes:
+            del self.adj[u]
+            del self.tree[u]
+        for u in nodes:
+            self.adj.setdefault(u, set())
+            self.tree.setdefault(u, set())
+        for u, v in sorted(wanted - current):
+            self._add_link(u, v, changed)
+        return changed & nodes
+
+    def rebuild(self, nodes, edges) -> set:
+        """
+        Replace the graph and compute a new tree for every component with Prim.
+        :param edges: undirected links as (u, v) pairs
+        :return: the switches whose tree neighbours changed
+        """
+        old = self.tree
+        self.adj = {u: set() for u in nodes}
+        self.tree = {u: set() for u in nodes}
+        for u, v in edges:
+            self.adj[u].add(v)
+            self.adj[v].add(u)
+        graph = Graph([(u, v) for u in self.adj for v in self.adj[u]], nodes=nodes)
+        ids = graph.ids
+        spanned = set()
+        for root in sorted(nodes):
+            if root in spanned:
+                continue
+            spanned.add(root)
+            for child, parent in graph.prim(root):
+                self._link(ids[child], ids[parent])
+                spanned.add(ids[child])
+        self.rebuilds += 1
+        return {u for u in self.tree if old.get(u) != self.tree[u]}
+
+    def edges(self) -> list:
+        """Tree links in both directions, e.g. [ab, ba]"""
+        return [(u, v) for u in self.tree for v in self.tree[u]]
+
+    def component(self, u: int) -> set:
+        """Switches reachable from u over the tree"""
+        seen = {u}
+        frontier = [u]
+        while frontier:
+            nxt = []
+            for x in frontier:
+                for y in self.tree[x]:
+                    if y not in seen:
+                        seen.add(y)
+                        nxt.append(y)
+            frontier = nxt
+        return seen
+
+    def _link(self, u, v):
+        self.tree[u].add(v)
+        self.tree[v].add(u)
+
+    def _add_link(self, u, v, changed: set):
+        self.adj[u].add(v)
+        self.adj[v].add(u)
+        if v not in self.component(u):
+            # The link joins two trees of the forest
+            self._link(u, v)
+            changed.update((u, v))
+
+    def _remove_link(self, u, v, changed: set):
+        self.adj[u].discard(v)
+        self.adj[v].discard(u)
+        if v not in self.tree[u]:
+            return
+        self.tree[u].discard(v)
+        self.tree[v].discard(u)
+        changed.update((u, v))
+
+        # Look for a replacement from the smaller half
+        side_u, side_v = self.component(u), self.component(v)
+        side = side_u if len(side_u) <= len(side_v) else side_v
+        for a in sorted(side):
+            for b in sorted(self.adj[a]):
+                if b not in side:
+                    self._link(a, b)
+                    changed.update((a, b))
+                    self.repairs += 1
+                    return
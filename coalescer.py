@@ -0,0 +1,130 @@
+"""Topology event coalescing
+
+Switch and link discovery raise events in bursts.  Instead of running a
+full flow table update for each one, the handlers mark the topology as
+dirty and RecomputeScheduler runs a single deferred update once no new
+event arrived for a quiet period, or once the oldest pending event has
+waited for the maximum delay.
+
+"""
+
+import time
+
+from ryu.lib import hub
+
+
+class RecomputeStats():
+    """Counters describing how well events are being coalesced"""
+
+    def __init__(self):
+        self.events = 0  # events marked dirty since start
+        self.recomputes = 0
+        self.last_absorbed = 0  # events handled by the last recompute
+        self.max_absorbed = 0
+        self.last_latency = 0.0  # seconds from first dirty event to end of recompute
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def events_per_recompute(self):
+        return self.events / self.recomputes if self.recomputes else 0.0
+
+    def mean_latency(self):
+        return self.total_latency / self.recomputes if self.recomputes else 0.0
+
+    def as_dict(self):
+        return {
+            'events': self.events,
+            'recomputes': self.recomputes,
+            'events_per_recompute': self.events_per_recompute(),
+            'last_absorbed': self.last_absorbed,
+            'max_absorbed': self.max_absorbed,
+            'last_latency': self.last_latency,
+            'mean_latency': self.mean_latency(),
+            'max_latency': self.max_latency,
+        }
+
+
+class RecomputeScheduler():
+    """
+    Debounce topology events into as few recomputes as possible.
+
+    :param recompute: callable running the actual update
+    :param quiet_period: seconds without events before recomputing;
+                         0 recomputes synchronously on every event
+    :param max_delay: upper bound in seconds on how long the first
+                      pending event may wait
+    """
+
+    def __init__(self, recompute, quiet_period=0.2, max_delay=1.0, logger=None,
+                 clock=time.monotonic, spawn=hub.spawn, sleep=hub.sleep):
+        self.recompute = recompute
+        self.quiet_period = quiet_period
+        self.max_delay = max(max_delay, quiet_period)
+        self.logger = logger
+        self.stats = RecomputeStats()
+
+        self._clock = clock
+        self._spawn = spawn
+        self._sleep = sleep
+        self._pending = 0  # events waiting for the next recompute
+        self._first_event = None
+        self._last_event = None
+        self._waiter = None
+
+    def mark_dirty(self):
+        """Record a topology event and make sure a recompute is scheduled"""
+        now = self._clock()
+        self.stats.events += 1
+        self._pending += 1
+        self._last_event = now
+        if self._first_event is None:
+            self._first_event = now
+
+        if self.quiet_period <= 0:
+            self._run()
+        elif self._waiter is None:
+            self._waiter = self._spawn(self._wait)
+
+    def flush(self):
+        """Run a pending recompute right away"""
+        if self._pending:
+            self._run()
+
+    def is_dirty(self):
+        return self._pending > 0
+
+    def _wait(self):
+        try:
+            while self._pending:
+                deadline = min(self._last_event + self.quiet_period,
+                               self._first_event + self.max_delay)
+                now = self._clock()
+                if now >= deadline:
+                    self._run()
+                else:
+                    self._sleep(deadline - now)
+        finally:
+            self._waiter = None
+
+    def _run(self):
+        absorbed, first = self._pending, self._first_event
+        # Events raised while recomputing are picked up by the next round
+        self._pending = 0
+        self._first_event = None
+        self._last_event = None
+
+        self.recompute()
+
+        latency = self._clock() - first
+        stats = self.stats
+        stats.recomputes += 1
+        stats.last_absorbed = absorbed
+        stats.max_absorbed = max(stats.max_absorbed, absorbed)
+        stats.last_latency = latency
+        stats.max_latency = max(stats.max_latency, latency)
+        stats.total_latency += latency
+        if self.logger is not None:
+            self.logger.info("Recompute #%d absorbed %d events, converged in %.1f ms "
+                             "(%.1f events/recompute on average)",
+                             stats.recomputes, absorbed, latency * 1000,
+                             stats.events_per_recompute())
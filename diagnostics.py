@@ -0,0 +1,97 @@
+"""Topology, spanning tree and path dumps
+
+The controller used to print the whole topology and every switch pair's
+path on each recompute, O(switches^2) lines written to stdout from
+inside the update.  These dumps are now generators of lines built from a
+Snapshot: the controller only runs them on every update when it is not
+in quiet mode, and otherwise on demand, for GET /diagnostics or on
+SIGUSR1.
+
+A Snapshot copies the few structures the dumps read, so formatting it
+line by line, while the controller keeps handling events, still shows
+one consistent state.
+
+"""
+
+import time
+
+
+class Snapshot():
+    """
+    :param switches: list of dpids
+    :param link_port_dict: {src_dpid: {dst_dpid: src_port}}
+    :param hosts: {dpid: [(port_no, mac, [ipv4])]}
+    :param tree_edges: spanning tree links, in both directions
+    :param next_hops: {src_dpid: {dst_dpid: next hop dpid}}
+    """
+
+    def __init__(self, switches, link_port_dict, hosts, tree_edges, next_hops):
+        self.taken = time.time()
+        self.switches = list(switches)
+        self.link_port_dict = {u: dict(ports) for u, ports in link_port_dict.items()}
+        self.hosts = {dpid: list(entries) for dpid, entries in hosts.items()}
+        self.tree_edges = list(tree_edges)
+        self.next_hops = next_hops
+
+    def path(self, s: int, d: int) -> list:
+        """The switch path s -> d, [] if d is unreachable"""
+        path = [s]
+        while path[-1] != d:
+            nxt = self.next_hops.get(path[-1], {}).get(d)
+            if nxt is None or len(path) > len(self.next_hops):
+                return []
+            path.append(nxt)
+        return path
+
+
+def topology_lines(snapshot: Snapshot):
+    yield "__________________________Start Printing Topology____________________________"
+    links = snapshot.link_port_dict
+    switches = snapshot.switches if len(snapshot.switches) == 1 else sorted(links)
+    for sw in switches:
+        if len(snapshot.switches) > 1:
+            yield "* For Switch_{} ---------------------".format(sw)
+            yield "> Connected Switches :"
+            for to_sw, port in links.get(sw, {}).items():
+                yield "Edge: switch_{}/port_{} <-> switch {}/port_{}".format(
+                    sw, port, to_sw, links.get(to_sw, {}).get(sw))
+        yield "> Connected  Hosts:"
+        hosts = snapshot.hosts.get(sw, [])
+        if not hosts:
+            yield "No connected hosts."
+        for port_no, _, ipv4 in hosts:
+            yield "Edge: switch_{}/port_{}<-> host_ip_{}".format(sw, port_no, ipv4)
+    yield "__________________________END Printing Topology____________________________"
+
+
+def tree_lines(snapshot: Snapshot):
+    yield "************ Spanning Tree *************"
+    yield str(snapshot.tree_edges)
+    yield "*****************************************"
+
+
+def path_lines(snapshot: Snapshot, src=None, dst=None):
+    """Paths between every pair of switches, or only from src and/or to dst"""
+    yield "________________________Start Printing Shortest Path_____________________________"
+    if len(snapshot.switches) == 1:
+        yield "There is only a Single switch in the net work."
+    else:
+        for i in snapshot.switches if src is None else [src]:
+            yield "* For Switch_{} :".format(i)
+            for j in snapshot.switches if dst is None else [dst]:
+                yield "> Switch_{} to Switch_{} ".format(i, j)
+                yield str(snapshot.path(i, j))
+    yield "__________________________End Printing Shortest Path_____________________________"
+
+
+SECTIONS = {
+    'topology': topology_lines,
+    'tree': tree_lines,
+    'paths': path_lines,
+}
+
+
+def dump_lines(snapshot: Snapshot, sections=('topology', 'tree', 'paths')):
+    yield "# snapshot taken {}".format(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot.taken)))
+    for section in sections:
+        yield from SECTIONS[section](snapshot)
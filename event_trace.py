@@ -0,0 +1,183 @@
+"""Recording of the events the controller sees, for offline replay
+
+TraceWriter appends every topology event and packet-in the handlers get
+to a file, with the time it arrived; benchmarks/replay_trace.py feeds
+such a file back into ShortestPathSwitching against mock datapaths.
+
+The file is binary and small: an 8 byte magic and the wall clock time
+the recording started, then one record per event -- a header holding
+the seconds since the start, the record type and the payload length,
+and a payload of packed fields (MAC and IPv4 addresses as 6 and 4
+bytes, packet-ins with the frame as the switch sent it).  A path ending
+in .gz is written and read gzip compressed.
+
+Only plain values are read from the ryu objects handed to the writer,
+so reading a trace does not need ryu.
+
+"""
+
+import gzip
+import socket
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+MAGIC = b'SPTRACE1'
+FILE_HEADER = struct.Struct('!8sd')  # magic, time.time() at the start
+RECORD_HEADER = struct.Struct('!dBH')  # seconds since the start, type, payload length
+
+SWITCH_ENTER = 1
+SWITCH_LEAVE = 2
+LINK_ADD = 3
+LINK_DELETE = 4
+HOST_ADD = 5
+PORT_MODIFY = 6
+PACKET_IN = 7
+HOST_DELETE = 8
+
+NAMES = {
+    SWITCH_ENTER: 'switch enter',
+    SWITCH_LEAVE: 'switch leave',
+    LINK_ADD: 'link add',
+    LINK_DELETE: 'link delete',
+    HOST_ADD: 'host add',
+    PORT_MODIFY: 'port modify',
+    PACKET_IN: 'packet-in',
+    HOST_DELETE: 'host delete',
+}
+
+SWITCH = struct.Struct('!QBH')  # dpid, OpenFlow version, number of ports
+PORT = struct.Struct('!I6s')  # port_no, hw_addr
+LINK = struct.Struct('!QI6sQI6s')  # src dpid, port, hw_addr, dst dpid, port, hw_addr
+HOST = struct.Struct('!6sQI6sB')  # mac, dpid, port_no, port hw_addr, number of IPv4 addresses
+PORT_STATE = struct.Struct('!QI6sB')  # dpid, port_no, hw_addr, live
+PACKET_IN_HEADER = struct.Struct('!QII')  # dpid, in_port, buffer_id; the frame follows
+
+# time: seconds since the start of the recording, type: SWITCH_ENTER, ...
+# event: one of the records below
+TraceRecord = namedtuple('TraceRecord', ['time', 'type', 'event'])
+SwitchRecord = namedtuple('SwitchRecord', ['dpid', 'version', 'ports'])  # ports: [(port_no, hw_addr)]
+PortRecord = namedtuple('PortRecord', ['dpid', 'port_no', 'hw_addr'])
+LinkRecord = namedtuple('LinkRecord', ['src', 'dst'])  # PortRecords
+HostRecord = namedtuple('HostRecord', ['mac', 'port', 'ipv4'])
+PortStateRecord = namedtuple('PortStateRecord', ['port', 'live'])
+PacketInRecord = namedtuple('PacketInRecord', ['dpid', 'in_port', 'buffer_id', 'data'])
+
+
+def pack_mac(mac: str) -> bytes:
+    return bytes.fromhex(mac.replace(':', ''))
+
+
+def unpack_mac(mac: bytes) -> str:
+    return mac.hex(':')
+
+
+def open_trace(path: str, mode: str):
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+class TraceWriter():
+    """
+    Append events to a trace file.
+
+    :param flush_interval: seconds between two writes of the buffered
+                           records to the file
+    """
+
+    def __init__(self, path: str, flush_interval=1.0, clock=time.monotonic):
+        self.path = path
+        self.records = 0
+        self._file = open_trace(path, 'wb')
+        self._clock = clock
+        self._start = clock()
+        self._flush_interval = flush_interval
+        self._last_flush = self._start
+        self._file.write(FILE_HEADER.pack(MAGIC, time.time()))
+
+    def _write(self, record_type: int, payload: bytes):
+        now = self._clock()
+        self._file.write(RECORD_HEADER.pack(now - self._start, record_type, len(payload)))
+        self._file.write(payload)
+        self.records += 1
+        if now - self._last_flush >= self._flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def switch(self, record_type: int, switch):
+        """SWITCH_ENTER or SWITCH_LEAVE of a ryu.topology Switch"""
+        ports = [PORT.pack(port.port_no, pack_mac(port.hw_addr)) for port in switch.ports]
+        header = SWITCH.pack(switch.dp.id, switch.dp.ofproto.OFP_VERSION, len(ports))
+        self._write(record_type, header + b''.join(ports))
+
+    def link(self, record_type: int, link):
+        """LINK_ADD or LINK_DELETE of a ryu.topology Link"""
+        src, dst = link.src, link.dst
+        self._write(record_type, LINK.pack(src.dpid, src.port_no, pack_mac(src.hw_addr),
+                                           dst.dpid, dst.port_no, pack_mac(dst.hw_addr)))
+
+    def host(self, host, record_type=HOST_ADD):
+        """HOST_ADD (also for a host that moved) or HOST_DELETE of a ryu.topology Host"""
+        port = host.port
+        payload = HOST.pack(pack_mac(host.mac), port.dpid, port.port_no, pack_mac(port.hw_addr),
+                            len(host.ipv4))
+        self._write(record_type, payload + b''.join(socket.inet_aton(ip) for ip in host.ipv4))
+
+    def port(self, port):
+        """PORT_MODIFY of a ryu.topology Port"""
+        self._write(PORT_MODIFY, PORT_STATE.pack(port.dpid, port.port_no, pack_mac(port.hw_addr),
+                                                 port.is_live()))
+
+    def packet_in(self, dpid: int, in_port: int, buffer_id: int, data: bytes):
+        data = bytes(data[:0xffff - PACKET_IN_HEADER.size])  # what fits in one record
+        self._write(PACKET_IN, PACKET_IN_HEADER.pack(dpid, in_port, buffer_id) + data)
+
+    def close(self):
+        self._file.close()
+
+
+def _decode(record_type: int, payload: bytes):
+    if record_type in (SWITCH_ENTER, SWITCH_LEAVE):
+        dpid, version, count = SWITCH.unpack_from(payload, 0)
+        ports = [PORT.unpack_from(payload, SWITCH.size + i * PORT.size) for i in range(count)]
+        return SwitchRecord(dpid, version, [(port_no, unpack_mac(hw)) for port_no, hw in ports])
+    if record_type in (LINK_ADD, LINK_DELETE):
+        sd, sp, sh, dd, dp, dh = LINK.unpack(payload)
+        return LinkRecord(PortRecord(sd, sp, unpack_mac(sh)), PortRecord(dd, dp, unpack_mac(dh)))
+    if record_type in (HOST_ADD, HOST_DELETE):
+        mac, dpid, port_no, hw, count = HOST.unpack_from(payload, 0)
+        ipv4 = [socket.inet_ntoa(payload[HOST.size + i * 4:HOST.size + i * 4 + 4]) for i in range(count)]
+        return HostRecord(unpack_mac(mac), PortRecord(dpid, port_no, unpack_mac(hw)), ipv4)
+    if record_type == PORT_MODIFY:
+        dpid, port_no, hw, live = PORT_STATE.unpack(payload)
+        return PortStateRecord(PortRecord(dpid, port_no, unpack_mac(hw)), bool(live))
+    if record_type == PACKET_IN:
+        dpid, in_port, buffer_id = PACKET_IN_HEADER.unpack_from(payload, 0)
+        return PacketInRecord(dpid, in_port, buffer_id, payload[PACKET_IN_HEADER.size:])
+    raise ValueError("unknown trace record type {}".format(record_type))
+
+
+class TraceReader():
+    """Iterate over the TraceRecords of a trace file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = f.read()
+        if path.endswith('.gz'):
+            # unlike gzip.open, keeps what precedes the end of a file cut short by a crash
+            self._data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(self._data)
+        magic, self.started = FILE_HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not an event trace".format(path))
+
+    def __iter__(self):
+        data = self._data
+        offset = FILE_HEADER.size
+        while offset + RECORD_HEADER.size <= len(data):
+            at, record_type, length = RECORD_HEADER.unpack_from(data, offset)
+            offset += RECORD_HEADER.size
+            if offset + length > len(data):
+                break  # cut short by a crash while recording
+            yield TraceRecord(at, record_type, _decode(record_type, data[offset:offset + length]))
+            offset += length
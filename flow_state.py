@@ -0,0 +1,424 @@
+"""Desired-state flow reconciliation
+
+The controller describes the flow table it wants on every datapath as a
+plain dictionary { FlowMatch: actions }.  FlowReconciler remembers what
+it has already installed on each datapath and only sends the difference
+(add / modify / delete) through OfCtl.
+
+Actions are kept as hashable tuples so that tables can be compared
+cheaply, e.g. (('output', 3),).  They are turned into real OpenFlow
+actions only when a flow mod is actually sent.
+
+Groups (OpenFlow 1.2+) are described the same way, e.g. ('select', (2, 3))
+is a select group over ports 2 and 3, and ('ff', (2, 3)) a fast failover
+group using port 3 while port 2 is down.  Flows refer to them by the id
+handed out by FlowReconciler.group_id(), and the reconciler installs a
+group before the first flow that uses it and removes it after the last.
+
+All mods of one reconcile() are written to the switch as one batch
+followed by a barrier (OfCtl.send_batch), so the controller learns when
+the switch has actually applied them.
+
+update() sends the mods for a handful of known rules directly, for
+changes such as a host joining or moving that touch one rule per switch
+and do not need the whole table diffed.
+
+parse_flow() and parse_group() turn flow and group statistics back into
+the same descriptions, so that adopt() can take the tables a switch
+already has as installed when it (re)connects, instead of assuming it
+starts empty.
+
+"""
+
+import socket
+import struct
+from collections import namedtuple
+
+FlowMatch = namedtuple('FlowMatch', ['priority', 'dl_type', 'dl_dst', 'dl_vlan', 'nw_src', 'in_port'],
+                       defaults=[0, 0, 0, 0, 0, 0])
+
+
+def output(port):
+    return ('output', port)
+
+
+def set_vlan(vlan_id):
+    """Tag the packet with vlan_id (pushing a tag if it has none)"""
+    return ('set_vlan', vlan_id)
+
+
+def strip_vlan():
+    return ('strip_vlan',)
+
+
+def group(group_id):
+    return ('group', group_id)
+
+
+def select_group(ports):
+    """Hash flows across the given output ports"""
+    return ('select', tuple(sorted(ports)))
+
+
+def failover_group(ports):
+    """Output to the first of the given ports (in order) that is up"""
+    return ('ff', tuple(ports))
+
+
+def build_actions(dp, spec):
+    """Turn an action tuple such as (('output', 3),) into OpenFlow actions"""
+    ofp = dp.ofproto
+    ofp_parser = dp.ofproto_parser
+    # OpenFlow 1.0 has dedicated VLAN actions, later versions push/pop + set_field
+    of10 = hasattr(ofp_parser, 'OFPActionVlanVid')
+    actions = []
+    for action in spec:
+        if action[0] == 'output':
+            actions.append(ofp_parser.OFPActionOutput(action[1]))
+        elif action[0] == 'set_vlan' and of10:
+            actions.append(ofp_parser.OFPActionVlanVid(action[1]))
+        elif action[0] == 'set_vlan':
+            actions.append(ofp_parser.OFPActionPushVlan(0x8100))
+            actions.append(ofp_parser.OFPActionSetField(vlan_vid=action[1] | ofp.OFPVID_PRESENT))
+        elif action[0] == 'strip_vlan' and of10:
+            actions.append(ofp_parser.OFPActionStripVlan())
+        elif action[0] == 'strip_vlan':
+            actions.append(ofp_parser.OFPActionPopVlan())
+        elif action[0] == 'group':
+            actions.append(ofp_parser.OFPActionGroup(action[1]))
+        else:
+            raise ValueError("Unknown action {}".format(action))
+    return actions
+
+
+def build_buckets(dp, spec):
+    """Turn a group description into (group_type, buckets) for OfCtl.set_group"""
+    ofp = dp.ofproto
+    ofp_parser = dp.ofproto_parser
+    # Buckets watch their own port, so the switch skips them as soon as it goes down
+    if spec[0] == 'select':
+        return ofp.OFPGT_SELECT, [([ofp_parser.OFPActionOutput(port)], 1, port)
+                                  for port in spec[1]]
+    if spec[0] == 'ff':
+        return ofp.OFPGT_FF, [([ofp_parser.OFPActionOutput(port)], 0, port)
+                              for port in spec[1]]
+    raise ValueError("Unknown group {}".format(spec))
+
+
+def _actions_v1_0(parser, actions):
+    spec = []
+    for action in actions:
+        if isinstance(action, parser.OFPActionOutput):
+            spec.append(output(action.port))
+        elif isinstance(action, parser.OFPActionVlanVid):
+            spec.append(set_vlan(action.vlan_vid))
+        elif isinstance(action, parser.OFPActionStripVlan):
+            spec.append(strip_vlan())
+        else:
+            return None
+    return tuple(spec)
+
+
+def _actions_v1_2(ofp, parser, instructions):
+    if len(instructions) != 1 or not isinstance(instructions[0], parser.OFPInstructionActions) \
+            or instructions[0].type != ofp.OFPIT_APPLY_ACTIONS:
+        return None
+    spec = []
+    for action in instructions[0].actions:
+        if isinstance(action, parser.OFPActionOutput):
+            spec.append(output(action.port))
+        elif isinstance(action, parser.OFPActionGroup):
+            spec.append(group(action.group_id))
+        elif isinstance(action, parser.OFPActionPopVlan):
+            spec.append(strip_vlan())
+        elif isinstance(action, parser.OFPActionPushVlan):
+            continue  # the set_field that follows carries the VLAN ID
+        elif isinstance(action, parser.OFPActionSetField) and action.key == 'vlan_vid':
+            spec.append(set_vlan(action.value & ~ofp.OFPVID_PRESENT))
+        else:
+            return None
+    return tuple(spec)
+
+
+def _exact(value):
+    """The value of an unmasked or fully masked OXM field, None if partly masked"""
+    if isinstance(value, tuple):
+        value, mask = value
+        if mask not in ('255.255.255.255', 'ff:ff:ff:ff:ff:ff', 0xffff, 0x1fff):
+            return None
+    return value
+
+
+def parse_flow(dp, stats):
+    """
+    The (FlowMatch, actions) of one flow statistics entry, the reverse of
+    OfCtl.set_flow and build_actions; None if the flow uses anything else.
+    """
+    ofp = dp.ofproto
+    parser = dp.ofproto_parser
+    if hasattr(parser, 'OFPActionVlanVid'):
+        # OpenFlow 1.0: a fixed match structure with wildcard bits
+        match, wildcards = stats.match, stats.match.wildcards
+        # nw_src and nw_dst hold the number of wildcarded address bits, 32 or more is all
+        nw_src_bits = (wildcards & ofp.OFPFW_NW_SRC_MASK) >> ofp.OFPFW_NW_SRC_SHIFT
+        nw_dst_bits = (wildcards & ofp.OFPFW_NW_DST_MASK) >> ofp.OFPFW_NW_DST_SHIFT
+        flags = ofp.OFPFW_ALL & ~ofp.OFPFW_NW_SRC_MASK & ~ofp.OFPFW_NW_DST_MASK
+        known = ofp.OFPFW_IN_PORT | ofp.OFPFW_DL_TYPE | ofp.OFPFW_DL_DST | ofp.OFPFW_DL_VLAN
+        if ~wildcards & flags & ~known or 0 < nw_src_bits < 32 or nw_dst_bits < 32:
+            return None
+        fields = {}
+        if not wildcards & ofp.OFPFW_IN_PORT:
+            fields['in_port'] = match.in_port
+        if not wildcards & ofp.OFPFW_DL_TYPE:
+            fields['dl_type'] = match.dl_type
+        if not wildcards & ofp.OFPFW_DL_DST:
+            fields['dl_dst'] = bytes(match.dl_dst).hex(':')
+        if not wildcards & ofp.OFPFW_DL_VLAN:
+            fields['dl_vlan'] = match.dl_vlan
+        if nw_src_bits == 0:
+            fields['nw_src'] = socket.inet_ntoa(struct.pack('!I', match.nw_src))
+        actions = _actions_v1_0(parser, stats.actions)
+    else:
+        names = {'in_port': 'in_port', 'eth_type': 'dl_type', 'eth_dst': 'dl_dst',
+                 'vlan_vid': 'dl_vlan', 'arp_spa': 'nw_src', 'ipv4_src': 'nw_src'}
+        fields = {}
+        for name, value in stats.match.items():
+            value = _exact(value)
+            if name not in names or value is None:
+                return None
+            fields[names[name]] = value
+        if 'dl_vlan' in fields:
+            fields['dl_vlan'] &= ~ofp.OFPVID_PRESENT
+        actions = _actions_v1_2(ofp, parser, stats.instructions)
+    if actions is None:
+        return None
+    return FlowMatch(priority=stats.priority, **fields), actions
+
+
+def parse_group(dp, stats):
+    """
+    The (group_id, description) of one group description entry, the
+    reverse of build_buckets; None if it is not a group we install.
+    """
+    ofp = dp.ofproto
+    parser = dp.ofproto_parser
+    ports = []
+    for bucket in stats.buckets:
+        if len(bucket.actions) != 1 or not isinstance(bucket.actions[0], parser.OFPActionOutput):
+            return None
+        ports.append(bucket.actions[0].port)
+    if stats.type == ofp.OFPGT_SELECT:
+        return stats.group_id, select_group(ports)
+    if stats.type == ofp.OFPGT_FF:
+        return stats.group_id, failover_group(ports)
+    return None
+
+
+class FlowModCount():
+    """Number of flow mods sent for one update"""
+
+    def __init__(self):
+        self.add = 0
+        self.modify = 0
+        self.delete = 0
+        self.unchanged = 0
+        self.group_add = 0
+        self.group_delete = 0
+
+    def total(self):
+        return self.add + self.modify + self.delete + self.group_add + self.group_delete
+
+    def merge(self, other):
+        self.add += other.add
+        self.modify += other.modify
+        self.delete += other.delete
+        self.unchanged += other.unchanged
+        self.group_add += other.group_add
+        self.group_delete += other.group_delete
+
+    def __str__(self):
+        text = "{} add, {} modify, {} delete ({} unchanged)".format(
+            self.add, self.modify, self.delete, self.unchanged)
+        if self.group_add or self.group_delete:
+            text += ", groups: {} add, {} delete".format(self.group_add, self.group_delete)
+        return text
+
+
+class FlowReconciler():
+    """
+    Per-datapath model of installed flows.
+
+    installed[dpid] is the table as we last programmed it:
+    { FlowMatch: actions }
+    groups[dpid] is the group table as we last programmed it:
+    { group_id: group description }
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.installed = {}
+        self.groups = {}
+        self.group_ids = {}  # dpid : {group description: group_id}
+        self.next_group_id = {}  # dpid : next unused group_id
+        self.totals = FlowModCount()  # since the controller started
+        self.barriers = {}  # dpid : {xid: BatchCompletion}, see ofctl_utils.complete_batch
+        self.batches = {}  # dpid : BatchCompletion of the last batch sent
+
+    def forget(self, dpid):
+        """Drop the model of a datapath (e.g. the switch disconnected)"""
+        self.installed.pop(dpid, None)
+        self.groups.pop(dpid, None)
+        self.group_ids.pop(dpid, None)
+        self.next_group_id.pop(dpid, None)
+        self.barriers.pop(dpid, None)
+        self.batches.pop(dpid, None)
+
+    def adopt(self, dpid, flows: dict, groups: dict):
+        """
+        Take the flows { FlowMatch: actions } and groups { group_id:
+        description } read from a datapath as what is installed on it
+        """
+        self.installed[dpid] = dict(flows)
+        self.groups[dpid] = dict(groups)
+        self.group_ids[dpid] = {spec: gid for gid, spec in sorted(groups.items(), reverse=True)}
+        self.next_group_id[dpid] = max(groups, default=0) + 1
+
+    def group_id(self, dpid, spec) -> int:
+        """Return the group id of a group description on dpid, allocating one if needed"""
+        ids = self.group_ids.setdefault(dpid, {})
+        if spec not in ids:
+            ids[spec] = self.next_group_id.get(dpid, 1)
+            self.next_group_id[dpid] = ids[spec] + 1
+        return ids[spec]
+
+    def diff(self, dpid, desired: dict):
+        """
+        Compare the desired table of a datapath with the installed one.
+        :return: (to_add, to_modify, to_delete), lists of (match, actions)
+        """
+        current = self.installed.get(dpid, {})
+        to_add, to_modify, to_delete = [], [], []
+        for match, actions in desired.items():
+            if match not in current:
+                to_add.append((match, actions))
+            elif current[match] != actions:
+                to_modify.append((match, actions))
+        for match, actions in current.items():
+            if match not in desired:
+                to_delete.append((match, actions))
+        return to_add, to_modify, to_delete
+
+    def reconcile(self, ofctl, desired: dict) -> FlowModCount:
+        """
+        Send only the flow mods needed to turn the installed table of
+        ofctl.dp into the desired one.
+        """
+        dp = ofctl.dp
+        to_add, to_modify, to_delete = self.diff(dp.id, desired)
+        count = FlowModCount()
+        ofctl.begin_batch()
+
+        # Groups used by the desired flows; a group id always keeps its description
+        used = {action[1] for actions in desired.values() for action in actions
+                if action[0] == 'group'}
+        wanted = {gid: spec for spec, gid in self.group_ids.get(dp.id, {}).items() if gid in used}
+        installed_groups = self.groups.get(dp.id, {})
+        for gid, spec in wanted.items():
+            if gid not in installed_groups:
+                group_type, buckets = build_buckets(dp, spec)
+                ofctl.set_group(gid, group_type, buckets)
+                count.group_add += 1
+        if count.group_add:
+            # Switches may reorder messages between barriers
+            ofctl.add_barrier()
+
+        # Delete first, so that a flow that moves never overlaps with its old rule
+        for match, _ in to_delete:
+            self._delete_flow(ofctl, match)
+            count.delete += 1
+        for match, actions in to_add + to_modify:
+            self._set_flow(ofctl, match, actions)
+        count.add = len(to_add)
+        count.modify = len(to_modify)
+        count.unchanged = len(desired) - count.add - count.modify
+
+        # Groups are removed only once no flow points to them any more
+        unused = [gid for gid in installed_groups if gid not in wanted]
+        if unused and count.total():
+            ofctl.add_barrier()
+        for gid in unused:
+            ofctl.delete_group(gid)
+            count.group_delete += 1
+        ids = self.group_ids.get(dp.id, {})
+        for spec in [spec for spec, gid in ids.items() if gid not in wanted]:
+            del ids[spec]
+
+        if count.total():
+            self.batches[dp.id] = ofctl.send_batch(self.barriers)
+        else:
+            ofctl.discard_batch()
+
+        self.groups[dp.id] = wanted
+        self.installed[dp.id] = dict(desired)
+        self.totals.merge(count)
+        return count
+
+    def update(self, ofctl, changes: dict) -> FlowModCount:
+        """
+        Send the flow mods for a few rules of ofctl.dp without comparing
+        its whole table: changes is { FlowMatch: actions }, with None as
+        actions to delete the rule.  Groups the new actions refer to are
+        installed first; groups left unused stay until the next reconcile().
+        """
+        dp = ofctl.dp
+        current = self.installed.setdefault(dp.id, {})
+        to_delete = [match for match, actions in changes.items() if actions is None and match in current]
+        to_set = [(match, actions) for match, actions in changes.items()
+                  if actions is not None and current.get(match) != actions]
+        count = FlowModCount()
+        count.unchanged = len(changes) - len(to_delete) - len(to_set)
+        if not to_delete and not to_set:
+            return count
+        ofctl.begin_batch()
+
+        installed_groups = self.groups.setdefault(dp.id, {})
+        specs = {gid: spec for spec, gid in self.group_ids.get(dp.id, {}).items()}
+        for _, actions in to_set:
+            for action in actions:
+                if action[0] == 'group' and action[1] not in installed_groups:
+                    spec = installed_groups[action[1]] = specs[action[1]]
+                    group_type, buckets = build_buckets(dp, spec)
+                    ofctl.set_group(action[1], group_type, buckets)
+                    count.group_add += 1
+        if count.group_add:
+            ofctl.add_barrier()
+
+        for match in to_delete:
+            self._delete_flow(ofctl, match)
+            del current[match]
+            count.delete += 1
+        for match, actions in to_set:
+            self._set_flow(ofctl, match, actions)
+            if match in current:
+                count.modify += 1
+            else:
+                count.add += 1
+            current[match] = actions
+
+        self.batches[dp.id] = ofctl.send_batch(self.barriers)
+        self.totals.merge(count)
+        return count
+
+    @staticmethod
+    def _delete_flow(ofctl, match: FlowMatch):
+        ofctl.delete_flow(cookie=0, priority=match.priority, strict=True,
+                          match=ofctl.make_match(dl_type=match.dl_type, dl_dst=match.dl_dst,
+                                                 dl_vlan=match.dl_vlan, nw_src=match.nw_src,
+                                                 in_port=match.in_port))
+
+    @staticmethod
+    def _set_flow(ofctl, match: FlowMatch, actions: tuple):
+        # OFPFC_ADD with an identical match and priority replaces the actions
+        ofctl.set_flow(cookie=0, priority=match.priority, dl_type=match.dl_type,
+                       dl_dst=match.dl_dst, dl_vlan=match.dl_vlan, nw_src=match.nw_src,
+                       in_port=match.in_port, actions=build_actions(ofctl.dp, actions))
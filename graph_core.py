@@ -0,0 +1,160 @@
+"""Compact graph core shared by Dijkstra, Prim and the tree query
+
+Datapath IDs are not guaranteed to be contiguous (or small), so every
+dpid is mapped to a dense index 0..n-1 first.  The adjacency is stored
+in CSR form: the neighbours of node i are targets[offsets[i]:offsets[i+1]]
+with the matching weights, all kept in flat arrays.
+
+The algorithms use heapq on plain (distance, index) tuples instead of
+queue.PriorityQueue, which takes a lock on every put/get.
+
+"""
+
+import heapq
+from array import array
+
+INF = float('inf')
+
+
+class Graph():
+    """
+    Immutable directed graph in CSR form.
+
+    :param edges: iterable of (src_dpid, dst_dpid)
+    :param nodes: extra dpids that may have no link at all
+    :param weights: optional {(src_dpid, dst_dpid): weight}, default 1
+    """
+
+    def __init__(self, edges, nodes=(), weights=None):
+        edges = list(edges)
+        ids = set(nodes)
+        for u, v in edges:
+            ids.add(u)
+            ids.add(v)
+        self.ids = sorted(ids)  # index -> dpid
+        self.index = {dpid: i for i, dpid in enumerate(self.ids)}  # dpid -> index
+        n = len(self.ids)
+
+        index = self.index
+        degree = [0] * (n + 1)
+        for u, _ in edges:
+            degree[index[u] + 1] += 1
+        for i in range(n):
+            degree[i + 1] += degree[i]
+        self.offsets = array('l', degree)
+
+        fill = list(degree[:n])
+        targets = [0] * len(edges)
+        costs = [1.0] * len(edges)
+        for u, v in edges:
+            i = index[u]
+            targets[fill[i]] = index[v]
+            if weights is not None:
+                costs[fill[i]] = weights.get((u, v), 1)
+            fill[i] += 1
+        self.targets = array('l', targets)
+        self.weights = array('d', costs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def neighbours(self, i: int):
+        """Yield (index, weight) for the out-links of node index i"""
+        targets, weights = self.targets, self.weights
+        for k in range(self.offsets[i], self.offsets[i + 1]):
+            yield targets[k], weights[k]
+
+    def dijkstra(self, source: int):
+        """
+        Single source shortest paths from dpid `source`.
+        :return: (dist, pred) lists indexed by node index; pred is -1 for
+                 the source and for unreachable nodes
+        """
+        n = len(self.ids)
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        dist = [INF] * n
+        pred = [-1] * n
+        s = self.index[source]
+        dist[s] = 0
+        heap = [(0, s)]
+        pop, push = heapq.heappop, heapq.heappush
+        while heap:
+            d, u = pop(heap)
+            if d > dist[u]:
+                continue
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                nd = d + weights[k]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = u
+                    push(heap, (nd, v))
+        return dist, pred
+
+    def first_hops(self, source: int, dist: list, pred: list) -> list:
+        """
+        Turn the result of dijkstra(source) into the first hop (as an
+        index) towards every node, -1 where there is none.
+        """
+        s = self.index[source]
+        hop = [-1] * len(self.ids)
+        # A predecessor is always closer than its successor
+        for v in sorted(range(len(self.ids)), key=dist.__getitem__):
+            p = pred[v]
+            if p == s:
+                hop[v] = v
+            elif p != -1:
+                hop[v] = hop[p]
+        return hop
+
+    def prim(self, root: int) -> list:
+        """
+        Minimum spanning tree of the component containing dpid `root`.
+        :return: list of (child_index, parent_index)
+        """
+        n = len(self.ids)
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        done = bytearray(n)
+        best = [INF] * n
+        r = self.index[root]
+        best[r] = 0
+        heap = [(0, r, -1)]
+        tree = []
+        pop, push = heapq.heappop, heapq.heappush
+        while heap:
+            _, u, parent = pop(heap)
+            if done[u]:
+                continue
+            done[u] = 1
+            if parent != -1:
+                tree.append((u, parent))
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                if not done[v] and weights[k] < best[v]:
+                    best[v] = weights[k]
+                    push(heap, (weights[k], v, u))
+        return tree
+
+    def bfs_children(self, root: int) -> list:
+        """
+        Orient the graph (normally a tree) away from dpid `root`.
+        :return: list of child index lists, indexed by node index
+        """
+        n = len(self.ids)
+        offsets, targets = self.offsets, self.targets
+        children = [[] for _ in range(n)]
+        seen = bytearray(n)
+        r = self.index[root]
+        seen[r] = 1
+        frontier = [r]
+        while frontier:
+            nxt = []
+            for u in frontier:
+                for k in range(offsets[u], offsets[u + 1]):
+                    v = targets[k]
+                    if not seen[v]:
+                        seen[v] = 1
+                        children[u].append(v)
+                        nxt.append(v)
+            frontier = nxt
+        return children
@@ -0,0 +1,76 @@
+"""Aging of hosts that have not been heard from
+
+ryu reports a host once, when it first shows up, and never reports it
+gone; a host that left the network kept its rules on every switch.
+HostAging remembers when each host was last seen, by a host event or a
+packet-in it sent, in an OrderedDict kept in last-seen order: seeing a
+host moves it to the end, and the hosts to expire are popped from the
+front, so both are O(1) per host, whatever the number of hosts.
+
+Once their rules are installed, a host's traffic is handled by the
+switches -- unicast by the dl_dst rules, ARP broadcasts by the flood
+rules -- and does not reach the controller again.  So hosts are also
+refreshed from the port statistics of their switch: ports() takes the
+rx_packets counters of the host ports, and every host behind a port
+whose counter moved since the previous poll counts as seen.  The
+timeout has to be longer than the quietest host stays quiet.
+
+"""
+
+import time
+from collections import OrderedDict
+
+
+class HostAging():
+    """
+    :param timeout: seconds after which a host that was not seen expires
+    """
+
+    def __init__(self, timeout: float, clock=time.monotonic):
+        self.timeout = timeout
+        self.expired_total = 0
+        self._clock = clock
+        self._last_seen = OrderedDict()  # mac : clock(), oldest first
+        self._rx_packets = {}  # (dpid, port_no) : rx_packets at the previous poll
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def seen(self, mac: str):
+        self._last_seen[mac] = self._clock()
+        self._last_seen.move_to_end(mac)
+
+    def forget(self, mac: str):
+        self._last_seen.pop(mac, None)
+
+    def ports(self, rx_packets: dict, hosts: dict) -> int:
+        """
+        Refresh the hosts behind the ports that received packets since the last poll.
+        :param rx_packets: {(dpid, port_no): rx_packets counter} of one poll
+        :param hosts: {(dpid, port_no): MACs attached to that port}
+        :return: number of hosts refreshed
+        """
+        refreshed = 0
+        for port, count in rx_packets.items():
+            previous = self._rx_packets.get(port)
+            self._rx_packets[port] = count
+            if previous is None or previous == count:
+                continue
+            for mac in hosts.get(port, ()):
+                if mac in self._last_seen:
+                    self.seen(mac)
+                    refreshed += 1
+        return refreshed
+
+    def expire(self) -> list:
+        """Remove and return the MACs of the hosts not seen for timeout seconds"""
+        deadline = self._clock() - self.timeout
+        expired = []
+        while self._last_seen:
+            mac, last = next(iter(self._last_seen.items()))
+            if last > deadline:
+                break
+            del self._last_seen[mac]
+            expired.append(mac)
+        self.expired_total += len(expired)
+        return expired
@@ -0,0 +1,40 @@
+"""Switch labels for label based forwarding
+
+Every destination switch gets a VLAN ID in [VLANID_MIN, VLANID_MAX].  The
+ingress edge switch tags a packet with the label of the switch the
+destination host is attached to, core switches forward on the label only,
+and the egress switch pops the tag before delivering to the host port.
+
+"""
+
+from ofctl_utils import VLANID_MIN, VLANID_MAX
+
+
+class LabelAllocator():
+    """Stable dpid -> VLAN ID mapping"""
+
+    def __init__(self, first=VLANID_MIN, last=VLANID_MAX):
+        self.first = first
+        self.last = last
+        self.labels = {}  # dpid : vlan id
+        self.free = []  # released labels, reused first
+        self.next = first
+
+    def allocate(self, dpid: int) -> int:
+        """Return the label of dpid, allocating one if needed"""
+        if dpid in self.labels:
+            return self.labels[dpid]
+        if self.free:
+            label = self.free.pop()
+        elif self.next <= self.last:
+            label = self.next
+            self.next += 1
+        else:
+            raise ValueError("No VLAN ID left for switch {}".format(dpid))
+        self.labels[dpid] = label
+        return label
+
+    def release(self, dpid: int):
+        label = self.labels.pop(dpid, None)
+        if label is not None:
+            self.free.append(label)
@@ -0,0 +1,102 @@
+"""Congestion aware link weights
+
+LinkWeights turns periodic port counters into a smoothed utilization per
+switch port and maps it to an integer link weight with a configurable
+weight function.  A new weight is only committed when it differs enough
+from the current one (hysteresis), so that paths do not flap between two
+links whose load keeps crossing over.
+
+Weights are integers >= 1, which keeps path length comparisons exact.
+
+"""
+
+
+def hop_weight(utilization: float) -> int:
+    return 1
+
+
+def utilization_weight(utilization: float) -> int:
+    """Grows linearly with the load: 1 when idle, 11 at line rate"""
+    return 1 + int(round(10 * utilization))
+
+
+def residual_weight(utilization: float) -> int:
+    """Inverse of the residual bandwidth: 1 when idle, 100 when saturated"""
+    residual = max(1.0 - utilization, 0.01)
+    return max(1, int(round(1 / residual)))
+
+
+WEIGHT_FUNCTIONS = {
+    'hop': hop_weight,
+    'utilization': utilization_weight,
+    'residual': residual_weight,
+}
+
+
+class LinkWeights():
+    """
+    :param weight_fn: name in WEIGHT_FUNCTIONS
+    :param capacity: link capacity in bits per second
+    :param alpha: EWMA factor given to the newest sample
+    :param hysteresis: relative change needed before a weight is updated
+    """
+
+    def __init__(self, weight_fn='utilization', capacity=1e9, alpha=0.3, hysteresis=0.2):
+        self.weight_fn = WEIGHT_FUNCTIONS[weight_fn]
+        self.capacity = capacity
+        self.alpha = alpha
+        self.hysteresis = hysteresis
+
+        self.samples = {}  # (dpid, port_no) : (timestamp, tx_bytes)
+        self.utilization = {}  # (dpid, port_no) : smoothed utilization in [0, 1]
+        self.weights = {}  # (dpid, port_no) : committed weight
+
+    def record(self, dpid: int, port_no: int, tx_bytes: int, timestamp: float):
+        """Feed one port counter sample"""
+        key = (dpid, port_no)
+        last = self.samples.get(key)
+        self.samples[key] = (timestamp, tx_bytes)
+        if last is None or timestamp <= last[0] or tx_bytes < last[1]:
+            # First sample, or the counter was reset
+            return
+        rate = (tx_bytes - last[1]) * 8 / (timestamp - last[0])
+        sample = min(rate / self.capacity, 1.0)
+        old = self.utilization.get(key)
+        self.utilization[key] = sample if old is None else \
+            self.alpha * sample + (1 - self.alpha) * old
+
+    def forget(self, dpid: int):
+        """Drop all state of a switch that left"""
+        for table in (self.samples, self.utilization, self.weights):
+            for key in [k for k in table if k[0] == dpid]:
+                del table[key]
+
+    def refresh(self) -> bool:
+        """
+        Recompute the candidate weight of every port and commit the ones
+        that moved past the hysteresis band.
+        :return: True if any committed weight changed
+        """
+        changed = False
+        for key, utilization in self.utilization.items():
+            candidate = self.weight_fn(utilization)
+            current = self.weights.get(key, 1)
+            if candidate == current:
+                continue
+            if abs(candidate - current) > self.hysteresis * current:
+                self.weights[key] = candidate
+                changed = True
+        return changed
+
+    def link_weights(self, link_port_dict) -> dict:
+        """
+        :param link_port_dict: {src_dpid: {dst_dpid: src_port}}
+        :return: {(src_dpid, dst_dpid): weight} for the links whose weight is not 1
+        """
+        weights = {}
+        for u, ports in link_port_dict.items():
+            for v, port in ports.items():
+                w = self.weights.get((u, port), 1)
+                if w != 1:
+                    weights[(u, v)] = w
+        return weights
@@ -0,0 +1,157 @@
+"""Latency histograms and message counters in Prometheus text format
+
+Metrics keeps a few histograms and counters, keyed by metric name and a
+tuple of (label, value) pairs, and renders them in the Prometheus text
+exposition format; rest_api.py serves that on /metrics.
+
+Hot paths only pay for an observation when metrics are enabled: the
+controller keeps `self.metrics = None` otherwise, @timed methods then
+call straight through, and the other call sites check for None first.
+Values the controller already counts (ARP replies, coalescing, packet-in
+admission) are not counted twice but read by collectors at scrape time.
+
+"""
+
+import functools
+from bisect import bisect_left
+from time import perf_counter
+
+PREFIX = 'shortest_paths_'
+
+# Upper bounds in seconds, from 100 us to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HANDLER_SECONDS = 'handler_seconds'
+PHASE_SECONDS = 'phase_seconds'
+MESSAGES = 'messages_total'
+ARP_REPLIES = 'arp_requests_total'
+PACKET_INS = 'packet_ins_total'
+RECOMPUTES = 'recomputes_total'
+TOPOLOGY_EVENTS = 'topology_events_total'
+CONVERGENCE = 'convergence_seconds'
+PATH_CACHE = 'path_lookups_total'
+
+# name : (type, help)
+DESCRIPTIONS = {
+    HANDLER_SECONDS: ('histogram', 'Time spent in an event handler'),
+    PHASE_SECONDS: ('histogram', 'Time spent in one phase of a flow table update'),
+    MESSAGES: ('counter', 'OpenFlow messages sent, per datapath and message type'),
+    ARP_REPLIES: ('counter', 'ARP requests answered by the controller (hit) or flooded (miss)'),
+    PACKET_INS: ('counter', 'Packet-ins admitted or dropped by admission control, per reason'),
+    RECOMPUTES: ('counter', 'Flow table updates run'),
+    TOPOLOGY_EVENTS: ('counter', 'Topology events that asked for a flow table update'),
+    CONVERGENCE: ('gauge', 'Time the switches took to apply the last flow table update'),
+    PATH_CACHE: ('counter', 'Path queries answered from the path cache (hit) or the path engine (miss)'),
+}
+
+
+class Histogram():
+    """Cumulative counts are only computed when rendering"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """[(upper bound, observations <= bound)], ending with +Inf"""
+        total, result = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value in labels) + '}'
+
+
+def format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics():
+    """
+    Histograms and counters of one controller.
+    """
+
+    def __init__(self):
+        self.histograms = {}  # (name, labels) : Histogram
+        self.counters = {}  # (name, labels) : value
+        self.collectors = []  # callables returning [(name, labels, value)] at scrape time
+
+    def observe(self, name: str, value: float, labels=()):
+        histogram = self.histograms.get((name, labels))
+        if histogram is None:
+            histogram = self.histograms[(name, labels)] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, labels=(), amount=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        samples = {}  # name : [lines]
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            lines = samples.setdefault(name, [])
+            for bound, count in histogram.cumulative():
+                bucket = format_labels(labels + (('le', format_value(bound)),))
+                lines.append('{}{}_bucket{} {}'.format(PREFIX, name, bucket, count))
+            lines.append('{}{}_sum{} {}'.format(PREFIX, name, format_labels(labels),
+                                                format_value(histogram.sum)))
+            lines.append('{}{}_count{} {}'.format(PREFIX, name, format_labels(labels), histogram.count))
+        values = list(self.counters.items())
+        for collector in self.collectors:
+            values.extend(((name, labels), value) for name, labels, value in collector())
+        for (name, labels), value in sorted(values):
+            samples.setdefault(name, []).append('{}{}{} {}'.format(PREFIX, name, format_labels(labels),
+                                                                   format_value(value)))
+
+        out = []
+        for name in sorted(samples):
+            kind, text = DESCRIPTIONS.get(name, ('untyped', ''))
+            if text:
+                out.append('# HELP {}{} {}'.format(PREFIX, name, text))
+            out.append('# TYPE {}{} {}'.format(PREFIX, name, kind))
+            out.extend(samples[name])
+        return '\n'.join(out) + '\n'
+
+
+def timed(metric: str, **labels):
+    """
+    Decorator for methods of an object with a `metrics` attribute:
+    observe how long each call took, unless metrics is None.
+    """
+    labels = tuple(sorted(labels.items()))
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if metrics is None:
+                return method(self, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.observe(metric, perf_counter() - start, labels)
+        return wrapper
+    return decorator
@@ -0,0 +1,233 @@
+"""Immutable, versioned snapshots of the network
+
+The handlers used to keep the topology in half a dozen dictionaries
+(switch_host_mac, switch_host_ip, switch_host_port, switch_host,
+mac_host_port, TopoManager) and change them in place, while flow table
+updates, diagnostics and the route workers read them.  NetworkState
+replaces those: every change returns a new state with the next version
+number, and the old one stays valid.  A reader that takes `app.state`
+once sees one consistent network for as long as it needs, without locks
+or copies.
+
+Updates are copy-on-write: only the mapping an event touches is copied
+(e.g. the host table on a host add), everything else is shared with the
+previous state.  Each state records what changed relative to the state
+it was derived from, so diffing two consecutive versions is O(1); other
+pairs are compared mapping by mapping, skipping shared mappings.
+
+"""
+
+import weakref
+from collections import namedtuple
+from types import MappingProxyType
+
+# A host as seen by the controller; ipv4 is a tuple
+HostEntry = namedtuple('HostEntry', ['mac', 'dpid', 'port_no', 'ipv4'])
+
+
+class StateDiff(namedtuple('StateDiff', ['added_switches', 'removed_switches', 'added_links',
+                                         'removed_links', 'added_hosts', 'removed_hosts',
+                                         'moved_hosts'])):
+    """
+    Differences between two states, as frozensets: switches are dpids,
+    links (src, dst) pairs (a link whose port changed is removed and
+    added) and hosts MACs (moved: attached to another switch or port).
+    """
+
+    __slots__ = ()
+
+    def empty(self) -> bool:
+        return not any(self)
+
+    def __str__(self):
+        parts = ["{} {}".format(len(value), name.replace('_', ' '))
+                 for name, value in zip(self._fields, self) if value]
+        return ", ".join(parts) if parts else "no changes"
+
+
+NO_CHANGES = StateDiff(*[frozenset()] * len(StateDiff._fields))
+_EMPTY = MappingProxyType({})
+
+
+def _changes(**kwargs) -> StateDiff:
+    return NO_CHANGES._replace(**{name: frozenset(value) for name, value in kwargs.items()})
+
+
+def _compare(old, new):
+    """(added keys, removed keys, keys whose value changed) between two mappings"""
+    if old is new:
+        return (), (), ()
+    added = [key for key in new if key not in old]
+    removed = [key for key in old if key not in new]
+    changed = [key for key, value in new.items() if key in old and old[key] != value]
+    return added, removed, changed
+
+
+class NetworkState():
+    """
+    One version of the network.  Treat every attribute as read-only.
+
+    switches      frozenset of dpids
+    links         {(src_dpid, dst_dpid): src_port}, one entry per direction
+    hosts         {mac: HostEntry}
+    switch_hosts  {dpid: tuple of the MACs attached to it, in arrival order}
+    addresses     {ipv4: mac of the host that has it}
+    changes       StateDiff from the state this one was derived from
+    """
+
+    __slots__ = ('version', 'switches', 'links', 'hosts', 'switch_hosts', 'addresses', 'changes',
+                 '_parent', '_link_ports', '__weakref__')
+
+    def __init__(self, version=0, switches=frozenset(), links=_EMPTY, hosts=_EMPTY,
+                 switch_hosts=_EMPTY, addresses=_EMPTY, changes=NO_CHANGES, parent=None):
+        self.version = version
+        self.switches = switches
+        self.links = links
+        self.hosts = hosts
+        self.switch_hosts = switch_hosts
+        self.addresses = addresses
+        self.changes = changes
+        self._parent = weakref.ref(parent) if parent is not None else None
+        self._link_ports = None  # built on first use, the state never changes
+
+    def _derive(self, changes: StateDiff, **parts) -> 'NetworkState':
+        """The next version, sharing every part that is not given"""
+        for name, value in parts.items():
+            if isinstance(value, dict):
+                parts[name] = MappingProxyType(value)
+        return NetworkState(self.version + 1,
+                            parts.get('switches', self.switches),
+                            parts.get('links', self.links),
+                            parts.get('hosts', self.hosts),
+                            parts.get('switch_hosts', self.switch_hosts),
+                            parts.get('addresses', self.addresses),
+                            changes, self)
+
+    # ------------------------------------------------------------------
+    # Updates, each returning a new state (or self if nothing changed)
+    # ------------------------------------------------------------------
+    def add_switch(self, dpid: int) -> 'NetworkState':
+        if dpid in self.switches:
+            return self
+        return self._derive(_changes(added_switches=[dpid]), switches=self.switches | {dpid})
+
+    def remove_switch(self, dpid: int) -> 'NetworkState':
+        """Remove a switch together with its links and hosts"""
+        if dpid not in self.switches:
+            return self
+        gone_links = [key for key in self.links if dpid in key]
+        gone_hosts = self.switch_hosts.get(dpid, ())
+        parts = {'switches': self.switches - {dpid}}
+        if gone_links:
+            parts['links'] = {key: port for key, port in self.links.items() if dpid not in key}
+        if dpid in self.switch_hosts:
+            parts['hosts'] = {mac: host for mac, host in self.hosts.items() if host.dpid != dpid}
+            parts['switch_hosts'] = {sw: macs for sw, macs in self.switch_hosts.items() if sw != dpid}
+            parts['addresses'] = {ip: mac for ip, mac in self.addresses.items()
+                                  if mac in parts['hosts']}
+        return self._derive(_changes(removed_switches=[dpid], removed_links=gone_links,
+                                     removed_hosts=gone_hosts), **parts)
+
+    def add_link(self, src: int, dst: int, port: int) -> 'NetworkState':
+        """The link src -> dst, leaving src on port"""
+        if self.links.get((src, dst)) == port:
+            return self
+        links = dict(self.links)
+        removed = [(src, dst)] if (src, dst) in links else []
+        links[(src, dst)] = port
+        return self._derive(_changes(added_links=[(src, dst)], removed_links=removed), links=links)
+
+    def remove_link(self, src: int, dst: int) -> 'NetworkState':
+        if (src, dst) not in self.links:
+            return self
+        links = dict(self.links)
+        del links[(src, dst)]
+        return self._derive(_changes(removed_links=[(src, dst)]), links=links)
+
+    def add_host(self, mac: str, dpid: int, port_no: int, ipv4=()) -> 'NetworkState':
+        """
+        Add a host, or move it if it is known on another switch port.
+        An address another host had is taken away from that host.
+        """
+        old = self.hosts.get(mac)
+        host = HostEntry(mac, dpid, port_no, tuple(ipv4))
+        if old == host:
+            return self
+        hosts = dict(self.hosts)
+        hosts[mac] = host
+        switch_hosts = dict(self.switch_hosts)
+        if old is not None and old.dpid != dpid:
+            switch_hosts[old.dpid] = tuple(m for m in switch_hosts[old.dpid] if m != mac)
+        if old is None or old.dpid != dpid:
+            switch_hosts[dpid] = switch_hosts.get(dpid, ()) + (mac,)
+        parts = {'hosts': hosts, 'switch_hosts': switch_hosts}
+        if old is None or old.ipv4 != host.ipv4:
+            addresses = parts['addresses'] = dict(self.addresses)
+            for ip in old.ipv4 if old is not None else ():
+                if ip not in host.ipv4:
+                    del addresses[ip]
+            for ip in host.ipv4:
+                owner = addresses.get(ip, mac)
+                if owner != mac:
+                    previous = hosts[owner]
+                    hosts[owner] = previous._replace(ipv4=tuple(a for a in previous.ipv4 if a != ip))
+                addresses[ip] = mac
+        if old is None:
+            changes = _changes(added_hosts=[mac])
+        elif (old.dpid, old.port_no) != (dpid, port_no):
+            changes = _changes(moved_hosts=[mac])
+        else:
+            changes = NO_CHANGES  # only the addresses changed
+        return self._derive(changes, **parts)
+
+    def remove_host(self, mac: str) -> 'NetworkState':
+        old = self.hosts.get(mac)
+        if old is None:
+            return self
+        hosts = dict(self.hosts)
+        del hosts[mac]
+        switch_hosts = dict(self.switch_hosts)
+        switch_hosts[old.dpid] = tuple(m for m in switch_hosts[old.dpid] if m != mac)
+        parts = {'hosts': hosts, 'switch_hosts': switch_hosts}
+        if old.ipv4:
+            parts['addresses'] = {ip: owner for ip, owner in self.addresses.items() if owner != mac}
+        return self._derive(_changes(removed_hosts=[mac]), **parts)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def hosts_of(self, dpid: int) -> list:
+        """HostEntries of the hosts attached to dpid"""
+        return [self.hosts[mac] for mac in self.switch_hosts.get(dpid, ())]
+
+    def host_ports(self, dpid: int) -> list:
+        return [self.hosts[mac].port_no for mac in self.switch_hosts.get(dpid, ())]
+
+    def is_link_port(self, dpid: int, port_no: int) -> bool:
+        """Whether port_no of dpid leads to another switch rather than to hosts"""
+        if self._link_ports is None:
+            self._link_ports = frozenset((src, port) for (src, _), port in self.links.items())
+        return (dpid, port_no) in self._link_ports
+
+    def link_port_dict(self) -> dict:
+        """{src_dpid: {dst_dpid: src_port}}, as get_topology_data() returns it"""
+        ports = {}
+        for (src, dst), port in self.links.items():
+            ports.setdefault(src, {})[dst] = port
+        return ports
+
+    def diff(self, old: 'NetworkState') -> StateDiff:
+        """What changed from old to this state"""
+        if old is self:
+            return NO_CHANGES
+        if self._parent is not None and self._parent() is old:
+            return self.changes
+
+        links = _compare(old.links, self.links)
+        hosts = _compare(old.hosts, self.hosts)
+        moved = [mac for mac in hosts[2] if (old.hosts[mac].dpid, old.hosts[mac].port_no) !=
+                 (self.hosts[mac].dpid, self.hosts[mac].port_no)]
+        return _changes(added_switches=self.switches - old.switches,
+                        removed_switches=old.switches - self.switches,
+                        added_links=links[0] + links[2], removed_links=links[1] + links[2],
+                        added_hosts=hosts[0], removed_hosts=hosts[1], moved_hosts=moved)
@@ -17,6 +17,7 @@
 import numbers
 import socket
 import struct
+import time
 
 from ryu.exception import OFPUnknownVersion
 from ryu.lib import dpid as dpid_lib
@@ -91,6 +92,52 @@ class OfCtl(object):
         self.dp = dp
         self.sw_id = {'sw_id': dpid_lib.dpid_to_str(dp.id)}
         self.logger = logger
+        self.batch = None  # messages queued by begin_batch()
+
+    def send_msg(self, msg):
+        """Send a flow/group/meter mod now, or queue it while a batch is open"""
+        if self.batch is not None:
+            self.batch.append(msg)
+        else:
+            self.dp.send_msg(msg)
+
+    def begin_batch(self):
+        """Queue the messages of the following calls until send_batch()"""
+        self.batch = []
+
+    def discard_batch(self):
+        """Drop the messages queued since begin_batch() without sending them"""
+        self.batch = None
+
+    def add_barrier(self):
+        """Make the switch finish the messages before this point before it starts on the next ones"""
+        self.send_msg(self.dp.ofproto_parser.OFPBarrierRequest(self.dp))
+
+    def send_batch(self, barriers):
+        """
+        Write the queued messages to the switch in one go, followed by a
+        barrier request.
+        Arguments:
+        barriers -- {dpid: {xid: BatchCompletion}}, completed by
+                    complete_batch() when the barrier reply arrives
+        Returns the BatchCompletion of this batch
+        """
+        msgs, self.batch = self.batch or [], None
+        bufs = []
+        for msg in msgs:
+            if msg.xid is None:
+                self.dp.set_xid(msg)
+            msg.serialize()
+            bufs.append(msg.buf)
+
+        barrier = self.dp.ofproto_parser.OFPBarrierRequest(self.dp)
+        self.dp.set_xid(barrier)
+        completion = BatchCompletion(self.dp.id, len(msgs))
+        barriers.setdefault(self.dp.id, {})[barrier.xid] = completion
+        if bufs:
+            self.dp.send(b''.join(bufs))
+        self.dp.send_msg(barrier)
+        return completion
 
     def set_sw_config_for_ttl(self):
         # OpenFlow v1_2/1_3.
@@ -98,7 +145,7 @@ class OfCtl(object):
 
     def set_flow(self, cookie, priority, dl_type=0, dl_dst=0, dl_vlan=0,
                  nw_src=0, src_mask=32, nw_dst=0, dst_mask=32,
-                 nw_proto=0, idle_timeout=0, actions=None):
+                 nw_proto=0, idle_timeout=0, actions=None, in_port=0):
         """
         Send a message to install a flow on this datapath
         The following arguments specify match criteria:
@@ -112,6 +159,7 @@ class OfCtl(object):
         nw_dst       -- IP destination
         dst_mask     -- IP destination mask (default /32)
         nw_proto     -- IP protocol value
+        in_port      -- Input port (default 0, any)
         Other arguments:
         idle_timeout  -- Idle timeout (default 0)
         actions       -- List of actions to apply on match
@@ -119,7 +167,17 @@ class OfCtl(object):
         # Abstract method
         raise NotImplementedError()
 
-    def delete_flow(self, cookie=0, priority=0, match=None):
+    def make_match(self, dl_type=0, dl_dst=0, dl_vlan=0,
+                   nw_src=0, src_mask=32, nw_dst=0, dst_mask=32,
+                   nw_proto=0, in_port=0):
+        """
+        Build an OFPMatch for this datapath from the same match
+        criteria accepted by set_flow
+        """
+        # Abstract method
+        raise NotImplementedError()
+
+    def delete_flow(self, cookie=0, priority=0, match=None, strict=False):
         """
         Delete a flow matching the following criteria
         Arguments:
@@ -128,6 +186,8 @@ class OfCtl(object):
         priority     -- Priority value for this flow (default 0)
         match        -- Match criteria for deletion
                         (defaults to all)
+        strict       -- Only delete the flow whose match and priority
+                        are exactly the given ones (default False)
 
         NOTE:  OpenFlow 1.0 does not support deletion based on
         the cookie value.  Instead, match fields must be specified.
@@ -269,13 +329,16 @@ class OfCtl(object):
         self.set_flow(cookie, priority, actions=actions)
 
     def set_packetin_flow(self, cookie, priority, dl_type=0, dl_dst=0,
-                          dl_vlan=0, dst_ip=0, dst_mask=32, nw_proto=0):
+                          dl_vlan=0, dst_ip=0, dst_mask=32, nw_proto=0,
+                          meter_id=0):
         miss_send_len = UINT16_MAX
         actions = [self.dp.ofproto_parser.OFPActionOutput(
             self.dp.ofproto.OFPP_CONTROLLER, miss_send_len)]
+        # Meters only exist from OpenFlow 1.3 on
+        kwargs = {'meter_id': meter_id} if meter_id else {}
         self.set_flow(cookie, priority, dl_type=dl_type, dl_dst=dl_dst,
                       dl_vlan=dl_vlan, nw_dst=dst_ip, dst_mask=dst_mask,
-                      nw_proto=nw_proto, actions=actions)
+                      nw_proto=nw_proto, actions=actions, **kwargs)
 
     def send_stats_request(self, stats, waiters):
         self.dp.set_xid(stats)
@@ -285,10 +348,9 @@ class OfCtl(object):
         waiters_per_dp[stats.xid] = (event, msgs)
         self.dp.send_msg(stats)
 
-        try:
-            event.wait(timeout=OFP_REPLY_TIMER)
-        except hub.Timeout:
-            del waiters_per_dp[stats.xid]
+        # hub.Event.wait() returns False on timeout instead of raising
+        if not event.wait(timeout=OFP_REPLY_TIMER):
+            waiters_per_dp.pop(stats.xid, None)
 
         return msgs
 
@@ -312,15 +374,19 @@ class OfCtl_v1_0(OfCtl):
                                                0xff, ofp.OFPP_NONE)
         return self.send_stats_request(stats, waiters)
 
-    def set_flow(self, cookie, priority, dl_type=0, dl_dst=0, dl_vlan=0,
-                 nw_src=0, src_mask=32, nw_dst=0, dst_mask=32,
-                 nw_proto=0, idle_timeout=0, actions=None):
+    def get_port_stats(self, waiters):
+        ofp = self.dp.ofproto
+        ofp_parser = self.dp.ofproto_parser
+
+        stats = ofp_parser.OFPPortStatsRequest(self.dp, 0, ofp.OFPP_NONE)
+        return self.send_stats_request(stats, waiters)
 
+    def make_match(self, dl_type=0, dl_dst=0, dl_vlan=0,
+                   nw_src=0, src_mask=32, nw_dst=0, dst_mask=32,
+                   nw_proto=0, in_port=0):
         ofp = self.dp.ofproto
         ofp_parser = self.dp.ofproto_parser
-        cmd = ofp.OFPFC_ADD
 
-        # Match
         wildcards = ofp.OFPFW_ALL
         if dl_type:
             wildcards &= ~ofp.OFPFW_DL_TYPE
@@ -340,26 +406,44 @@ class OfCtl_v1_0(OfCtl):
             nw_dst = ipv4_text_to_int(nw_dst)
         if nw_proto:
             wildcards &= ~ofp.OFPFW_NW_PROTO
+        if in_port:
+            wildcards &= ~ofp.OFPFW_IN_PORT
 
-        match = ofp_parser.OFPMatch(wildcards, 0, 0, dl_dst, dl_vlan, 0,
-                                    dl_type, 0, nw_proto,
-                                    nw_src, nw_dst, 0, 0)
+        return ofp_parser.OFPMatch(wildcards, in_port, 0, dl_dst, dl_vlan, 0,
+                                   dl_type, 0, nw_proto,
+                                   nw_src, nw_dst, 0, 0)
+
+    def set_flow(self, cookie, priority, dl_type=0, dl_dst=0, dl_vlan=0,
+                 nw_src=0, src_mask=32, nw_dst=0, dst_mask=32,
+                 nw_proto=0, idle_timeout=0, actions=None, in_port=0):
+
+        ofp = self.dp.ofproto
+        ofp_parser = self.dp.ofproto_parser
+        cmd = ofp.OFPFC_ADD
+
+        match = self.make_match(dl_type=dl_type, dl_dst=dl_dst, dl_vlan=dl_vlan,
+                                nw_src=nw_src, src_mask=src_mask,
+                                nw_dst=nw_dst, dst_mask=dst_mask,
+                                nw_proto=nw_proto, in_port=in_port)
         actions = actions or []
 
         m = ofp_parser.OFPFlowMod(self.dp, match, cookie, cmd,
                                   idle_timeout=idle_timeout,
                                   priority=priority, actions=actions)
-        self.dp.send_msg(m)
+        self.send_msg(m)
 
-    def delete_flow(self, cookie=0, priority=0, match=None):
-        cmd = self.dp.ofproto.OFPFC_DELETE
+    def delete_flow(self, cookie=0, priority=0, match=None, strict=False):
+        if strict:
+            cmd = self.dp.ofproto.OFPFC_DELETE_STRICT
+        else:
+            cmd = self.dp.ofproto.OFPFC_DELETE
         actions = []
 
         ofp_parser = self.dp.ofproto_parser
 
         flow_mod = self.dp.ofproto_parser.OFPFlowMod(
             self.dp, match=match, cookie=cookie, command=cmd, priority=priority, actions=actions)
-        self.dp.send_msg(flow_mod)
+        self.send_msg(flow_mod)
 
 
 class OfCtl_after_v1_2(OfCtl):
@@ -381,22 +465,26 @@ class OfCtl_after_v1_2(OfCtl):
     def get_all_flow(self, waiters):
         pass
 
-    def set_flow(self, cookie, priority, dl_type=0, dl_dst=0, dl_vlan=0,
-                 nw_src=0, src_mask=32, nw_dst=0, dst_mask=32,
-                 nw_proto=0, idle_timeout=0, actions=None):
-        ofp = self.dp.ofproto
+    def make_match(self, dl_type=0, dl_dst=0, dl_vlan=0,
+                   nw_src=0, src_mask=32, nw_dst=0, dst_mask=32,
+                   nw_proto=0, in_port=0):
         ofp_parser = self.dp.ofproto_parser
-        cmd = ofp.OFPFC_ADD
 
-        # Match
         match = ofp_parser.OFPMatch()
+        if in_port:
+            match.set_in_port(in_port)
         if dl_type:
             match.set_dl_type(dl_type)
         if dl_dst:
-            match.set_dl_dst(dl_dst)
+            # The old style match API packs the address as raw bytes
+            match.set_dl_dst(addrconv.mac.text_to_bin(dl_dst))
         if dl_vlan:
             match.set_vlan_vid(dl_vlan)
-        if nw_src:
+        if nw_src and dl_type == ether.ETH_TYPE_ARP:
+            # OpenFlow 1.0 nw_src doubles as the ARP sender address
+            match.set_arp_spa_masked(ipv4_text_to_int(nw_src),
+                                     mask_ntob(src_mask))
+        elif nw_src:
             match.set_ipv4_src_masked(ipv4_text_to_int(nw_src),
                                       mask_ntob(src_mask))
         if nw_dst:
@@ -407,16 +495,33 @@ class OfCtl_after_v1_2(OfCtl):
                 match.set_ip_proto(nw_proto)
             elif dl_type == ether.ETH_TYPE_ARP:
                 match.set_arp_opcode(nw_proto)
+        return match
+
+    def set_flow(self, cookie, priority, dl_type=0, dl_dst=0, dl_vlan=0,
+                 nw_src=0, src_mask=32, nw_dst=0, dst_mask=32,
+                 nw_proto=0, idle_timeout=0, actions=None, meter_id=0, in_port=0):
+        ofp = self.dp.ofproto
+        ofp_parser = self.dp.ofproto_parser
+        cmd = ofp.OFPFC_ADD
+
+        # Match
+        match = self.make_match(dl_type=dl_type, dl_dst=dl_dst, dl_vlan=dl_vlan,
+                                nw_src=nw_src, src_mask=src_mask,
+                                nw_dst=nw_dst, dst_mask=dst_mask,
+                                nw_proto=nw_proto, in_port=in_port)
 
         # Instructions
         actions = actions or []
         inst = [ofp_parser.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS,
                                                  actions)]
+        if meter_id:
+            # OpenFlow 1.3+
+            inst.insert(0, ofp_parser.OFPInstructionMeter(meter_id))
 
         m = ofp_parser.OFPFlowMod(self.dp, cookie, 0, 0, cmd, idle_timeout,
                                   0, priority, UINT32_MAX, ofp.OFPP_ANY,
                                   ofp.OFPG_ANY, 0, match, inst)
-        self.dp.send_msg(m)
+        self.send_msg(m)
 
     def set_routing_flow(self, cookie, priority, outport, dl_vlan=0,
                          nw_src=0, src_mask=32, nw_dst=0, dst_mask=32,
@@ -441,21 +546,21 @@ class OfCtl_after_v1_2(OfCtl):
                       nw_dst=nw_dst, dst_mask=dst_mask,
                       idle_timeout=idle_timeout, actions=actions)
 
-    def delete_flow(self, cookie, priority=0, match=None):
+    def delete_flow(self, cookie, priority=0, match=None, strict=False):
         ofp = self.dp.ofproto
         ofp_parser = self.dp.ofproto_parser
 
         if match is None:
             match = ofp_parser.OFPMatch()
 
-        cmd = ofp.OFPFC_DELETE
+        cmd = ofp.OFPFC_DELETE_STRICT if strict else ofp.OFPFC_DELETE
         cookie_mask = UINT64_MAX
         inst = []
 
         flow_mod = ofp_parser.OFPFlowMod(self.dp, cookie, cookie_mask, 0, cmd,
-                                         0, 0, 0, UINT32_MAX, ofp.OFPP_ANY,
+                                         0, 0, priority, UINT32_MAX, ofp.OFPP_ANY,
                                          ofp.OFPG_ANY, 0, match, inst)
-        self.dp.send_msg(flow_mod)
+        self.send_msg(flow_mod)
         self.logger.info('Delete flow [cookie=0x%x]', cookie, extra=self.sw_id)
 
 
@@ -470,7 +575,7 @@ class OfCtl_v1_2(OfCtl_after_v1_2):
         miss_send_len = UINT16_MAX
         m = self.dp.ofproto_parser.OFPSetConfig(self.dp, flags,
                                                 miss_send_len)
-        self.dp.send_msg(m)
+        self.send_msg(m)
         self.logger.info('Set SW config for TTL error packet in.',
                          extra=self.sw_id)
 
@@ -483,6 +588,13 @@ class OfCtl_v1_2(OfCtl_after_v1_2):
                                                ofp.OFPG_ANY, 0, 0, match)
         return self.send_stats_request(stats, waiters)
 
+    def get_port_stats(self, waiters):
+        ofp = self.dp.ofproto
+        ofp_parser = self.dp.ofproto_parser
+
+        stats = ofp_parser.OFPPortStatsRequest(self.dp, ofp.OFPP_ANY, 0)
+        return self.send_stats_request(stats, waiters)
+
 
 @OfCtl.register_of_version(ofproto_v1_3.OFP_VERSION)
 class OfCtl_v1_3(OfCtl_after_v1_2):
@@ -502,7 +614,7 @@ class OfCtl_v1_3(OfCtl_after_v1_2):
         m = self.dp.ofproto_parser.OFPSetAsync(
             self.dp, [packet_in_mask, 0], [port_status_mask, 0],
             [flow_removed_mask, 0])
-        self.dp.send_msg(m)
+        self.send_msg(m)
         self.logger.info('Set SW config for TTL error packet in.',
                          extra=self.sw_id)
 
@@ -515,6 +627,105 @@ class OfCtl_v1_3(OfCtl_after_v1_2):
                                                ofp.OFPG_ANY, 0, 0, match)
         return self.send_stats_request(stats, waiters)
 
+    def get_port_stats(self, waiters):
+        ofp = self.dp.ofproto
+        ofp_parser = self.dp.ofproto_parser
+
+        stats = ofp_parser.OFPPortStatsRequest(self.dp, 0, ofp.OFPP_ANY)
+        return self.send_stats_request(stats, waiters)
+
+    def get_group_desc(self, waiters):
+        ofp_parser = self.dp.ofproto_parser
+
+        stats = ofp_parser.OFPGroupDescStatsRequest(self.dp, 0)
+        return self.send_stats_request(stats, waiters)
+
+    def set_group(self, group_id, group_type, buckets, modify=False):
+        """
+        Send a message to install (or replace) a group on this datapath
+        Arguments:
+        group_id     -- Group identifier
+        group_type   -- OFPGT_ALL, OFPGT_SELECT, OFPGT_INDIRECT or OFPGT_FF
+        buckets      -- List of (actions, weight, watch_port) tuples;
+                        watch_port may be None (OFPP_ANY)
+        modify       -- Replace an existing group instead of adding one
+        """
+        ofp = self.dp.ofproto
+        ofp_parser = self.dp.ofproto_parser
+        cmd = ofp.OFPGC_MODIFY if modify else ofp.OFPGC_ADD
+
+        ofp_buckets = []
+        for actions, weight, watch_port in buckets:
+            if watch_port is None:
+                watch_port = ofp.OFPP_ANY
+            ofp_buckets.append(ofp_parser.OFPBucket(weight, watch_port, ofp.OFPG_ANY, actions))
+
+        m = ofp_parser.OFPGroupMod(self.dp, cmd, group_type, group_id, ofp_buckets)
+        self.send_msg(m)
+
+    def delete_group(self, group_id):
+        """Send a message to remove a group from this datapath"""
+        ofp = self.dp.ofproto
+        ofp_parser = self.dp.ofproto_parser
+
+        m = ofp_parser.OFPGroupMod(self.dp, ofp.OFPGC_DELETE, 0, group_id, [])
+        self.send_msg(m)
+
+    def set_meter(self, meter_id, rate, burst_size=0, modify=False):
+        """
+        Send a message to install (or replace) a meter that drops packets
+        above `rate` packets per second
+        Arguments:
+        meter_id     -- Meter identifier
+        rate         -- Packets per second
+        burst_size   -- Packets allowed above the rate in a burst (0: none)
+        modify       -- Replace an existing meter instead of adding one
+        """
+        ofp = self.dp.ofproto
+        ofp_parser = self.dp.ofproto_parser
+        cmd = ofp.OFPMC_MODIFY if modify else ofp.OFPMC_ADD
+
+        flags = ofp.OFPMF_PKTPS
+        if burst_size:
+            flags |= ofp.OFPMF_BURST
+        bands = [ofp_parser.OFPMeterBandDrop(rate=rate, burst_size=burst_size)]
+        m = ofp_parser.OFPMeterMod(self.dp, cmd, flags, meter_id, bands)
+        self.send_msg(m)
+
+
+class BatchCompletion(object):
+    """
+    Completion future of a batch sent by OfCtl.send_batch().  It is done
+    when the switch answers the barrier that follows the batch, i.e. once
+    every message of the batch has been processed.
+    """
+
+    def __init__(self, dpid, size):
+        self.dpid = dpid
+        self.size = size  # number of messages in the batch
+        self.sent_at = time.monotonic()
+        self.latency = None  # seconds from sending to the barrier reply
+        self.event = hub.Event()
+
+    def done(self):
+        return self.latency is not None
+
+    def wait(self, timeout=None):
+        """Block until the barrier reply arrived; returns False on timeout"""
+        return self.event.wait(timeout=timeout)
+
+    def set_done(self):
+        self.latency = time.monotonic() - self.sent_at
+        self.event.set()
+
+
+def complete_batch(barriers, msg):
+    """Complete the batch a barrier reply belongs to; returns it, or None"""
+    completion = barriers.get(msg.datapath.id, {}).pop(msg.xid, None)
+    if completion is not None:
+        completion.set_done()
+    return completion
+
 
 def ip_addr_aton(ip_str, err_msg=None):
     try:
@@ -0,0 +1,101 @@
+"""Fast path packet-in parser
+
+parse_frame() reads the few header fields the controller acts on -- the
+Ethernet addresses and type, the VLAN tag and the ARP opcode and
+addresses -- straight from msg.data with precompiled struct offsets.
+The frame itself is never copied; only the small fields are unpacked.
+Other protocols are left alone: payload() hands out a memoryview of
+the bytes after the Ethernet header(s) for callers that need them, and
+full ryu decoding is kept for packets the fast path does not handle.
+
+Addresses are returned packed (6 byte MACs, 4 byte IPv4 addresses);
+mac_text() and ip_text() turn them into the usual text form.
+
+"""
+
+import socket
+import struct
+
+ETH_TYPE_IP = 0x0800
+ETH_TYPE_ARP = 0x0806
+ETH_TYPE_8021Q = 0x8100
+ETH_TYPE_8021AD = 0x88a8
+VLAN_TYPES = (ETH_TYPE_8021Q, ETH_TYPE_8021AD)
+
+ARP_REQUEST = 1
+ARP_REPLY = 2
+
+ETH_HEADER = struct.Struct('!6s6sH')
+VLAN_TAG = struct.Struct('!HH')  # TCI, inner ethertype
+# htype, ptype, hlen, plen, opcode, sha, spa, tha, tpa
+ARP_PACKET = struct.Struct('!HHBBH6s4s6s4s')
+# The common case, an untagged ARP frame, in one go
+ETH_ARP = struct.Struct('!6s6sH' + ARP_PACKET.format[1:])
+
+
+class FrameInfo():
+    """Header fields of one frame; the arp_* fields are None unless it is an Ethernet/IPv4 ARP"""
+
+    __slots__ = ('data', 'eth_dst', 'eth_src', 'ethertype', 'vlan_id', 'offset',
+                 'arp_opcode', 'arp_sha', 'arp_spa', 'arp_tha', 'arp_tpa')
+
+    def __init__(self, data, eth_dst, eth_src, ethertype, vlan_id, offset,
+                 arp_opcode=None, arp_sha=None, arp_spa=None, arp_tha=None, arp_tpa=None):
+        self.data = data
+        self.eth_dst = eth_dst
+        self.eth_src = eth_src
+        self.ethertype = ethertype  # after any VLAN tags
+        self.vlan_id = vlan_id  # outermost tag, None if untagged
+        self.offset = offset  # start of the layer 3 header
+        self.arp_opcode = arp_opcode
+        self.arp_sha = arp_sha
+        self.arp_spa = arp_spa
+        self.arp_tha = arp_tha
+        self.arp_tpa = arp_tpa
+
+    def payload(self) -> memoryview:
+        """The bytes after the Ethernet header(s), without copying them"""
+        return memoryview(self.data)[self.offset:]
+
+    def is_arp_request(self) -> bool:
+        return self.arp_opcode == ARP_REQUEST
+
+
+def parse_frame(data) -> FrameInfo:
+    """Parse the headers of a frame, None if it is too short to be Ethernet"""
+    size = len(data)
+    if size < ETH_HEADER.size:
+        return None
+    if data[12] == 0x08 and data[13] == 0x06 and size >= ETH_ARP.size:
+        dst, src, _, htype, ptype, hlen, plen, opcode, sha, spa, tha, tpa = ETH_ARP.unpack_from(data, 0)
+        if htype == 1 and ptype == ETH_TYPE_IP and hlen == 6 and plen == 4:
+            return FrameInfo(data, dst, src, ETH_TYPE_ARP, None, ETH_HEADER.size,
+                             opcode, sha, spa, tha, tpa)
+
+    dst, src, ethertype = ETH_HEADER.unpack_from(data, 0)
+    offset = ETH_HEADER.size
+    vlan_id = None
+    while ethertype in VLAN_TYPES and size >= offset + VLAN_TAG.size:
+        tci, ethertype = VLAN_TAG.unpack_from(data, offset)
+        if vlan_id is None:
+            vlan_id = tci & 0x0fff
+        offset += VLAN_TAG.size
+    info = FrameInfo(data, dst, src, ethertype, vlan_id, offset)
+
+    if ethertype == ETH_TYPE_ARP and size >= offset + ARP_PACKET.size:
+        htype, ptype, hlen, plen, opcode, sha, spa, tha, tpa = ARP_PACKET.unpack_from(data, offset)
+        if htype == 1 and ptype == ETH_TYPE_IP and hlen == 6 and plen == 4:
+            info.arp_opcode = opcode
+            info.arp_sha = sha
+            info.arp_spa = spa
+            info.arp_tha = tha
+            info.arp_tpa = tpa
+    return info
+
+
+def mac_text(mac: bytes) -> str:
+    return mac.hex(':')
+
+
+def ip_text(ip: bytes) -> str:
+    return socket.inet_ntoa(ip)
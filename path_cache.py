@@ -0,0 +1,50 @@
+"""Bounded LRU cache of switch paths
+
+Path lookups from other apps or the REST API can come in much faster
+than the topology changes.  PathCache keeps the most recently used
+switch paths, keyed by (epoch, src, dst).  The controller calls
+invalidate() whenever the path engine reports changed next hops, which
+only bumps the epoch: entries of older epochs can no longer be hit and
+fall out of the LRU as new paths come in, so invalidation is O(1)
+however many paths are cached.
+
+"""
+
+from collections import OrderedDict
+
+
+class PathCache():
+    """
+    :param lookup: callable(src, dst) returning the current switch path, [] if unreachable
+    :param capacity: maximum number of cached paths
+    """
+
+    def __init__(self, lookup, capacity=4096):
+        self.lookup = lookup
+        self.capacity = capacity
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (epoch, src, dst) : tuple of dpids
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self):
+        """The paths changed: forget every cached path, in O(1)"""
+        self.epoch += 1
+
+    def get(self, src: int, dst: int) -> tuple:
+        key = (self.epoch, src, dst)
+        path = self._entries.get(key)
+        if path is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return path
+        self.misses += 1
+        path = tuple(self.lookup(src, dst))
+        if self.capacity > 0:
+            self._entries[key] = path
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return path
@@ -0,0 +1,365 @@
+"""Dynamic shortest path engine
+
+This module keeps one shortest path tree per source switch and repairs
+the trees incrementally when a link is added or deleted, instead of
+rerunning Dijkstra from every switch on every topology event.
+
+Every update returns the (switch, destination) pairs whose next hop
+changed, so the caller only has to touch the rules that are affected.
+
+"""
+
+import heapq
+
+from graph_core import Graph
+
+INF = 0x3f3f3f3f
+
+
+def merge_changes(changed: dict, more: dict):
+    """
+    Fold the next hop changes of a later update into an earlier change set.
+    A pair that ends up on its original next hop is dropped.
+    """
+    for key, (old, new) in more.items():
+        if key in changed:
+            old = changed[key][0]
+        if old == new:
+            changed.pop(key, None)
+        else:
+            changed[key] = (old, new)
+
+
+class DynamicShortestPaths():
+    """
+    Per-source shortest path trees over a directed graph of switches.
+
+    For every source s we store:
+    dist[s][v]  -- length of the shortest path s -> v
+    pre[s][v]   -- predecessor of v on that path
+    hop[s][v]   -- first switch after s on that path (the next hop)
+    kids[s][u]  -- children of u in the tree of s
+    """
+
+    def __init__(self):
+        self.adj = {}  # u : {v: weight}
+        self.radj = {}  # v : {u: weight}
+        self.dist = {}
+        self.pre = {}
+        self.hop = {}
+        self.kids = {}
+
+    # ------------------------------------------------------------------
+    # Graph updates
+    # ------------------------------------------------------------------
+    def add_switch(self, u: int) -> dict:
+        """Add an isolated switch. Returns the changed next hops."""
+        if u in self.adj:
+            return {}
+        self.adj[u] = {}
+        self.radj[u] = {}
+        self.dist[u] = {u: 0}
+        self.pre[u] = {}
+        self.hop[u] = {}
+        self.kids[u] = {}
+        return {}
+
+    def delete_switch(self, u: int) -> dict:
+        """Remove a switch and all of its links. Returns the changed next hops."""
+        if u not in self.adj:
+            return {}
+        changed = {}
+        for v in list(self.adj[u]):
+            merge_changes(changed, self.delete_link(u, v))
+        for v in list(self.radj[u]):
+            merge_changes(changed, self.delete_link(v, u))
+        for s in self.adj:
+            if s != u and u in self.dist[s]:
+                # u is unreachable after the links above are gone
+                self._drop(s, u)
+        for table in (self.adj, self.radj, self.dist, self.pre, self.hop, self.kids):
+            del table[u]
+        return {k: c for k, c in changed.items() if u not in k}
+
+    def add_link(self, u: int, v: int, w: int = 1) -> dict:
+        """
+        Add (or lower the weight of) the directed link u -> v.
+        Only sources whose distance to v improves are repaired.
+        :return: {(switch, dst): (old_next_hop, new_next_hop)}
+        """
+        self.add_switch(u)
+        self.add_switch(v)
+        old = self.adj[u].get(v)
+        if old is not None and w > old:
+            # A heavier link behaves like a deletion followed by an insertion
+            changed = self.delete_link(u, v)
+            merge_changes(changed, self.add_link(u, v, w))
+            return changed
+        self.adj[u][v] = w
+        self.radj[v][u] = w
+
+        changed = {}
+        for s in self.adj:
+            du = self.dist[s].get(u)
+            if du is None or du + w >= self.dist[s].get(v, INF):
+                continue
+            self._decrease(s, [(du + w, v, u)], changed)
+        return changed
+
+    def delete_link(self, u: int, v: int) -> dict:
+        """
+        Remove the directed link u -> v.
+        Only sources whose tree uses u -> v are repaired, and within those
+        only the subtree hanging below v is recomputed.
+        :return: {(switch, dst): (old_next_hop, new_next_hop)}
+        """
+        if u not in self.adj or v not in self.adj[u]:
+            return {}
+        del self.adj[u][v]
+        del self.radj[v][u]
+
+        changed = {}
+        for s in self.adj:
+            if self.pre[s].get(v) == u:
+                self._repair_subtree(s, v, changed)
+        return changed
+
+    def sync(self, switches: list, links: list, weights: dict = None) -> dict:
+        """
+        Bring the engine in line with a full topology listing, applying
+        only the difference as incremental updates.
+        :param switches: list of dpids
+        :param links: list of (src_dpid, dst_dpid), as in get_topology_data()
+        :param weights: optional {(src_dpid, dst_dpid): weight}, default 1
+        :return: {(switch, dst): (old_next_hop, new_next_hop)}
+        """
+        changed = {}
+        weights = weights or {}
+        wanted = set(links)
+        current = {(u, v) for u in self.adj for v in self.adj[u]}
+        reweighted = [(u, v) for u, v in wanted & current
+                      if self.adj[u][v] != weights.get((u, v), 1)]
+        if len(wanted ^ current) + len(reweighted) > max(len(switches), 1):
+            # Too many updates (e.g. at startup): one full rebuild is cheaper
+            return self.rebuild(switches, links, weights)
+        for u, v in reweighted:
+            merge_changes(changed, self.add_link(u, v, weights.get((u, v), 1)))
+        for u, v in current - wanted:
+            merge_changes(changed, self.delete_link(u, v))
+        for u in set(self.adj) - set(switches):
+            merge_changes(changed, self.delete_switch(u))
+        for u in switches:
+            self.add_switch(u)
+        for u, v in wanted - current:
+            merge_changes(changed, self.add_link(u, v, weights.get((u, v), 1)))
+        return changed
+
+    def rebuild(self, switches: list, links: list, weights: dict = None) -> dict:
+        """
+        Replace the whole graph and recompute every tree from scratch.
+        :return: {(switch, dst): (old_next_hop, new_next_hop)} for the
+                 switches present both before and after
+        """
+        old_hop = self.hop
+        self.adj, self.radj = {}, {}
+        self.dist, self.pre, self.hop, self.kids = {}, {}, {}, {}
+        for u in switches:
+            self.add_switch(u)
+        for u, v in links:
+            self.add_switch(u)
+            self.add_switch(v)
+            w = weights.get((u, v), 1) if weights else 1
+            self.adj[u][v] = w
+            self.radj[v][u] = w
+        # A full recompute runs on the array backed graph, then fills the trees
+        graph = Graph(self.links(), nodes=self.adj, weights=weights)
+        ids = graph.ids
+        for s in self.adj:
+            dist, pred = graph.dijkstra(s)
+            first = graph.first_hops(s, dist, pred)
+            kids = self.kids[s]
+            for v, p in enumerate(pred):
+                if p == -1:
+                    continue
+                u, parent = ids[v], ids[p]
+                self.dist[s][u] = int(dist[v])
+                self.pre[s][u] = parent
+                self.hop[s][u] = ids[first[v]]
+                kids.setdefault(parent, set()).add(u)
+
+        changed = {}
+        for s in self.adj:
+            if s not in old_hop:
+                continue
+            old, new = old_hop[s], self.hop[s]
+            for d in set(old) | set(new):
+                if d in self.adj and old.get(d) != new.get(d):
+                    changed[(s, d)] = (old.get(d), new.get(d))
+        return changed
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def next_hops(self, s: int) -> dict:
+        """Return {dst: next_hop_switch} for every switch reachable from s."""
+        return self.hop.get(s, {})
+
+    def equal_cost_hops(self, s: int, d: int) -> list:
+        """
+        Every neighbour of s that starts a shortest path to d.
+        Derived from the trees of the neighbours, so nothing extra is stored.
+        """
+        best = self.dist.get(s, {}).get(d)
+        if best is None or s == d:
+            return []
+        dist = self.dist
+        return sorted(v for v, w in self.adj[s].items()
+                      if d in dist[v] and w + dist[v][d] == best)
+
+    def loop_free_alternates(self, s: int, d: int) -> list:
+        """
+        Neighbours of s, other than the shortest path next hops, that
+        reach d without going back through s (RFC 5286):
+        dist(n, d) < dist(n, s) + dist(s, d).
+        Sorted from the cheapest path through them.
+        """
+        best = self.dist.get(s, {}).get(d)
+        if best is None or s == d:
+            return []
+        dist = self.dist
+        alternates = []
+        for v, w in self.adj[s].items():
+            dv = dist[v].get(d)
+            if dv is None or w + dv == best:
+                continue
+            if dv < dist[v].get(s, INF) + best:
+                alternates.append((w + dv, v))
+        return [v for _, v in sorted(alternates)]
+
+    def path(self, s: int, d: int) -> list:
+        """
+        Return the switch path s -> d, or [] if d is unreachable.
+        Follows the next hops, the way packets go: with equal costs the
+        tree of s may pick another path than the trees downstream.
+        """
+        if s not in self.dist or d not in self.dist[s]:
+            return []
+        path = [s]
+        while path[-1] != d:
+            nxt = self.hop.get(path[-1], {}).get(d)
+            if nxt is None or len(path) > len(self.hop):
+                return []
+            path.append(nxt)
+        return path
+
+    def links(self) -> list:
+        return [(u, v) for u in self.adj for v in self.adj[u]]
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _record(self, s: int, v: int, new_hop, changed: dict):
+        old_hop = self.hop[s].get(v)
+        if old_hop == new_hop:
+            return
+        merge_changes(changed, {(s, v): (old_hop, new_hop)})
+        if new_hop is None:
+            self.hop[s].pop(v, None)
+        else:
+            self.hop[s][v] = new_hop
+
+    def _set_parent(self, s: int, v: int, p):
+        kids = self.kids[s]
+        old = self.pre[s].get(v)
+        if old is not None:
+            kids[old].discard(v)
+        if p is None:
+            self.pre[s].pop(v, None)
+        else:
+            self.pre[s][v] = p
+            kids.setdefault(p, set()).add(v)
+
+    def _drop(self, s: int, v: int):
+        self.dist[s].pop(v, None)
+        self._set_parent(s, v, None)
+        self.hop[s].pop(v, None)
+
+    def _decrease(self, s: int, heap: list, changed: dict):
+        """Dijkstra from a set of improved (dist, node, parent) seeds."""
+        dist = self.dist[s]
+        for d, v, p in heap:
+            dist[v] = d
+            self._set_parent(s, v, p)
+        heapq.heapify(heap)
+        touched = []
+        while heap:
+            d, v, p = heapq.heappop(heap)
+            if d != dist.get(v) or self.pre[s].get(v) != p:
+                continue
+            touched.append(v)
+            for x, w in self.adj[v].items():
+                if d + w < dist.get(x, INF):
+                    dist[x] = d + w
+                    self._set_parent(s, x, v)
+                    heapq.heappush(heap, (d + w, x, v))
+        self._refresh_hops(s, touched, changed)
+
+    def _repair_subtree(self, s: int, v: int, changed: dict):
+        """Recompute the part of the tree of s below v after losing (pre[v], v)."""
+        dist = self.dist[s]
+        affected = []
+        stack = [v]
+        while stack:
+            x = stack.pop()
+            affected.append(x)
+            stack.extend(self.kids[s].get(x, ()))
+        region = set(affected)
+        for x in affected:
+            dist.pop(x, None)
+            self._set_parent(s, x, None)
+
+        # Seed every affected node with its best entry from the unaffected tree
+        heap = []
+        for x in affected:
+            best = None
+            for p, w in self.radj[x].items():
+                if p in region or p not in dist:
+                    continue
+                if best is None or dist[p] + w < best[0]:
+                    best = (dist[p] + w, x, p)
+            if best is not None:
+                heap.append(best)
+        heapq.heapify(heap)
+        while heap:
+            d, x, p = heapq.heappop(heap)
+            if x in dist:
+                continue
+            dist[x] = d
+            self._set_parent(s, x, p)
+            for y, w in self.adj[x].items():
+                if y in region and y not in dist:
+                    heapq.heappush(heap, (d + w, y, x))
+
+        for x in affected:
+            if x not in dist:
+                self._record(s, x, None, changed)
+        self._refresh_hops(s, [x for x in affected if x in dist], changed)
+
+    def _refresh_hops(self, s: int, nodes: list, changed: dict):
+        """Recompute next hops of the given nodes and of their subtrees."""
+        dist = self.dist[s]
+        order = []
+        seen = set()
+        stack = list(nodes)
+        while stack:
+            v = stack.pop()
+            if v in seen or v == s or v not in dist:
+                continue
+            seen.add(v)
+            order.append(v)
+            stack.extend(self.kids[s].get(v, ()))
+        # Parents are strictly closer than children, so this is a tree order
+        order.sort(key=dist.__getitem__)
+        for v in order:
+            p = self.pre[s][v]
+            self._record(s, v, v if p == s else self.hop[s][p], changed)
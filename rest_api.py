@@ -0,0 +1,79 @@
+"""HTTP endpoints of the controller, served by ryu's WSGI server
+
+ryu-manager only starts the WSGI server (listening on --wsapi-host and
+--wsapi-port, 0.0.0.0:8080 by default) when the controller runs with
+metrics or rest-api enabled; ShortestPathSwitching then registers
+MetricsController and SwitchingController respectively.
+
+GET /metrics        histograms and counters in Prometheus text format
+GET /diagnostics    the topology, spanning tree and path dumps, streamed
+                    line by line from one snapshot; ?section=topology,tree,paths
+                    picks sections, ?src=<dpid>&dst=<dpid> limits the paths
+GET /path/<src>/<dst>
+                    JSON route between two hosts (MAC addresses): a list of
+                    [switch, in_port, out_port], or between two switches
+                    (dpids): a list of switches; [] if there is none
+
+"""
+
+import itertools
+import json
+
+from ryu.app.wsgi import ControllerBase, Response, route
+
+import diagnostics
+
+APP_INSTANCE = 'shortest_paths_app'
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsController(ControllerBase):
+
+    def __init__(self, req, link, data, **config):
+        super(MetricsController, self).__init__(req, link, data, **config)
+        self.app = data[APP_INSTANCE]
+
+    @route('metrics', '/metrics', methods=['GET'])
+    def metrics(self, req, **kwargs):
+        return Response(body=self.app.metrics.render().encode('utf-8'),
+                        headerlist=[('Content-Type', PROMETHEUS_CONTENT_TYPE)])
+
+
+class SwitchingController(ControllerBase):
+
+    def __init__(self, req, link, data, **config):
+        super(SwitchingController, self).__init__(req, link, data, **config)
+        self.app = data[APP_INSTANCE]
+
+    @route('switching', '/diagnostics', methods=['GET'])
+    def dump(self, req, **kwargs):
+        sections = req.GET.get('section', 'topology,tree,paths').split(',')
+        unknown = [section for section in sections if section not in diagnostics.SECTIONS]
+        if unknown:
+            return Response(status=400, text='unknown section(s): {}\n'.format(', '.join(unknown)),
+                            charset='utf-8')
+        try:
+            src, dst = [int(req.GET[key], 0) if key in req.GET else None for key in ('src', 'dst')]
+        except ValueError:
+            return Response(status=400, text='src and dst must be dpids\n', charset='utf-8')
+
+        snapshot = self.app.diagnostics_snapshot(paths='paths' in sections)
+        lines = diagnostics.dump_lines(snapshot, [section for section in sections if section != 'paths'])
+        if 'paths' in sections:
+            lines = itertools.chain(lines, diagnostics.path_lines(snapshot, src, dst))
+        # formatted while the response is written out
+        return Response(app_iter=((line + '\n').encode('utf-8') for line in lines),
+                        content_type='text/plain', charset='utf-8')
+
+    @route('switching', '/path/{src}/{dst}', methods=['GET'])
+    def path(self, req, src, dst, **kwargs):
+        if ':' in src and ':' in dst:
+            route = self.app.get_path(src.lower(), dst.lower())
+        else:
+            try:
+                route = list(self.app.get_switch_path(int(src, 0), int(dst, 0)))
+            except ValueError:
+                return Response(status=400, text='src and dst must both be MACs or both dpids\n',
+                                charset='utf-8')
+        return Response(content_type='application/json', charset='utf-8', text=json.dumps(route))
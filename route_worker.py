@@ -0,0 +1,259 @@
+"""Route computation off the Ryu event loop
+
+RouteOffloader sends an immutable TopologySnapshot to a process pool,
+so packet-in handling keeps running while a large recompute is in
+flight.  A finished future wakes a green thread through a pipe, since
+its callback runs on a thread of the pool that must not touch the hub.
+Results are handed back to the controller through a callback that runs
+on the Ryu hub, and a result whose epoch has been superseded by a newer
+snapshot is dropped.
+
+Each worker process keeps its own path engine between calls, so the
+incremental engine only repairs what changed.  The worker answers with
+the next hop changes relative to the epoch the controller last applied,
+or with full tables when its state does not match that epoch.  When the
+controller uses ECMP groups or fast failover, the worker also sends the
+equal cost next hops and loop-free alternates of every pair that has
+more than one way out, since RouteTable has no distances to derive them.
+
+"""
+
+import collections
+import multiprocessing
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from eventlet import patcher
+from eventlet.hubs import IOClosed, trampoline
+from ryu.lib import hub
+
+from path_engine import DynamicShortestPaths
+
+# switches: tuple of dpids, links: tuple of (src, dst),
+# link_ports: tuple of ((src, dst), src_port), weights: tuple of ((src, dst), weight)
+TopologySnapshot = namedtuple('TopologySnapshot', ['epoch', 'switches', 'links', 'link_ports', 'weights'],
+                              defaults=[()])
+
+# Either tables ({switch: {dst: next_hop}}) or changes ({(switch, dst): (old, new)}) is set;
+# ecmp: {(switch, dst): equal cost next hops}, only for pairs with more than one,
+# alternates: {(switch, dst): loop-free alternates}, only for pairs that have some
+RouteResult = namedtuple('RouteResult', ['epoch', 'base_epoch', 'tables', 'changes', 'compute_time',
+                                         'ecmp', 'alternates'])
+
+# The pool threads are real threads; the os module may be patched by eventlet
+_os = patcher.original('os')
+
+_engine = None
+_engine_epoch = None
+
+
+def compute_routes(backend: str, base_epoch, snapshot: TopologySnapshot,
+                   ecmp=False, fast_failover=False) -> RouteResult:
+    """Runs in the worker process"""
+    global _engine, _engine_epoch
+    start = time.perf_counter()
+    if _engine is None:
+        if backend == 'sparse':
+            from sparse_paths import SparsePaths
+            _engine = SparsePaths()
+        else:
+            _engine = DynamicShortestPaths()
+
+    if backend == 'sparse':
+        link_port_dict = {}
+        for (u, v), port in snapshot.link_ports:
+            link_port_dict.setdefault(u, {})[v] = port
+        changed = _engine.sync(list(snapshot.switches), list(snapshot.links), link_port_dict,
+                               dict(snapshot.weights))
+    else:
+        changed = _engine.sync(list(snapshot.switches), list(snapshot.links), dict(snapshot.weights))
+
+    if _engine_epoch is not None and _engine_epoch == base_epoch:
+        tables, changes = None, dict(changed)
+    else:
+        tables, changes = {s: dict(_engine.next_hops(s)) for s in snapshot.switches}, None
+    _engine_epoch = snapshot.epoch
+
+    equal_cost, alternates = {}, {}
+    if ecmp or fast_failover:
+        for s in snapshot.switches:
+            for d in snapshot.switches:
+                if ecmp:
+                    hops = _engine.equal_cost_hops(s, d)
+                    if len(hops) > 1:
+                        equal_cost[(s, d)] = tuple(hops)
+                if fast_failover:
+                    others = _engine.loop_free_alternates(s, d)
+                    if others:
+                        alternates[(s, d)] = tuple(others)
+    return RouteResult(snapshot.epoch, base_epoch, tables, changes, time.perf_counter() - start,
+                       equal_cost, alternates)
+
+
+class RouteTable():
+    """
+    Controller side copy of the next hop tables computed by the workers.
+    Offers the same queries as path_engine.DynamicShortestPaths.
+    """
+
+    def __init__(self):
+        self.epoch = None
+        self.hop = {}
+        self.ecmp = {}  # (switch, dst) : equal cost next hops, when there are several
+        self.alternates = {}  # (switch, dst) : loop-free alternates
+
+    def apply(self, result: RouteResult) -> dict:
+        """
+        Install a worker result.
+        :return: {(switch, dst): (old_next_hop, new_next_hop)}
+        """
+        if result.tables is not None:
+            changed = {}
+            for s in set(self.hop) | set(result.tables):
+                old, new = self.hop.get(s, {}), result.tables.get(s, {})
+                for d in set(old) | set(new):
+                    if old.get(d) != new.get(d):
+                        changed[(s, d)] = (old.get(d), new.get(d))
+            self.hop = result.tables
+        else:
+            changed = result.changes
+            for (s, d), (_, new) in changed.items():
+                table = self.hop.setdefault(s, {})
+                if new is None:
+                    table.pop(d, None)
+                else:
+                    table[d] = new
+        self.ecmp = result.ecmp
+        self.alternates = result.alternates
+        self.epoch = result.epoch
+        return changed
+
+    def next_hops(self, s: int) -> dict:
+        return self.hop.get(s, {})
+
+    def equal_cost_hops(self, s: int, d: int) -> list:
+        hops = self.ecmp.get((s, d))
+        if hops is not None:
+            return list(hops)
+        hop = self.hop.get(s, {}).get(d)
+        return [] if hop is None else [hop]
+
+    def loop_free_alternates(self, s: int, d: int) -> list:
+        return list(self.alternates.get((s, d), ()))
+
+    def path(self, s: int, d: int) -> list:
+        path = [s]
+        while path[-1] != d:
+            nxt = self.hop.get(path[-1], {}).get(d)
+            if nxt is None or len(path) > len(self.hop):
+                return []
+            path.append(nxt)
+        return path
+
+
+class RouteOffloader():
+    """
+    Run compute_routes() in a process pool and deliver fresh results.
+
+    :param workers: number of worker processes
+    :param backend: 'incremental' or 'sparse', the engine used by the workers
+    :param on_result: callback(changed, context) run on the Ryu hub once
+                      the routes of the latest snapshot are in self.table
+    :param ecmp: have the workers send the equal cost next hops
+    :param fast_failover: have the workers send the loop-free alternates
+    """
+
+    def __init__(self, workers, backend, on_result, logger, ecmp=False, fast_failover=False):
+        # 'spawn' gives the workers a clean interpreter without eventlet patches
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        self.backend = backend
+        self.ecmp = ecmp
+        self.fast_failover = fast_failover
+        self.on_result = on_result
+        self.logger = logger
+        self.table = RouteTable()
+
+        self.latest = None  # epoch of the newest snapshot
+        self.pending = []  # [(snapshot, future, context)]
+        self.cancelled = 0  # superseded before they ran
+        self.stale = 0  # finished after a newer snapshot arrived
+
+        self._finished = collections.deque()  # filled by the pool threads, emptied on the hub
+        self._wakeup_r, self._wakeup_w = _os.pipe()
+        _os.set_blocking(self._wakeup_r, False)
+        self._listener = None
+        self._closed = False
+
+    def submit(self, snapshot: TopologySnapshot, context=None):
+        """Queue a recompute for this snapshot and cancel the outdated ones"""
+        self.latest = snapshot.epoch
+        for _, future, _ in self.pending:
+            if future.cancel():
+                self.cancelled += 1
+        self.pending = [p for p in self.pending if not p[1].cancelled()]
+
+        future = self.executor.submit(compute_routes, self.backend, self.table.epoch, snapshot,
+                                      self.ecmp, self.fast_failover)
+        item = (snapshot, future, context)
+        self.pending.append(item)
+        if self._listener is None:
+            self._listener = hub.spawn(self._listen)
+        future.add_done_callback(lambda _: self._wake(item))
+
+    def shutdown(self):
+        """Stop the workers; results still in flight are not delivered"""
+        if self._closed:
+            return
+        self._closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._listener is not None:
+            hub.kill(self._listener)
+        _os.close(self._wakeup_r)
+        _os.close(self._wakeup_w)
+
+    def _wake(self, item):
+        """Runs on the pool thread that completed the future"""
+        if self._closed:
+            return
+        self._finished.append(item)
+        try:
+            _os.write(self._wakeup_w, b'\0')
+        except OSError:
+            pass  # closed by shutdown() meanwhile
+
+    def _listen(self):
+        while True:
+            try:
+                trampoline(self._wakeup_r, read=True)
+                _os.read(self._wakeup_r, 4096)
+            except BlockingIOError:
+                pass
+            except (OSError, IOClosed):
+                return
+            while self._finished:
+                item = self._finished.popleft()
+                self.pending = [p for p in self.pending if p is not item]
+                snapshot, future, context = item
+                if not future.cancelled():
+                    self._deliver(snapshot, future, context)
+
+    def _deliver(self, snapshot, future, context):
+        epoch = snapshot.epoch
+        try:
+            result = future.result()
+        except Exception:
+            self.logger.exception("Route computation for epoch %s failed", epoch)
+            return
+        if epoch != self.latest:
+            self.stale += 1
+            return
+        if result.tables is None and result.base_epoch != self.table.epoch:
+            # The changes are relative to a state we never applied, ask again
+            self.submit(snapshot, context)
+            return
+        changed = self.table.apply(result)
+        self.logger.info("Routes for epoch %d: %d next hops changed, computed in %.3f ms",
+                         epoch, len(changed), result.compute_time * 1000)
+        self.on_result(changed, context)
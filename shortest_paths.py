@@ -10,108 +10,419 @@ path switching.
 
 """
 
+from ryu import cfg
+from ryu.app.wsgi import WSGIApplication
 from ryu.base import app_manager
 from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
 from ryu.controller.handler import set_ev_cls
-from ryu.ofproto import ofproto_v1_0
+from ryu.lib import hub
+from ryu.ofproto import ofproto_v1_0, ofproto_v1_3
 
 from ryu.topology import event, switches
 import ryu.topology.api as topo
 
 from ryu.lib.packet import packet, ether_types
-from ryu.lib.packet import ethernet, arp, icmp
 
-from ofctl_utils import OfCtl, OfCtl_v1_0, VLANID_NONE
-
-from topo_manager_example import TopoManager
+from ofctl_utils import OfCtl, complete_batch
+
+from path_engine import DynamicShortestPaths
+from sparse_paths import SparsePaths
+import sparse_paths
+from flow_state import FlowMatch, FlowModCount, FlowReconciler, output, set_vlan, strip_vlan
+from flow_state import group, select_group, failover_group, parse_flow, parse_group
+from labels import LabelAllocator
+from broadcast_tree import BROADCAST, SpanningTree, tree_ports, flood_rules
+from link_weights import LinkWeights, WEIGHT_FUNCTIONS
+from stats_collector import StatsCollector
+from arp_responder import ArpResponder
+from packet_parser import parse_frame, mac_text, ip_text
+from admission import PacketInAdmission
+import event_trace
+import diagnostics
+import metrics
+from metrics import Metrics, timed, HANDLER_SECONDS, PHASE_SECONDS, MESSAGES
+from rest_api import MetricsController, SwitchingController, APP_INSTANCE
+from coalescer import RecomputeScheduler
+from path_cache import PathCache
+from network_state import NetworkState, HostEntry
+from host_aging import HostAging
+from state_store import StateStore
+from route_worker import RouteOffloader, TopologySnapshot
+from graph_core import Graph
 from collections import defaultdict
-
-from queue import PriorityQueue
-from queue import Queue
-
-INF = 0x3f3f3f3f
-para_edges = []
+import logging
+import signal
+import time
+
+# 流表优先级，0留给OpenFlow 1.3的table-miss规则
+PRIORITY_FORWARD = 1
+PRIORITY_LABEL = 2
+
+CONVERGENCE_TIMEOUT = 5.0  # 等待barrier回复的最长时间（秒）
+
+CONTROLLER_METER_ID = 1  # OpenFlow 1.3上限制packet-in速率的meter
+
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.FloatOpt('recompute-quiet-period', default=0.2,
+                 help='Seconds without topology events before flow tables are '
+                      'recomputed (0 recomputes on every event)'),
+    cfg.FloatOpt('recompute-max-delay', default=1.0,
+                 help='Maximum seconds a topology event may wait for a recompute'),
+    cfg.StrOpt('path-backend', default='incremental', choices=['incremental', 'sparse'],
+               help='Shortest path backend: the pure Python incremental engine, or '
+                    'all-pairs next hop matrices computed with numpy/scipy'),
+    cfg.IntOpt('route-workers', default=0,
+               help='Number of worker processes computing routes off the event loop '
+                    '(0 computes them inline)'),
+    cfg.StrOpt('forwarding-mode', default='mac', choices=['mac', 'label'],
+               help='mac: every switch matches every host MAC; label: edge switches tag '
+                    'packets with a VLAN label of the egress switch and core switches '
+                    'forward on the label only'),
+    cfg.BoolOpt('ecmp', default=True,
+                help='On OpenFlow 1.3 switches, spread traffic over all equal cost '
+                     'next hops with select groups'),
+    cfg.BoolOpt('fast-failover', default=True,
+                help='On OpenFlow 1.3 switches, back up every next hop with a loop-free '
+                     'alternate in a fast failover group, so traffic moves over as soon '
+                     'as the port goes down'),
+    cfg.StrOpt('link-weight', default='hop', choices=sorted(WEIGHT_FUNCTIONS),
+               help='Link weight used for path selection: hop count, or a function of '
+                    'the measured utilization / residual bandwidth'),
+    cfg.FloatOpt('stats-interval', default=5.0,
+                 help='Seconds between two port statistics polls'),
+    cfg.FloatOpt('link-capacity', default=1000.0,
+                 help='Capacity of a link in Mbit/s, used to compute its utilization'),
+    cfg.FloatOpt('weight-hysteresis', default=0.2,
+                 help='Relative change a link weight needs before paths are recomputed'),
+    cfg.StrOpt('flood-mode', default='shared', choices=['shared', 'per-source'],
+               help='shared: broadcasts follow one spanning tree, with one rule per tree '
+                    'port on every switch; per-source: one ARP flood rule per root switch '
+                    'and source IP on every switch'),
+    cfg.FloatOpt('packet-in-switch-rate', default=1000.0,
+                 help='Packet-ins per second handled from one switch (0: unlimited)'),
+    cfg.FloatOpt('packet-in-source-rate', default=100.0,
+                 help='Packet-ins per second handled from one source MAC (0: unlimited)'),
+    cfg.FloatOpt('packet-in-duplicate-window', default=0.5,
+                 help='Seconds during which an identical packet-in from the same switch '
+                      'is dropped (0: off)'),
+    cfg.IntOpt('packet-in-meter-rate', default=0,
+               help='On OpenFlow 1.3 switches, meter table misses sent to the controller '
+                    'to this many packets per second (0: no meter)'),
+    cfg.StrOpt('event-trace', default='',
+               help='Record every topology event and packet-in to this file, for '
+                    'benchmarks/replay_trace.py (empty: no recording)'),
+    cfg.IntOpt('path-cache-size', default=4096,
+               help='Number of switch paths kept for get_path() / GET /path queries'),
+    cfg.BoolOpt('quiet', default=False,
+                help='Production mode: do not print the topology, spanning tree and paths '
+                     'on every update; get them from GET /diagnostics (with rest-api) or SIGUSR1 instead'),
+    cfg.StrOpt('diagnostics-file', default='',
+               help='File SIGUSR1 writes the topology, spanning tree and path dumps to '
+                    '(empty: stdout)'),
+    cfg.FloatOpt('host-timeout', default=0.0,
+                 help='Seconds after which a host that sent nothing is removed together with '
+                      'its rules, checked every half timeout from packet-ins and the rx counter '
+                      'of its switch port (0: hosts never expire)'),
+    cfg.StrOpt('state-file', default='',
+               help='sqlite file the host table and topology are saved to, and restored '
+                    'from at startup (empty: nothing is kept across restarts)'),
+    cfg.FloatOpt('state-save-interval', default=2.0,
+                 help='Seconds between two saves of the changes to the state file'),
+    cfg.FloatOpt('restart-grace', default=10.0,
+                 help='After restoring the state file, seconds during which flow tables are '
+                      'left alone until every saved link has been discovered again'),
+    cfg.BoolOpt('adopt-flows', default=True,
+                help='When a switch connects, read the flows and groups it already has and '
+                     'only send the difference, so controller restarts and reconnects '
+                     'do not reprogram the switch'),
+    cfg.BoolOpt('metrics', default=False,
+                help='Collect handler latency histograms and message counters, served '
+                     'in Prometheus text format on /metrics of the ryu WSGI server'),
+    cfg.BoolOpt('rest-api', default=False,
+                help='Serve /diagnostics and /path on the ryu WSGI server; it listens on '
+                     '--wsapi-host and --wsapi-port, and only runs when this or metrics is on'),
+])
 
 
 class ShortestPathSwitching(app_manager.RyuApp):
-    OFP_VERSIONS = [ofproto_v1_0.OFP_VERSION]
+    OFP_VERSIONS = [ofproto_v1_0.OFP_VERSION, ofproto_v1_3.OFP_VERSION]
+    _CONTEXTS = {'wsgi': WSGIApplication}
+
+    @classmethod
+    def context_iteritems(cls):
+        # ryu-manager starts a WSGI server on 0.0.0.0 for every app that asks for it,
+        # so only ask when there is something to serve
+        if not (CONF.metrics or CONF.rest_api):
+            return iter(())
+        return super(ShortestPathSwitching, cls).context_iteritems()
 
     def __init__(self, *args, **kwargs):
         super(ShortestPathSwitching, self).__init__(*args, **kwargs)
         self.topology_api_app = self
-        self.tm = TopoManager()
 
-        self.switch_host_mac = {}  # 一个switch连的所有host的mac地址  switch_id : [host.mac]
-        self.switch_host_ip = {}  # 一个switch连的所有host的ip地址  switch_id:[host.ip]
-        self.switch_host_port = {}  # 一个switch上的所有连接host的端口 switch_id:[switch.port_id]
-        self.switch_host = {}  # 一个switch上的所有连接host实体 switch_id:[host]
-        self.mac_host_port = {}  # 一个host连接的switch端口 host.mac:[host.port.port_no]
-        self.shortest_path = {}
+        # switch、链路和host的不可变快照，每个事件生成一个新版本，读的时候不用加锁或复制
+        self.state = NetworkState()
+        self.installed_state = self.state  # 最近一次安装流表时的快照
+        # 最短路径后端：增量更新的最短路径树，或者用scipy一次算出所有下一跳
+        self.sparse = False
+        if CONF.path_backend == 'sparse':
+            if sparse_paths.available():
+                self.sparse = True
+            else:
+                self.logger.warning("numpy/scipy not available, using the incremental path engine")
+        self.paths = SparsePaths() if self.sparse else DynamicShortestPaths()
+        # 路由计算可以放到进程池里，结果再回到controller线程安装流表
+        self.offloader = None
+        self.topo_epoch = 0
+        if CONF.route_workers > 0:
+            backend = 'sparse' if self.sparse else 'incremental'
+            self.offloader = RouteOffloader(CONF.route_workers, backend,
+                                            self.apply_routes, self.logger,
+                                            ecmp=CONF.ecmp, fast_failover=CONF.fast_failover)
+            self.paths = self.offloader.table
+            self.sparse = False
+        # 给其他app查询的路径缓存，路由变化时整体失效
+        self.path_cache = PathCache(lambda src, dst: self.paths.path(src, dst),
+                                    capacity=CONF.path_cache_size)
+        self.flows = FlowReconciler(self.logger)  # 每个switch上已经安装的流表
+        self.tree = SpanningTree()  # 广播用的生成树
+        self.convergence_time = None  # 最近一次流表更新从发出到所有交换机确认的时间
+        # label模式下每个目的switch一个VLAN ID
+        self.labels = LabelAllocator() if CONF.forwarding_mode == 'label' else None
+        # 拓扑事件先标记为dirty，一段安静期之后才统一更新一次流表
+        self.scheduler = RecomputeScheduler(self.update_all_flow_table,
+                                            quiet_period=CONF.recompute_quiet_period,
+                                            max_delay=CONF.recompute_max_delay,
+                                            logger=self.logger)
+
+        self.datapaths = {}  # switch_id : datapath
+        self.ofctls = {}  # switch_id : OfCtl
+        self.arp = ArpResponder()  # ip -> 预先打包好的ARP回复
+        self.admission = PacketInAdmission(switch_rate=CONF.packet_in_switch_rate,
+                                           source_rate=CONF.packet_in_source_rate,
+                                           duplicate_window=CONF.packet_in_duplicate_window,
+                                           logger=self.logger)
+        self.stats = StatsCollector(self.logger)  # 同时向所有交换机请求统计信息
+        # 根据端口统计得到的链路权重
+        self.link_weights = None
+        if CONF.link_weight != 'hop':
+            self.link_weights = LinkWeights(CONF.link_weight, capacity=CONF.link_capacity * 1e6,
+                                            hysteresis=CONF.weight_hysteresis)
+            hub.spawn(self.poll_link_load)
+        # 太久没有消息的host连同它的流表一起删除
+        self.host_aging = None
+        if CONF.host_timeout > 0:
+            self.host_aging = HostAging(CONF.host_timeout)
+            hub.spawn(self.expire_hosts)
+        # 记录收到的事件，之后可以离线重放
+        self.trace = None
+        if CONF.event_trace:
+            self.trace = event_trace.TraceWriter(CONF.event_trace)
+        # 关闭时为None，热路径上几乎没有额外开销
+        self.metrics = None
+        if CONF.metrics:
+            self.metrics = Metrics()
+            self.metrics.add_collector(self.collect_metrics)
+        self.topology = ([], {}, [])  # 最近一次get_topology_data()的links, link_port_dict, switches
+        self.adopting = set()  # 正在读取已有流表的switch，读完之前不给它装流表
+        # 重启之后恢复上次保存的host和拓扑
+        self.store = None
+        self.restored_links = None  # 等这些链路都重新发现了再更新流表
+        if CONF.state_file:
+            self.store = StateStore(CONF.state_file)
+            self.restore_state()
+            hub.spawn(self.save_state)
+        if hasattr(signal, 'SIGUSR1'):
+            try:
+                signal.signal(signal.SIGUSR1, lambda signum, frame: hub.spawn(self.dump_diagnostics))
+            except ValueError:
+                pass  # not the main thread
+        wsgi = kwargs.get('wsgi')
+        if wsgi is not None:
+            if self.metrics is not None:
+                wsgi.register(MetricsController, {APP_INSTANCE: self})
+            if CONF.rest_api:
+                wsgi.register(SwitchingController, {APP_INSTANCE: self})
+
+    def close(self):
+        if self.offloader is not None:
+            self.offloader.shutdown()
+        if self.trace is not None:
+            self.trace.close()
+        if self.store is not None:
+            self.store.save(self.state)
+            self.store.close()
+
+    def restore_state(self):
+        """Load the state file and wait for its links before touching flow tables"""
+        self.state = self.installed_state = self.store.load()
+        for host in self.state.hosts.values():
+            for ip in host.ipv4:
+                self.arp.learn(ip, host.mac)
+            if self.host_aging is not None:
+                self.host_aging.seen(host.mac)
+        self.logger.info("Restored %d switches, %d links and %d hosts from %s",
+                         len(self.state.switches), len(self.state.links), len(self.state.hosts),
+                         CONF.state_file)
+        if self.state.links:
+            self.restored_links = set(self.state.links)
+            hub.spawn(self.end_restart_grace)
+
+    def end_restart_grace(self):
+        hub.sleep(CONF.restart_grace)
+        if self.restored_links is not None:
+            self.logger.warning("%d saved link(s) not rediscovered after %.0f s, updating flow "
+                                "tables anyway", len(self.restored_links), CONF.restart_grace)
+            self.restored_links = None
+            self.scheduler.mark_dirty()
+
+    def save_state(self):
+        """Periodically write the changes of the state to the state file"""
+        while True:
+            hub.sleep(CONF.state_save_interval)
+            start = time.perf_counter()
+            rows = self.store.save(self.state)
+            if rows:
+                self.logger.debug("Saved %d changes to %s in %.1f ms", rows, CONF.state_file,
+                                  (time.perf_counter() - start) * 1000)
+
+    def collect_metrics(self) -> list:
+        """Values counted elsewhere anyway, read when /metrics is scraped"""
+        coalescing = self.scheduler.stats
+        admission = self.admission.stats
+        values = [(metrics.ARP_REPLIES, (('result', 'hit'),), self.arp.replies),
+                  (metrics.ARP_REPLIES, (('result', 'miss'),), self.arp.misses),
+                  (metrics.RECOMPUTES, (), coalescing.recomputes),
+                  (metrics.TOPOLOGY_EVENTS, (), coalescing.events),
+                  (metrics.PATH_CACHE, (('result', 'hit'),), self.path_cache.hits),
+                  (metrics.PATH_CACHE, (('result', 'miss'),), self.path_cache.misses)]
+        for result in ('admitted', 'duplicate', 'source_rate', 'switch_rate'):
+            values.append((metrics.PACKET_INS, (('result', result),), getattr(admission, result)))
+        if self.convergence_time is not None:
+            values.append((metrics.CONVERGENCE, (), self.convergence_time))
+        return values
+
+    @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
+    def switch_features_handler(self, ev):
+        """
+        OpenFlow 1.3 switches drop table misses by default, so ask for
+        a packet-in instead (OpenFlow 1.0 already does this).
+        """
+        dp = ev.msg.datapath
+        if dp.ofproto.OFP_VERSION >= ofproto_v1_3.OFP_VERSION:
+            ofctl = self.get_ofctl(dp)
+            meter_id = 0
+            if CONF.packet_in_meter_rate:
+                # 限制送往控制器的流量
+                meter_id = CONTROLLER_METER_ID
+                ofctl.set_meter(meter_id, CONF.packet_in_meter_rate,
+                                burst_size=CONF.packet_in_meter_rate)
+            ofctl.set_packetin_flow(cookie=0, priority=0, meter_id=meter_id)
 
     @set_ev_cls(event.EventSwitchEnter)
+    @timed(HANDLER_SECONDS, handler='switch_enter')
     def handle_switch_add(self, ev):
         """
         Event handler indicating a switch has come online.
         """
         switch = ev.switch
+        if self.trace is not None:
+            self.trace.switch(event_trace.SWITCH_ENTER, switch)
         self.logger.warn("Added Switch switch%d with ports:", switch.dp.id)
         for port in switch.ports:
             self.logger.warn("\t%d:  %s", port.port_no, port.hw_addr)
 
         # TODO:  Update network topology and flow rules
-        self.tm.add_switch(switch)
-        self.switch_host_mac[switch.dp.id] = list()  # 初始化
-        self.switch_host_ip[switch.dp.id] = list()  # 初始化
-        self.switch_host_port[switch.dp.id] = list()  # 初始化
-        self.switch_host[switch.dp.id] = list()  # 初始化
+        self.state = self.state.add_switch(switch.dp.id)
+        self.datapaths[switch.dp.id] = switch.dp
+        if CONF.adopt_flows:
+            # 先读出交换机上已有的流表，之后只发差异
+            self.adopting.add(switch.dp.id)
+            hub.spawn(self.adopt_flows, switch.dp)
 
-        self.update_all_flow_table()  # 更新流表
+        self.scheduler.mark_dirty()  # 更新流表
 
     @set_ev_cls(event.EventSwitchLeave)
+    @timed(HANDLER_SECONDS, handler='switch_leave')
     def handle_switch_delete(self, ev):
         """
         Event handler indicating a switch has been removed
         """
         switch = ev.switch
+        if self.trace is not None:
+            self.trace.switch(event_trace.SWITCH_LEAVE, switch)
 
         self.logger.warn("Removed Switch switch%d with ports:", switch.dp.id)
         for port in switch.ports:
             self.logger.warn("\t%d:  %s", port.port_no, port.hw_addr)
 
         # TODO:  Update network topology and flow rules
-        self.tm.delete_switch(switch)
-        self.update_all_flow_table()  # 更新流表
+        self.state = self.state.remove_switch(switch.dp.id)
+        self.flows.forget(switch.dp.id)
+        self.adopting.discard(switch.dp.id)
+        self.datapaths.pop(switch.dp.id, None)
+        self.ofctls.pop(switch.dp.id, None)
+        self.admission.forget(switch.dp.id)
+        self.stats.forget(switch.dp.id)
+        if self.link_weights is not None:
+            self.link_weights.forget(switch.dp.id)
+        if self.labels is not None:
+            self.labels.release(switch.dp.id)
+        self.scheduler.mark_dirty()  # 更新流表
 
     @set_ev_cls(event.EventHostAdd)
+    @timed(HANDLER_SECONDS, handler='host_add')
     def handle_host_add(self, ev):
         """
         Event handler indiciating a host has joined the network
         This handler is automatically triggered when a host sends an ARP response.
         """
         host = ev.host
+        if self.trace is not None:
+            self.trace.host(host)
         self.logger.warn("Host Added:  %s (IPs:  %s) on switch%s/%s (%s)",
                          host.mac, host.ipv4,
                          host.port.dpid, host.port.port_no, host.port.hw_addr)
 
         # TODO:  Update network topology and flow rules
+        self.learn_host(host.mac, host.port.dpid, host.port.port_no, host.ipv4)
 
-        self.tm.add_host(host)
-        # 更新有关拓扑结构的记录
-        self.switch_host_mac[host.port.dpid].append(host.mac)
-        self.switch_host_ip[host.port.dpid].append(host.ipv4)
-        self.switch_host_port[host.port.dpid].append(host.port.port_no)
-        self.switch_host[host.port.dpid].append(host)
-        self.mac_host_port[host.mac] = host.port.port_no
-
-        self.update_all_flow_table()  # 更新流表
+    @set_ev_cls(event.EventHostMove)
+    @timed(HANDLER_SECONDS, handler='host_move')
+    def handle_host_move(self, ev):
+        """
+        Event handler indicating a known host showed up on another switch port
+        """
+        src, dst = ev.src, ev.dst
+        if self.trace is not None:
+            self.trace.host(dst)  # 重放时当作同一个MAC的host add，效果一样
+        self.logger.warn("Host Moved:  %s from switch%s/%s to switch%s/%s",
+                         dst.mac, src.port.dpid, src.port.port_no, dst.port.dpid, dst.port.port_no)
+        self.learn_host(dst.mac, dst.port.dpid, dst.port.port_no, dst.ipv4)
+
+    @set_ev_cls(event.EventHostDelete)
+    @timed(HANDLER_SECONDS, handler='host_delete')
+    def handle_host_delete(self, ev):
+        """
+        Event handler indicating a host has left the network
+        """
+        host = ev.host
+        if self.trace is not None:
+            self.trace.host(host, event_trace.HOST_DELETE)
+        self.logger.warn("Host Deleted:  %s on switch%s/%s", host.mac, host.port.dpid, host.port.port_no)
+        self.forget_host(host.mac)
 
     @set_ev_cls(event.EventLinkAdd)
+    @timed(HANDLER_SECONDS, handler='link_add')
     def handle_link_add(self, ev):
         """
         Event handler indicating a link between two switches has been added
         """
         link = ev.link
+        if self.trace is not None:
+            self.trace.link(event_trace.LINK_ADD, link)
         src_port = ev.link.src
         dst_port = ev.link.dst
         self.logger.warn("Added Link:  switch%s/%s (%s) -> switch%s/%s (%s)",
@@ -119,14 +430,18 @@ class ShortestPathSwitching(app_manager.RyuApp):
                          dst_port.dpid, dst_port.port_no, dst_port.hw_addr)
 
         # TODO:  Update network topology and flow rules
-        self.update_all_flow_table()  # 更新流表
+        self.state = self.state.add_link(src_port.dpid, dst_port.dpid, src_port.port_no)
+        self.scheduler.mark_dirty()  # 更新流表
 
     @set_ev_cls(event.EventLinkDelete)
+    @timed(HANDLER_SECONDS, handler='link_delete')
     def handle_link_delete(self, ev):
         """
         Event handler indicating when a link between two switches has been deleted
         """
         link = ev.link
+        if self.trace is not None:
+            self.trace.link(event_trace.LINK_DELETE, link)
         src_port = link.src
         dst_port = link.dst
 
@@ -135,23 +450,35 @@ class ShortestPathSwitching(app_manager.RyuApp):
                          dst_port.dpid, dst_port.port_no, dst_port.hw_addr)
 
         # TODO:  Update network topology and flow rules
-        self.update_all_flow_table()  # 更新流表
+        self.state = self.state.remove_link(src_port.dpid, dst_port.dpid)
+        self.scheduler.mark_dirty()  # 更新流表
 
     @set_ev_cls(event.EventPortModify)
+    @timed(HANDLER_SECONDS, handler='port_modify')
     def handle_port_modify(self, ev):
         """
         Event handler for when any switch port changes state.
         This includes links for hosts as well as links between switches.
         """
         port = ev.port
+        if self.trace is not None:
+            self.trace.port(port)
         self.logger.warn("Port Changed:  switch%s/%s (%s):  %s",
                          port.dpid, port.port_no, port.hw_addr,
                          "UP" if port.is_live() else "DOWN")
 
         # TODO:  Update network topology and flow rules
-        self.update_all_flow_table()  # 更新流表
+        self.scheduler.mark_dirty()  # 更新流表
+
+    def get_ofctl(self, dp):
+        """OfCtl of a datapath, built once per connection"""
+        ofctl = self.ofctls.get(dp.id)
+        if ofctl is None or ofctl.dp is not dp:
+            ofctl = self.ofctls[dp.id] = OfCtl.factory(dp, self.logger)
+        return ofctl
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    @timed(HANDLER_SECONDS, handler='packet_in')
     def packet_in_handler(self, ev):
         """
        EventHandler for PacketIn messages
@@ -162,47 +489,185 @@ class ShortestPathSwitching(app_manager.RyuApp):
         # In the controller, we pass around datapath objects with metadata about each switch.
         dp = msg.datapath
 
-        # Use this object to create packets for the given datapath
-        ofctl = OfCtl.factory(dp, self.logger)
-        in_port = msg.in_port
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocols(ethernet.ethernet)[0]
-
-        if eth.ethertype == ether_types.ETH_TYPE_ARP:
-            arp_msg = pkt.get_protocols(arp.arp)[0]
-            if arp_msg.opcode == arp.ARP_REQUEST:
-                self.logger.warning("Received ARP REQUEST on switch%d/%d:  Who has %s?  Tell %s DST %s",
-                                    dp.id, in_port, arp_msg.dst_ip, arp_msg.src_mac, arp_msg.dst_mac)
-
-                # TODO:  Generate a *REPLY* for this request based on your switch state
-                mac_answer = 0
-                # search for the mac address
-                for ip in self.tm.ip_host_mac:
-                    if ip == arp_msg.dst_ip:
-                        mac_answer = self.tm.ip_host_mac[ip]
-                        break
-                if mac_answer != 0:
-                    # if the mac address exists, controller send the ARP reply
-                    ofctl.send_arp(arp_opcode=arp.ARP_REPLY, vlan_id=VLANID_NONE,
-                                   dst_mac=arp_msg.src_mac,
-                                   sender_mac=mac_answer, sender_ip=arp_msg.dst_ip,
-                                   target_ip=arp_msg.src_ip, target_mac=arp_msg.src_mac,
-                                   src_port=ofctl.dp.ofproto.OFPP_CONTROLLER,
-                                   output_port=in_port
-                                   )
-                else:
-                    # if the mac address does not exist, the ARP request will flood.
-                    data = msg.data
-                    ofproto = dp.ofproto
-                    ofp_parser = dp.ofproto_parser
-                    actions = [ofp_parser.OFPActionOutput(ofproto.OFPP_FLOOD)]
-                    out_flood = ofp_parser.OFPPacketOut(
-                        datapath=dp, buffer_id=msg.buffer_id, in_port=msg.in_port,
-                        actions=actions, data=data)
-                    dp.send_msg(out_flood)
+        if self.trace is not None:
+            # 在准入控制之前记录，重放时也会经过同样的丢弃
+            self.trace.packet_in(dp.id, self.get_ofctl(dp).get_packetin_inport(msg),
+                                 msg.buffer_id, msg.data)
 
+        if not self.admission.admit(dp.id, msg.data):
+            return
+
+        # Use this object to create packets for the given datapath
+        ofctl = self.get_ofctl(dp)
+        in_port = ofctl.get_packetin_inport(msg)
+
+        # 只读取需要的几个字段，不构造完整的ryu Packet
+        frame = parse_frame(msg.data)
+        if frame is None or frame.arp_opcode is None:
+            # The fast path only handles ARP; decode the rest only if somebody reads it
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Ignored packet-in on switch%d/%d: %s",
+                                  dp.id, in_port, packet.Packet(msg.data))
+            return
+
+        # 收到ARP的时候顺便刷新发送者的位置和地址
+        self.host_seen(dp.id, in_port, mac_text(frame.eth_src), ip_text(frame.arp_spa))
+
+        if frame.is_arp_request():
+            # ARP requests for known hosts are answered from prebuilt frames
+            reply = self.arp.reply(frame)
+            if reply is not None:
+                ofctl.send_packet_out(dp.ofproto.OFPP_CONTROLLER, in_port, reply)
+                if self.metrics is not None:
+                    self.metrics.inc(MESSAGES, (('dpid', dp.id), ('type', 'packet_out')))
+                return
+
+            self.logger.warning("Received ARP REQUEST on switch%d/%d:  Who has %s?  Tell %s DST %s",
+                                dp.id, in_port, ip_text(frame.arp_tpa), mac_text(frame.arp_sha),
+                                mac_text(frame.arp_tha))
+
+            # if the mac address does not exist, the ARP request will flood.
+            data = msg.data
+            ofproto = dp.ofproto
+            ofp_parser = dp.ofproto_parser
+            actions = [ofp_parser.OFPActionOutput(ofproto.OFPP_FLOOD)]
+            out_flood = ofp_parser.OFPPacketOut(
+                datapath=dp, buffer_id=msg.buffer_id, in_port=in_port,
+                actions=actions, data=data)
+            dp.send_msg(out_flood)
+            if self.metrics is not None:
+                self.metrics.inc(MESSAGES, (('dpid', dp.id), ('type', 'packet_out')))
+
+            if not CONF.quiet:
                 print("_________Send ARP____________")
 
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    @timed(HANDLER_SECONDS, handler='barrier_reply')
+    def barrier_reply_handler(self, ev):
+        """A batch of flow mods has been applied by the switch"""
+        complete_batch(self.flows.barriers, ev.msg)
+
+    @set_ev_cls([ofp_event.EventOFPStatsReply,
+                 ofp_event.EventOFPPortStatsReply,
+                 ofp_event.EventOFPFlowStatsReply,
+                 ofp_event.EventOFPGroupDescStatsReply], MAIN_DISPATCHER)
+    def stats_reply_handler(self, ev):
+        """Hand statistics replies to the collector waiting for them"""
+        self.stats.handle_reply(ev.msg)
+
+    def learn_host(self, mac: str, dpid: int, port_no: int, ipv4=()):
+        """Add a host, or move it, and update only the rules for it"""
+        before = self.state
+        old = before.hosts.get(mac)
+        self.state = before.add_host(mac, dpid, port_no, ipv4)
+        new = self.state.hosts[mac]
+        for ip in new.ipv4:
+            self.arp.learn(ip, mac)
+        for ip in old.ipv4 if old is not None else ():
+            if ip not in self.state.addresses:
+                self.arp.forget(ip)
+        if self.host_aging is not None:
+            self.host_aging.seen(mac)
+        if old is None or (old.dpid, old.port_no) != (new.dpid, new.port_no):
+            self.update_host_rules(before, old, new)
+        elif old.ipv4 != new.ipv4 and CONF.flood_mode == 'per-source':
+            self.scheduler.mark_dirty()  # ARP广播规则是按源IP匹配的
+
+    def forget_host(self, mac: str):
+        """Remove a host and its rules"""
+        before = self.state
+        old = before.hosts.get(mac)
+        if old is None:
+            return
+        self.state = before.remove_host(mac)
+        for ip in old.ipv4:
+            self.arp.forget(ip)
+        if self.host_aging is not None:
+            self.host_aging.forget(mac)
+        self.update_host_rules(before, old, None)
+
+    def host_seen(self, dpid: int, port_no: int, mac: str, ip: str):
+        """
+        A host sent an ARP packet that reached the controller: refresh it,
+        or learn where it is and which address it has if that changed.
+        """
+        host = self.state.hosts.get(mac)
+        ipv4 = () if ip == '0.0.0.0' else (ip,)  # ARP probes have no sender address yet
+        if host is not None:
+            if host.dpid == dpid and host.port_no == port_no and set(ipv4) <= set(host.ipv4):
+                if self.host_aging is not None:
+                    self.host_aging.seen(mac)
+                return
+            ipv4 = host.ipv4 + tuple(a for a in ipv4 if a not in host.ipv4)
+        # 从交换机之间的链路进来的是别处广播的副本，不代表host的位置
+        if dpid not in self.state.switches or self.state.is_link_port(dpid, port_no):
+            return
+        self.learn_host(mac, dpid, port_no, ipv4)
+
+    def expire_hosts(self):
+        """Remove the hosts not seen for --host-timeout seconds"""
+        while True:
+            hub.sleep(CONF.host_timeout / 2)
+            # 已经装好流表的host的流量不经过控制器，用端口收到的包数判断它是否还在
+            snapshot = self.stats.collect(list(self.datapaths.values()), 'port')
+            rx_packets = {(dpid, stat.port_no): stat.rx_packets
+                          for dpid, body in snapshot.bodies.items() for stat in body}
+            port_hosts = defaultdict(list)
+            for host in self.state.hosts.values():
+                port_hosts[(host.dpid, host.port_no)].append(host.mac)
+            self.host_aging.ports(rx_packets, port_hosts)
+            for mac in self.host_aging.expire():
+                self.logger.info("Host %s expired after %.0f s", mac, CONF.host_timeout)
+                self.forget_host(mac)
+
+    def adopt_flows(self, dp):
+        """
+        Read the flows and groups dp already has (e.g. from before a
+        controller restart) into the reconciler, so the next update only
+        sends the difference instead of reprogramming the switch.
+        """
+        flows, groups, foreign = {}, {}, 0
+        try:
+            snapshot = self.stats.collect([dp], 'flow')
+            if dp.id in snapshot.timeouts:
+                return  # 读不到就当作是空的，整张表重装
+            if dp.ofproto.OFP_VERSION >= ofproto_v1_3.OFP_VERSION:
+                group_snapshot = self.stats.collect([dp], 'group')
+                if dp.id in group_snapshot.timeouts:
+                    return
+                for entry in group_snapshot.bodies[dp.id]:
+                    parsed = parse_group(dp, entry)
+                    if parsed is not None:
+                        groups[parsed[0]] = parsed[1]
+            for entry in snapshot.bodies[dp.id]:
+                if entry.priority not in (PRIORITY_FORWARD, PRIORITY_LABEL):
+                    continue  # table-miss等不归reconciler管
+                parsed = parse_flow(dp, entry)
+                if parsed is None:
+                    foreign += 1
+                    continue
+                flows[parsed[0]] = parsed[1]
+            if self.datapaths.get(dp.id) is not dp:
+                return  # 读的时候switch断开了
+            self.flows.adopt(dp.id, flows, groups)
+            self.logger.info("Switch %d: adopted %d flows and %d groups (%d flows not ours, "
+                             "left alone)", dp.id, len(flows), len(groups), foreign)
+        finally:
+            self.adopting.discard(dp.id)
+            self.scheduler.mark_dirty()
+
+    def poll_link_load(self):
+        """Periodically read port counters and reroute when link weights change"""
+        while True:
+            snapshot = self.stats.collect(list(self.datapaths.values()), 'port')
+            for dpid, body in snapshot.bodies.items():
+                for stat in body:
+                    self.link_weights.record(dpid, stat.port_no, stat.tx_bytes, snapshot.timestamp)
+            if self.link_weights.refresh():
+                self.logger.info("Link weights changed, recomputing paths")
+                self.scheduler.mark_dirty()
+            hub.sleep(CONF.stats_interval)
+
     def get_topology_data(self):
         switch_list = topo.get_switch(self.topology_api_app, None)
         switches = [switch.dp.id for switch in switch_list]
@@ -213,236 +678,413 @@ class ShortestPathSwitching(app_manager.RyuApp):
         for link in links_list:
             link_port_dict[link.src.dpid][link.dst.dpid] = link.src.port_no
 
-        self.print_topology(link_port_dict, switches)
+        self.topology = (links, link_port_dict, switches)
+        if not CONF.quiet:
+            self.print_topology(link_port_dict, switches)
         return links, link_port_dict, switches, switch_list
 
     def print_topology(self, link_port_dict, switches):
+        for line in diagnostics.topology_lines(self.diagnostics_snapshot(paths=False)):
+            print(line)
 
-        print("__________________________Start Printing Topology____________________________")
-        if len(switches) == 1:
-            for i in switches:
-                print("> Connected  Hosts:")
-                if self.switch_host_ip[i] and len(self.switch_host_ip[i]) == 0:
-                    print("No connected hosts.")
-                else:
-                    for h in self.switch_host[i]:
-                        print("Edge: switch_{}/port_{}<-> host_ip_{}".format(i, h.port.port_no, h.ipv4))
-
-        for sw in link_port_dict:
-            print("* For Switch_{} ---------------------".format(sw))
-            print("> Connected Switches :")
-            for to_sw in link_port_dict[sw]:
-                print("Edge: switch_{}/port_{} <-> switch {}/port_{}".format(sw, link_port_dict[sw][to_sw], to_sw,
-                                                                             link_port_dict[to_sw][sw]))
-            print("> Connected  Hosts:")
-            if self.switch_host_ip[sw] and len(self.switch_host_ip[sw]) == 0:
-                print("No connected hosts.")
-            else:
-
-                for h in self.switch_host[sw]:
-                    print("Edge: switch_{}/port_{}<-> host_ip_{}".format(sw, h.port.port_no, h.ipv4))
-        print("__________________________END Printing Topology____________________________")
-
-    def Dijkstra(self, n: int, S: int, para_edges: list) -> (dict, list):
+    def print_shortest_path(self, switch_list: list):
+        for line in diagnostics.path_lines(self.diagnostics_snapshot()):
+            print(line)
+
+    def diagnostics_snapshot(self, paths=True) -> diagnostics.Snapshot:
+        """Copy of the last topology, spanning tree and (if paths) next hops, for the dumps"""
+        links, link_port_dict, switches = self.topology
+        state = self.state
+        hosts = {dpid: [(h.port_no, h.mac, list(h.ipv4)) for h in state.hosts_of(dpid)]
+                 for dpid in switches}
+        next_hops = {}
+        if paths:
+            next_hops = {dpid: dict(self.paths.next_hops(dpid)) for dpid in switches}
+        return diagnostics.Snapshot(switches, link_port_dict, hosts, self.tree.edges(), next_hops)
+
+    def dump_diagnostics(self):
+        """Write all the dumps to diagnostics-file (stdout if not set), e.g. on SIGUSR1"""
+        lines = diagnostics.dump_lines(self.diagnostics_snapshot())
+        if not CONF.diagnostics_file:
+            for line in lines:
+                print(line)
+            return
+        with open(CONF.diagnostics_file, 'w') as f:
+            for line in lines:
+                f.write(line + '\n')
+        self.logger.info("Diagnostics written to %s", CONF.diagnostics_file)
+
+    def get_switch_path(self, src: int, dst: int) -> tuple:
+        """Switches from switch src to switch dst, () if dst is unreachable"""
+        return self.path_cache.get(src, dst)
+
+    def get_path(self, src_mac: str, dst_mac: str) -> list:
         """
-        :param n:
-        :param S:
-        :param para_edges:
-        :return:
+        Route of the traffic from host src_mac to host dst_mac, for other apps
+        (app_manager.lookup_service_brick('ShortestPathSwitching')) and GET /path.
+        :return: [(switch_id, in_port, out_port)] from the first to the last
+                 switch, [] if a host is unknown or unreachable
         """
-        Graph = [[] for i in range(n + 1)]
-        for edge in para_edges:
-            u, v = edge
-            Graph[u].append(node(v, 1))
-
-        dis = [INF for i in range(n + 1)]
-        dis[S] = 0
-
-        via = {}
-        pre = [0 for i in range(n + 1)]
-        paths = [[] for i in range(n + 1)]
-        paths[S].append(S)
-
-        pq = PriorityQueue()
-        pq.put(node(S, 0))
-        while not pq.empty():
-            top = pq.get()
-            if dis[top.id] < top.w:
-                continue
-            if top.id != S:
-                paths[top.id] = paths[pre[top.id]].copy()
-                paths[top.id].append(top.id)
-            for i in Graph[top.id]:
-                if dis[i.id] > dis[top.id] + i.w:
-                    dis[i.id] = dis[top.id] + i.w
-                    pre[i.id] = top.id
-                    if top.id != S:
-                        via[i.id] = via[top.id]
-                    else:
-                        via[i.id] = i.id
-                    pq.put(node(i.id, dis[i.id]))
-        return via, paths
-
-    def print_shortest_path(self, switch_list: list):
-        print("________________________Start Printing Shortest Path_____________________________")
-        if len(switch_list) == 1:
-            print("There is only a Single switch in the net work.")
-        else:
-            for i in switch_list:
-                print("* For Switch_{} :".format(i.dp.id))
-                for j in range(1, len(switch_list) + 1):
-                    print("> Switch_{} to Switch_{} ".format(i.dp.id, j))
-                    print(self.shortest_path[i.dp.id][j])
-        print("__________________________End Printing Shortest Path_____________________________")
-
+        state = self.state
+        src_host, dst_host = state.hosts.get(src_mac), state.hosts.get(dst_mac)
+        if src_host is None or dst_host is None:
+            return []
+        switches = self.get_switch_path(src_host.dpid, dst_host.dpid)
+        if not switches:
+            return []
+        link_port_dict = self.topology[1]
+        hops = []
+        in_port = src_host.port_no
+        for here, nxt in zip(switches, switches[1:]):
+            out_port = link_port_dict.get(here, {}).get(nxt)
+            if out_port is None:
+                return []  # the topology changed under the cached path
+            hops.append((here, in_port, out_port))
+            in_port = link_port_dict.get(nxt, {}).get(here)
+        hops.append((dst_host.dpid, in_port, dst_host.port_no))
+        return hops
+
+    def next_port(self, src: int, dst: int, link_port_dict) -> int:
+        """Output port on switch src towards switch dst, 0 if dst is unreachable"""
+        if self.sparse:
+            return self.paths.out_port(src, dst)
+        hop = self.paths.next_hops(src).get(dst)
+        return link_port_dict[src][hop] if hop is not None else 0
+
+    def forward_action(self, dp, dst: int, link_port_dict):
+        """
+        Action sending traffic from dp towards switch dst. On OpenFlow 1.3
+        switches: a select group over all equal cost next hops, or else a
+        fast failover group falling back to a loop-free alternate next hop.
+        A plain output otherwise. None if dst is unreachable.
+        """
+        next_port = self.next_port(dp.id, dst, link_port_dict)
+        if not next_port:
+            return None
+        if dp.ofproto.OFP_VERSION < ofproto_v1_3.OFP_VERSION:
+            return output(next_port)
+        if CONF.ecmp:
+            hops = self.paths.equal_cost_hops(dp.id, dst)
+            if len(hops) > 1:
+                ports = [link_port_dict[dp.id][hop] for hop in hops]
+                return group(self.flows.group_id(dp.id, select_group(ports)))
+        if CONF.fast_failover:
+            # 主端口down时交换机直接切换到备用端口，不用等控制器重新计算
+            alternates = self.paths.loop_free_alternates(dp.id, dst)
+            if alternates:
+                ports = [next_port, link_port_dict[dp.id][alternates[0]]]
+                return group(self.flows.group_id(dp.id, failover_group(ports)))
+        return output(next_port)
+
+    @timed(PHASE_SECONDS, phase='recompute')
     def update_all_flow_table(self):
         links, link_port_dict, switches, switch_list = self.get_topology_data()
-        snum = len(self.switch_host_mac)
-        if len(links) > 0 and snum >= len(switches):
-            print("________Begin update flow table________")
-            for i in switch_list:  # i 是 switch ！ 不是 switch.dp.id
-                s_dic, paths = self.Dijkstra(snum, i.dp.id, links)
-                self.shortest_path[i.dp.id] = paths
-                ofc = OfCtl_v1_0(i.dp, self.logger)
-                # 如何获得一个switch连的所有list
-                ofp_parser = i.dp.ofproto_parser
-                # 最短路径，流表更新
-                for k in s_dic:
-                    if s_dic[k] == i.dp.id:  # 等于本身意味着，一步就可以到达
-                        next_port = link_port_dict[s_dic[k]][k]
-                    else:
-                        next_port = link_port_dict[i.dp.id][s_dic[k]]
-                    ## 用目的地的mac地址进行match
-                    for host_mac in self.switch_host_mac[k]:
-                        ofc.set_flow(dl_dst=host_mac, cookie=0, priority=0,
-                                     actions=[ofp_parser.OFPActionOutput(next_port)])
-                    # 交换机直接连的主机也要明确端口
-                    for host_mac in self.switch_host_mac[i.dp.id]:
-                        port = self.mac_host_port[host_mac]
-                        ofc.set_flow(dl_dst=host_mac, cookie=0, priority=0,
-                                     actions=[ofp_parser.OFPActionOutput(port)])
-        elif len(switches) == 1:
-            #当网络中只有一个交换机的时候，特殊处理。
-            for i in switch_list:
-                ofc = OfCtl_v1_0(i.dp, self.logger)
-                ofp_parser = i.dp.ofproto_parser
-                for host_mac in self.switch_host_mac[i.dp.id]:
-                    port = self.mac_host_port[host_mac]
-                    ofc.set_flow(dl_dst=host_mac, cookie=0, priority=0,
-                                 actions=[ofp_parser.OFPActionOutput(port)])
-        # test flood
-        self.update_spanning_tree(snum, links, link_port_dict, switch_list)
-        print("_________End update flow table___________")
-        self.print_shortest_path(switch_list)
-
-    # Prim 算法用与生成最小生成树
-    def Prim(self, n: int, S: int, para_edges: list) -> list:
+        if self.restored_links is not None:
+            # 重启后链路还没全部重新发现，现在算出来的路径会删掉还在用的流表
+            self.restored_links.difference_update(links)
+            if self.restored_links:
+                self.logger.info("Waiting for %d saved link(s) before updating flow tables",
+                                 len(self.restored_links))
+                return
+            self.restored_links = None
+        self.topo_epoch += 1
+        weights = {}
+        if self.link_weights is not None:
+            weights = self.link_weights.link_weights(link_port_dict)
+
+        if self.offloader is not None:
+            # 交给进程池计算，算完之后由apply_routes安装流表
+            link_ports = tuple(((u, v), link_port_dict[u][v]) for u, v in links)
+            snapshot = TopologySnapshot(self.topo_epoch, tuple(switches), tuple(links), link_ports,
+                                        tuple(weights.items()))
+            self.offloader.submit(snapshot, (links, link_port_dict, switch_list))
+            return
+
+        # 只修复受影响的最短路径树，而不是对每个switch重新跑Dijkstra
+        start = time.perf_counter()
+        if self.sparse:
+            changed = self.paths.sync(switches, links, link_port_dict, weights)
+        else:
+            changed = self.paths.sync(switches, links, weights)
+        elapsed = time.perf_counter() - start
+        if self.metrics is not None:
+            self.metrics.observe(PHASE_SECONDS, elapsed, (('phase', 'paths'),))
+        self.logger.info("Path engine: %d next hops changed, recomputed in %.3f ms",
+                         len(changed), elapsed * 1000)
+        if changed:
+            self.path_cache.invalidate()
+        self.install_flow_table(links, link_port_dict, switch_list)
+
+    def host_flows(self, state: NetworkState, host: HostEntry, links: list, link_port_dict) -> dict:
         """
-        :param n: the largest number of nodes (switch_id)
-        :param S:  an arbitrary start point (switch_id)
-        :param para_edges: the list of the graph edges, in a bidirectional format e.g. [ab,ba]
-        :return: a list that contains the edges in the spanning tree
+        The rules matching one host on every switch, as install_flow_table()
+        builds them: {dpid: {FlowMatch: actions}}
         """
-        print("Start Spanning Tree Algorithm...")
-
-        Graph = [[] for i in range(n + 1)]
-        for edge in para_edges:
-            u, v = edge
-            Graph[u].append(node(v, 1))
-
-        dis = [INF for i in range(n + 1)]
-        dis[S] = 0
-
-        pre = [-1] * (n + 1)
-
-        pq = PriorityQueue()
-        pq.put(node(S, 0))
-        while not pq.empty():
-            top = pq.get()
-            for i in Graph[top.id]:
-                if dis[i.id] > i.w:
-                    dis[i.id] = i.w
-                    pre[i.id] = top.id
-                    pq.put(node(i.id, dis[i.id]))
-
-        tree_edges = []
-        for i in range(n + 1):
-            if pre[i] != -1:
-                tree_edges.append((i, pre[i]))
-                tree_edges.append((pre[i], i))
-
-        return tree_edges
-
-    def query(self, n: int, S: int, tree_edges: list) -> dict:
+        flows = {host.dpid: {FlowMatch(priority=PRIORITY_FORWARD, dl_dst=host.mac): (output(host.port_no),)}}
+        label = None
+        if self.labels is not None:
+            label = self.labels.allocate(host.dpid)
+            flows[host.dpid][FlowMatch(priority=PRIORITY_LABEL, dl_vlan=label, dl_dst=host.mac)] = \
+                (strip_vlan(), output(host.port_no))
+        if not links:
+            return flows
+        for dpid in self.topology[2]:
+            dp = self.datapaths.get(dpid)
+            if dpid == host.dpid or dp is None or dpid not in state.switches:
+                continue
+            if label is not None and not state.switch_hosts.get(dpid):
+                continue  # 只有边缘交换机需要打label的规则
+            forward = self.forward_action(dp, host.dpid, link_port_dict)
+            if forward is None:
+                continue
+            actions = (forward,) if label is None else (set_vlan(label), forward)
+            flows[dpid] = {FlowMatch(priority=PRIORITY_FORWARD, dl_dst=host.mac): actions}
+        return flows
+
+    def switch_flood_flows(self, state: NetworkState, dpid: int, link_port_dict) -> dict:
+        """The shared tree flood rules of one switch: {FlowMatch: actions}"""
+        ports = tree_ports(self.tree.edges(), link_port_dict, {dpid: state.host_ports(dpid)})[dpid]
+        return {FlowMatch(priority=PRIORITY_FORWARD, in_port=in_port, dl_dst=BROADCAST):
+                tuple(output(port) for port in out_ports)
+                for in_port, out_ports in flood_rules({dpid: ports})[dpid].items()}
+
+    @timed(PHASE_SECONDS, phase='host_update')
+    def update_host_rules(self, before: NetworkState, old: HostEntry, new: HostEntry):
+        """
+        Install, move or remove the rules of one host (old: where it was,
+        new: where it is now, either None) from the next hops already
+        computed, instead of recomputing every flow table.
+        """
+        if self.scheduler.is_dirty():
+            return  # 马上要全部重算，会一起装上
+        state = self.state
+        links, link_port_dict, routed = self.topology
+        full = CONF.flood_mode != 'shared' or (new is not None and new.dpid not in routed) or \
+            self.restored_links is not None
+        if self.labels is not None:
+            # 边缘交换机变了，所有交换机的label规则都要变
+            full = full or (old is not None and not state.switch_hosts.get(old.dpid)) or \
+                (new is not None and not before.switch_hosts.get(new.dpid))
+        if full:
+            self.scheduler.mark_dirty()
+            return
+
+        changes = defaultdict(dict)  # dpid : {FlowMatch: actions, None to delete}
+        if old is not None:
+            for dpid, flows in self.host_flows(before, old, links, link_port_dict).items():
+                changes[dpid].update(dict.fromkeys(flows))
+        if new is not None:
+            for dpid, flows in self.host_flows(state, new, links, link_port_dict).items():
+                changes[dpid].update(flows)
+        # 广播也要送到（或者不再送到）这个host的端口
+        for dpid in {host.dpid for host in (old, new) if host is not None}:
+            if dpid not in self.datapaths:
+                continue
+            changes[dpid].update(dict.fromkeys(self.switch_flood_flows(before, dpid, link_port_dict)))
+            changes[dpid].update(self.switch_flood_flows(state, dpid, link_port_dict))
+
+        count = FlowModCount()
+        batches = []
+        for dpid, flows in changes.items():
+            dp = self.datapaths.get(dpid)
+            if dp is None or dpid in self.adopting:
+                continue
+            switch_count = self.flows.update(self.get_ofctl(dp), flows)
+            count.merge(switch_count)
+            if switch_count.total():
+                batches.append(self.flows.batches[dpid])
+                if self.metrics is not None:
+                    self.count_flow_mods(dpid, switch_count)
+        self.logger.info("Host %s: flow mods sent: %s", (new or old).mac, count)
+        if batches:
+            hub.spawn(self.wait_convergence, batches)
+
+    def add_label_rules(self, state: NetworkState, table: dict, sw: int, dst_sw: int, forward: tuple):
+        """
+        Label forwarding from switch sw towards the hosts of dst_sw.
+        Every switch forwards tagged packets on the label of dst_sw (one rule
+        per destination switch), and only edge switches, which have hosts
+        of their own, need one tagging rule per remote host.
+        Label rules have a higher priority than the dl_dst rules, so a tagged
+        packet crossing an edge switch is not tagged again.
+        """
+        label = self.labels.allocate(dst_sw)
+        table[FlowMatch(priority=PRIORITY_LABEL, dl_vlan=label)] = (forward,)
+        if state.switch_hosts.get(sw):
+            for host_mac in state.switch_hosts[dst_sw]:
+                table[FlowMatch(priority=PRIORITY_FORWARD, dl_dst=host_mac)] = (set_vlan(label), forward)
+
+    def apply_routes(self, changed: dict, context):
+        """Called on the controller thread when the workers finished the latest topology"""
+        links, link_port_dict, switch_list = context
+        if changed:
+            self.path_cache.invalidate()
+        self.install_flow_table(links, link_port_dict, switch_list)
+
+    @timed(PHASE_SECONDS, phase='install')
+    def install_flow_table(self, links: list, link_port_dict, switch_list: list):
+        # 整个更新过程只读同一个快照，发送流表时处理的新事件不会影响这次计算
+        state = self.state
+        self.logger.info("Topology version %d: %s since the last update", state.version,
+                         state.diff(self.installed_state))
+        self.installed_state = state
+        # 先算出每个switch期望的流表，再只把差异发给switch
+        desired = {i.dp.id: {} for i in switch_list
+                   if i.dp.id in state.switches and i.dp.id not in self.adopting}
+        if not CONF.quiet:
+            print("________Begin update flow table________")
+        for i in switch_list:  # i 是 switch ！ 不是 switch.dp.id
+            if i.dp.id not in desired:
+                continue
+            table = desired[i.dp.id]
+            if len(links) > 0:
+                # 最短路径，用目的地的mac地址进行match
+                for k in desired:
+                    if k == i.dp.id or not state.switch_hosts.get(k):
+                        continue
+                    forward = self.forward_action(i.dp, k, link_port_dict)
+                    if forward is None:
+                        continue
+                    if self.labels is not None:
+                        self.add_label_rules(state, table, i.dp.id, k, forward)
+                        continue
+                    for host_mac in state.switch_hosts[k]:
+                        table[FlowMatch(priority=PRIORITY_FORWARD, dl_dst=host_mac)] = (forward,)
+            # 交换机直接连的主机也要明确端口
+            for host in state.hosts_of(i.dp.id):
+                host_mac, port = host.mac, host.port_no
+                table[FlowMatch(priority=PRIORITY_FORWARD, dl_dst=host_mac)] = (output(port),)
+                if self.labels is not None:
+                    # egress: 去掉label再交给host
+                    label = self.labels.allocate(i.dp.id)
+                    table[FlowMatch(priority=PRIORITY_LABEL, dl_vlan=label, dl_dst=host_mac)] = \
+                        (strip_vlan(), output(port))
+        # test flood
+        self.update_spanning_tree(links, link_port_dict, switch_list, desired, state)
+
+        count = FlowModCount()
+        batches = []
+        start = time.perf_counter()
+        for i in switch_list:
+            if i.dp.id in desired:
+                switch_count = self.flows.reconcile(self.get_ofctl(i.dp), desired[i.dp.id])
+                count.merge(switch_count)
+                if switch_count.total():
+                    batches.append(self.flows.batches[i.dp.id])
+                    if self.metrics is not None:
+                        self.count_flow_mods(i.dp.id, switch_count)
+        if self.metrics is not None:
+            self.metrics.observe(PHASE_SECONDS, time.perf_counter() - start, (('phase', 'reconcile'),))
+        self.logger.info("Flow mods sent: %s", count)
+        if batches:
+            hub.spawn(self.wait_convergence, batches)
+        if not CONF.quiet:
+            print("_________End update flow table___________")
+            self.print_shortest_path(switch_list)
+
+    def count_flow_mods(self, dpid: int, count: FlowModCount):
+        flow_mods = count.add + count.modify + count.delete
+        group_mods = count.group_add + count.group_delete
+        if flow_mods:
+            self.metrics.inc(MESSAGES, (('dpid', dpid), ('type', 'flow_mod')), flow_mods)
+        if group_mods:
+            self.metrics.inc(MESSAGES, (('dpid', dpid), ('type', 'group_mod')), group_mods)
+
+    def wait_convergence(self, batches: list):
+        """Log how long the switches took to apply the flow mods of one update"""
+        deadline = time.monotonic() + CONVERGENCE_TIMEOUT
+        for batch in batches:
+            batch.wait(timeout=max(deadline - time.monotonic(), 0))
+        pending = [batch.dpid for batch in batches if not batch.done()]
+        if pending:
+            self.logger.warning("No barrier reply after %.1f s from switch(es) %s",
+                                CONVERGENCE_TIMEOUT, ", ".join(str(dpid) for dpid in pending))
+            return
+        slowest = max(batches, key=lambda batch: batch.latency)
+        self.convergence_time = slowest.latency
+        self.logger.info("Flow tables converged on %d switches in %.1f ms (slowest: switch%d, "
+                         "%d messages)", len(batches), slowest.latency * 1000,
+                         slowest.dpid, slowest.size)
+
+    def query(self, S: int, tree_edges: list, nodes: list = ()) -> dict:
         '''Return a dictionary that describes the children of every node.
-        'n' is the total number of nodes, S is an arbitrary start point
-        in the graph, tree_edges is the list of the tree edges.
+        S is an arbitrary start point in the graph, tree_edges is the list
+        of the tree edges and nodes lists switches that may not be in the tree.
         '''
-        Graph = [[] for i in range(n + 1)]
-        for edge in tree_edges:
-            u, v = edge
-            Graph[u].append(node(v, 1))
+        graph = Graph(tree_edges, nodes=list(nodes) + [S])
+        ids = graph.ids
+        children = graph.bfs_children(S)
 
         neighbours = {}
-        for i in range(n + 1):
-            neighbours[i] = []
-
-        q = Queue()
-        q.put(node(S, -1))
-        while not q.empty():
-            top = q.get()
-            for i in Graph[top.id]:
-                if i.id != top.w:
-                    neighbours[top.id].append(i.id)
-                    q.put(node(i.id, top.id))
+        for i, dpid in enumerate(ids):
+            neighbours[dpid] = [ids[j] for j in children[i]]
 
         return neighbours
 
-    def update_spanning_tree(self, n: int, para_edges: list, link_port_dict, switch_list: list):
+    @timed(PHASE_SECONDS, phase='spanning_tree')
+    def update_spanning_tree(self, para_edges: list, link_port_dict, switch_list: list,
+                             desired: dict, state: NetworkState):
         """
 
-        :param n:
         :param para_edges:
         :param link_port_dict:
         :param switch_list:
+        :param desired: desired flow table of every switch, the flood rules are added to it
+        :param state: the network state the flow tables are computed from
         :return:
         """
-        tree = self.Prim(n, 1, para_edges)
-        print("************ Spanning Tree *************")
-        print(tree)
-        print("*****************************************")
+        if not desired:
+            return
+        # 生成树只在链路变化时局部修复，不再每次重新运行Prim
+        changed = self.tree.sync([i.dp.id for i in switch_list], para_edges)
+        tree = self.tree.edges()
+        if changed:
+            self.logger.info("Spanning tree changed on switch(es) %s",
+                             ", ".join(str(dpid) for dpid in sorted(changed)))
+        verbose = not CONF.quiet
+        if verbose:
+            for line in diagnostics.tree_lines(self.diagnostics_snapshot(paths=False)):
+                print(line)
+        if CONF.flood_mode == 'shared':
+            # 所有广播共用一棵树，每个switch只按in_port装规则
+            ports = tree_ports(tree, link_port_dict,
+                               {dpid: state.host_ports(dpid) for dpid in desired})
+            for dpid, rules in flood_rules(ports).items():
+                if dpid not in desired:
+                    continue
+                for in_port, out_ports in rules.items():
+                    match = FlowMatch(priority=PRIORITY_FORWARD, in_port=in_port, dl_dst=BROADCAST)
+                    desired[dpid][match] = tuple(output(port) for port in out_ports)
+            return
+
         for i in switch_list:  # 网络中每一个switch都作为root
+            if i.dp.id not in desired:
+                continue
 
-            print("@ Root: Switch_{} ----------------------------------".format(i.dp.id))
+            if verbose:
+                print("@ Root: Switch_{} ----------------------------------".format(i.dp.id))
 
-            relationship = self.query(n, i.dp.id, tree)
+            relationship = self.query(i.dp.id, tree, desired)
             for father in switch_list:  # 对于网络中每一个switch
-                ofc = OfCtl_v1_0(father.dp, self.logger)
-                ofp_parser = father.dp.ofproto_parser
+                if father.dp.id not in desired:
+                    continue
                 action_set = list()
-                print("> For Switch_{} :".format(father.dp.id))
+                if verbose:
+                    print("> For Switch_{} :".format(father.dp.id))
                 # 指定当前交换机要output到其他switch的所有port，添加到action_set中
                 for each_child in relationship[father.dp.id]:
                     port = link_port_dict[father.dp.id][each_child]
-                    action_set.append(ofp_parser.OFPActionOutput(port))
-                    print(" Switch_{}/Port_{} -> Switch_{}".format(father.dp.id, port, each_child))
+                    action_set.append(output(port))
+                    if verbose:
+                        print(" Switch_{}/Port_{} -> Switch_{}".format(father.dp.id, port, each_child))
 
                 # 指定当前交换机要output到其他host的所有port，添加到action_set中
-                for host_port in self.switch_host_port[father.dp.id]:
-                    action_set.append(ofp_parser.OFPActionOutput(host_port))
+                for host_port in state.host_ports(father.dp.id):
+                    action_set.append(output(host_port))
 
                 # 更新流表，ARP包通过广播地址和source address的ip地址来match
-                for host_ip in self.switch_host_ip[i.dp.id]:
-                    for each_ip in host_ip:
-                        ofc.set_flow(nw_src=each_ip, dl_dst="ff:ff:ff:ff:ff:ff", cookie=0, priority=0,
-                                     dl_type=ether_types.ETH_TYPE_ARP,
-                                     actions=action_set)
-
-
-class node:
-    def __init__(self, id, w):
-        self.id = id
-        self.w = w
-
-    def __lt__(self, other):
-        return True if self.w < other.w else False
+                for host in state.hosts_of(i.dp.id):
+                    for each_ip in host.ipv4:
+                        match = FlowMatch(priority=PRIORITY_FORWARD, nw_src=each_ip,
+                                          dl_dst="ff:ff:ff:ff:ff:ff", dl_type=ether_types.ETH_TYPE_ARP)
+                        desired[father.dp.id][match] = tuple(action_set)
@@ -0,0 +1,201 @@
+"""Vectorized all-pairs next hop backend
+
+Computes the next hop of every (switch, destination) pair in a single
+batched scipy.sparse.csgraph call instead of one Python Dijkstra per
+switch.  The results are kept as integer matrices that the flow
+installation code can index directly:
+
+hops[i, j]   -- dense index of the next switch from i towards j (-1: none)
+ports[i, j]  -- output port on switch i towards j (0: none)
+
+NumPy and SciPy are optional; use available() before selecting this
+backend.
+
+"""
+
+from collections.abc import Mapping
+
+try:
+    import numpy as np
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import shortest_path
+except ImportError:
+    np = None
+
+
+def available() -> bool:
+    return np is not None
+
+
+class HopChanges(Mapping):
+    """
+    {(switch, dst): (old_next_hop, new_next_hop)} backed by the index
+    arrays of a matrix diff.  The dictionary itself is only built if
+    somebody looks inside; len() is free.
+    """
+
+    def __init__(self, ids, rows, cols, olds, news):
+        self._ids = ids
+        self._arrays = (rows, cols, olds, news)
+        self._dict = None
+
+    def _build(self):
+        if self._dict is None:
+            ids = self._ids
+            rows, cols, olds, news = (a.tolist() for a in self._arrays)
+            self._dict = {(ids[i], ids[j]): (ids[o] if o >= 0 else None, ids[h] if h >= 0 else None)
+                          for i, j, o, h in zip(rows, cols, olds, news)}
+        return self._dict
+
+    def __len__(self):
+        return len(self._arrays[0])
+
+    def __iter__(self):
+        return iter(self._build())
+
+    def __getitem__(self, key):
+        return self._build()[key]
+
+
+class SparsePaths():
+    """
+    All-pairs next hop matrices recomputed in one call per topology.
+    Exposes the same queries as path_engine.DynamicShortestPaths.
+    """
+
+    def __init__(self):
+        if np is None:
+            raise ImportError("The sparse path backend needs numpy and scipy")
+        self.ids = []  # index -> dpid
+        self.index = {}  # dpid -> index
+        self.hops = np.zeros((0, 0), dtype=np.int32)
+        self.ports = np.zeros((0, 0), dtype=np.int32)
+        self.dist = np.zeros((0, 0))
+        self.graph = csr_matrix((0, 0))
+
+    def sync(self, switches: list, links: list, link_port_dict: dict, weights: dict = None) -> dict:
+        """
+        Recompute the next hop and port matrices for the given topology.
+        :param switches: list of dpids
+        :param links: list of (src_dpid, dst_dpid)
+        :param link_port_dict: {src_dpid: {dst_dpid: src_port}}
+        :param weights: optional {(src_dpid, dst_dpid): weight}, default 1
+        :return: {(switch, dst): (old_next_hop, new_next_hop)}
+        """
+        old_ids, old_hops = self.ids, self.hops
+        ids = sorted(set(switches).union(*zip(*links)) if links else set(switches))
+        index = {dpid: i for i, dpid in enumerate(ids)}
+        n = len(ids)
+
+        if links:
+            src = np.fromiter((index[u] for u, _ in links), dtype=np.int32, count=len(links))
+            dst = np.fromiter((index[v] for _, v in links), dtype=np.int32, count=len(links))
+            port = np.fromiter((link_port_dict[u][v] for u, v in links), dtype=np.int32,
+                               count=len(links))
+        else:
+            src = dst = port = np.zeros(0, dtype=np.int32)
+
+        # Predecessors in the reversed graph give successors in the original one:
+        # pred_t[j, i] is the node after i on the shortest path i -> j
+        if weights:
+            cost = np.fromiter((weights.get(link, 1) for link in links), dtype=np.float64,
+                               count=len(links))
+        else:
+            cost = np.ones(len(src))
+        graph_t = csr_matrix((cost, (dst, src)), shape=(n, n))
+        dist_t, pred_t = shortest_path(graph_t, method='D', unweighted=not weights,
+                                       return_predecessors=True)
+        hops = pred_t.T.astype(np.int32)
+        hops[hops < 0] = -1
+
+        # Look the output port of every (i, hops[i, j]) link up in one go
+        ports = np.zeros((n, n), dtype=np.int32)
+        if len(src):
+            keys = src.astype(np.int64) * n + dst
+            order = np.argsort(keys)
+            keys, port = keys[order], port[order]
+            rows, cols = np.nonzero(hops >= 0)
+            wanted = rows.astype(np.int64) * n + hops[rows, cols]
+            ports[rows, cols] = port[np.searchsorted(keys, wanted)]
+
+        self.ids, self.index, self.hops, self.ports = ids, index, hops, ports
+        self.dist = dist_t.T
+        self.graph = graph_t.T.tocsr()
+        return self._changes(old_ids, old_hops)
+
+    def _changes(self, old_ids: list, old_hops) -> dict:
+        ids, hops = self.ids, self.hops
+        names = ids
+        if old_ids != ids:
+            # Translate the old matrix into the new index space.  Removed
+            # switches get indices past the new ones, so a hop that pointed
+            # at one never equals a new hop and is reported with its dpid.
+            n = len(ids)
+            removed = [dpid for dpid in old_ids if dpid not in self.index]
+            extra = {dpid: n + k for k, dpid in enumerate(removed)}
+            remap = np.array([self.index.get(dpid, extra.get(dpid)) for dpid in old_ids] + [-1],
+                             dtype=np.int32)
+            keep = np.array([i for i, dpid in enumerate(old_ids) if dpid in self.index], dtype=np.int32)
+            to = remap[keep]
+            translated = np.full((n, n), -1, dtype=np.int32)
+            translated[np.ix_(to, to)] = remap[old_hops[np.ix_(keep, keep)]]
+            old_hops = translated
+            names = ids + removed
+        rows, cols = np.nonzero(old_hops != hops)
+        return HopChanges(names, rows, cols, old_hops[rows, cols], hops[rows, cols])
+
+    def next_hops(self, s: int) -> dict:
+        """Return {dst: next_hop_switch} for every switch reachable from s."""
+        if s not in self.index:
+            return {}
+        row = self.hops[self.index[s]]
+        ids = self.ids
+        return {ids[j]: ids[h] for j, h in enumerate(row.tolist()) if h >= 0}
+
+    def out_port(self, s: int, d: int) -> int:
+        """Output port on s towards d, 0 if d is unreachable"""
+        if s not in self.index or d not in self.index:
+            return 0
+        return int(self.ports[self.index[s], self.index[d]])
+
+    def equal_cost_hops(self, s: int, d: int) -> list:
+        """Every neighbour of s that starts a shortest path to d"""
+        if s not in self.index or d not in self.index or s == d:
+            return []
+        i, j = self.index[s], self.index[d]
+        if not np.isfinite(self.dist[i, j]):
+            return []
+        row = slice(self.graph.indptr[i], self.graph.indptr[i + 1])
+        nbrs = self.graph.indices[row]
+        best = nbrs[self.dist[nbrs, j] + self.graph.data[row] == self.dist[i, j]]
+        return sorted(self.ids[k] for k in best.tolist())
+
+    def loop_free_alternates(self, s: int, d: int) -> list:
+        """Neighbours of s off the shortest paths that reach d without looping back through s"""
+        if s not in self.index or d not in self.index or s == d:
+            return []
+        i, j = self.index[s], self.index[d]
+        best = self.dist[i, j]
+        if not np.isfinite(best):
+            return []
+        row = slice(self.graph.indptr[i], self.graph.indptr[i + 1])
+        nbrs, costs = self.graph.indices[row], self.graph.data[row]
+        via = self.dist[nbrs, j] + costs
+        ok = (self.dist[nbrs, j] < self.dist[nbrs, i] + best) & (via != best)
+        order = np.lexsort((nbrs[ok], via[ok]))
+        return [self.ids[k] for k in nbrs[ok][order].tolist()]
+
+    def path(self, s: int, d: int) -> list:
+        """Return the switch path s -> d, or [] if d is unreachable."""
+        if s not in self.index or d not in self.index:
+            return []
+        if s == d:
+            return [s]
+        i, j = self.index[s], self.index[d]
+        path = [s]
+        while i != j:
+            i = int(self.hops[i, j])
+            if i < 0:
+                return []
+            path.append(self.ids[i])
+        return path
@@ -0,0 +1,92 @@
+"""Host table and topology kept across controller restarts
+
+After a restart the controller used to know no host until each one sent
+an ARP again (arping_all in the Mininet CLI).  StateStore keeps the
+switches, links and hosts of the latest NetworkState in a sqlite file;
+the controller loads it at startup, so ARP requests are answered and
+host rules computed right away, and saves it every few seconds.
+
+A save only writes the rows that differ from the state saved last:
+mappings the two states share are skipped without being compared, and
+all changes go in one transaction.  The database runs in WAL mode with
+synchronous=NORMAL, so a save does not wait for the disk; a crash may
+lose the last save but never leaves a half written one.
+
+"""
+
+import sqlite3
+
+from network_state import NetworkState
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS switches (dpid INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS links (src INTEGER, dst INTEGER, port INTEGER, PRIMARY KEY (src, dst));
+CREATE TABLE IF NOT EXISTS hosts (mac TEXT PRIMARY KEY, dpid INTEGER, port_no INTEGER, ipv4 TEXT);
+"""
+
+
+def _changed(old, new):
+    """(keys to write, keys to delete) between two mappings"""
+    if old is new:
+        return [], []
+    return ([key for key, value in new.items() if old.get(key) != value],
+            [key for key in old if key not in new])
+
+
+class StateStore():
+    """
+    :param path: sqlite file, created if it does not exist
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.saved = NetworkState()  # the state the file holds
+        self.saves = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def load(self) -> NetworkState:
+        """The state saved last, empty for a new file"""
+        state = NetworkState()
+        for dpid, in self._db.execute("SELECT dpid FROM switches"):
+            state = state.add_switch(dpid)
+        for src, dst, port in self._db.execute("SELECT src, dst, port FROM links"):
+            state = state.add_link(src, dst, port)
+        for mac, dpid, port_no, ipv4 in self._db.execute(
+                "SELECT mac, dpid, port_no, ipv4 FROM hosts ORDER BY rowid"):
+            state = state.add_host(mac, dpid, port_no, ipv4.split(',') if ipv4 else ())
+        self.saved = state
+        return state
+
+    def save(self, state: NetworkState) -> int:
+        """
+        Write what changed since the last save.
+        :return: number of rows written or deleted
+        """
+        if state is self.saved:
+            return 0
+        saved = self.saved
+        added_switches, removed_switches = state.switches - saved.switches, saved.switches - state.switches
+        write_links, delete_links = _changed(saved.links, state.links)
+        write_hosts, delete_hosts = _changed(saved.hosts, state.hosts)
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO switches VALUES (?)",
+                                 [(dpid,) for dpid in added_switches])
+            self._db.executemany("DELETE FROM switches WHERE dpid = ?",
+                                 [(dpid,) for dpid in removed_switches])
+            self._db.executemany("INSERT OR REPLACE INTO links VALUES (?, ?, ?)",
+                                 [key + (state.links[key],) for key in write_links])
+            self._db.executemany("DELETE FROM links WHERE src = ? AND dst = ?", delete_links)
+            self._db.executemany("INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?)",
+                                 [(host.mac, host.dpid, host.port_no, ','.join(host.ipv4))
+                                  for host in (state.hosts[mac] for mac in write_hosts)])
+            self._db.executemany("DELETE FROM hosts WHERE mac = ?", [(mac,) for mac in delete_hosts])
+        self.saved = state
+        self.saves += 1
+        return (len(added_switches) + len(removed_switches) + len(write_links) + len(delete_links) +
+                len(write_hosts) + len(delete_hosts))
+
+    def close(self):
+        self._db.close()
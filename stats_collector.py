@@ -0,0 +1,139 @@
+"""Concurrent statistics collection
+
+OfCtl.send_stats_request blocks its caller until the reply of one
+datapath arrives (or OFP_REPLY_TIMER expires), so asking N switches one
+after the other takes up to N timeouts.  StatsCollector sends the request
+to every datapath at once from its own green thread and gathers the
+answers into one StatsSnapshot.
+
+The collector owns the `waiters` dictionary that OfCtl fills in, and the
+controller forwards every statistics reply to handle_reply(), which
+reassembles multipart replies and wakes the waiting green thread once
+the last part is in.
+
+"""
+
+import time
+from collections import namedtuple
+
+from ryu.lib import hub
+
+from ofctl_utils import OfCtl
+
+# kind: 'port', 'flow' or 'group', timestamp: time.time() when the poll started,
+# bodies: {dpid: [stats entries]}, latency: {dpid: seconds}, timeouts: dpids that did not answer
+StatsSnapshot = namedtuple('StatsSnapshot', ['kind', 'timestamp', 'bodies', 'latency', 'timeouts'])
+
+# Name of the OfCtl getter for each kind of statistics
+REQUESTS = {
+    'port': 'get_port_stats',
+    'flow': 'get_all_flow',
+    'group': 'get_group_desc',  # OpenFlow 1.3 only
+}
+
+
+def more_flag(ofp) -> int:
+    """The 'more parts follow' bit of a multipart / stats reply"""
+    more = getattr(ofp, 'OFPMPF_REPLY_MORE', None)
+    return ofp.OFPSF_REPLY_MORE if more is None else more  # OpenFlow 1.0 / 1.2
+
+
+class SwitchStats():
+    """Reply latency and timeouts of one datapath"""
+
+    def __init__(self):
+        self.requests = 0
+        self.timeouts = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def mean_latency(self):
+        answered = self.requests - self.timeouts
+        return self.total_latency / answered if answered else 0.0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'timeouts': self.timeouts,
+            'last_latency': self.last_latency,
+            'mean_latency': self.mean_latency(),
+            'max_latency': self.max_latency,
+        }
+
+
+class StatsCollector():
+    """
+    Fan statistics requests out to all datapaths at once.
+
+    :param logger: logger of the controller
+    :param spawn: starts a green thread (hub.spawn)
+    :param joinall: waits for a list of green threads (hub.joinall)
+    """
+
+    def __init__(self, logger, spawn=hub.spawn, joinall=hub.joinall,
+                 clock=time.monotonic):
+        self.logger = logger
+        self.waiters = {}  # dpid : {xid: (event, msgs)}
+        self.switches = {}  # dpid : SwitchStats
+        self.latest = {}  # kind : newest StatsSnapshot
+
+        self._spawn = spawn
+        self._joinall = joinall
+        self._clock = clock
+
+    def handle_reply(self, msg):
+        """Store one (part of a) statistics reply and wake its waiter after the last part"""
+        dp = msg.datapath
+        waiters_per_dp = self.waiters.get(dp.id, {})
+        if msg.xid not in waiters_per_dp:
+            # Late reply to a request that already timed out
+            return
+        event, msgs = waiters_per_dp[msg.xid]
+        msgs.append(msg)
+        if msg.flags & more_flag(dp.ofproto):
+            return
+        del waiters_per_dp[msg.xid]
+        event.set()
+
+    def forget(self, dpid):
+        """Drop the waiters and counters of a datapath that left"""
+        for event, _ in self.waiters.pop(dpid, {}).values():
+            event.set()
+        self.switches.pop(dpid, None)
+
+    def collect(self, datapaths, kind='port') -> StatsSnapshot:
+        """
+        Request `kind` statistics from every datapath concurrently and
+        wait until all of them answered or timed out.
+        :param datapaths: iterable of Datapath
+        """
+        getter = REQUESTS[kind]
+        timestamp = time.time()
+        bodies, latency, timeouts = {}, {}, []
+
+        def poll(dp):
+            switch = self.switches.setdefault(dp.id, SwitchStats())
+            switch.requests += 1
+            start = self._clock()
+            msgs = getattr(OfCtl.factory(dp, self.logger), getter)(self.waiters)
+            elapsed = self._clock() - start
+            if not msgs or msgs[-1].flags & more_flag(dp.ofproto):
+                # Nothing, or only the first parts of a multipart reply
+                switch.timeouts += 1
+                timeouts.append(dp.id)
+                return
+            switch.last_latency = elapsed
+            switch.total_latency += elapsed
+            switch.max_latency = max(switch.max_latency, elapsed)
+            latency[dp.id] = elapsed
+            bodies[dp.id] = [entry for msg in msgs for entry in msg.body]
+
+        self._joinall([self._spawn(poll, dp) for dp in list(datapaths)])
+
+        snapshot = StatsSnapshot(kind, timestamp, bodies, latency, tuple(sorted(timeouts)))
+        if timeouts:
+            self.logger.warning("No %s stats from %d switch(es): %s", kind, len(timeouts),
+                                ", ".join(str(dpid) for dpid in snapshot.timeouts))
+        self.latest[kind] = snapshot
+        return snapshot
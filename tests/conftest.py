@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The controller modules are imported by name, as ryu-manager does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
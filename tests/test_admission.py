@@ -0,0 +1,66 @@
+from admission import PacketInAdmission, TokenBucket
+
+
+class Clock():
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def frame(src=1, tail=b''):
+    return b'\xff' * 6 + bytes(5) + bytes([src]) + b'\x08\x06' + tail
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=2.0, burst=2, now=0.0)
+    assert bucket.take(0.0) and bucket.take(0.0)
+    assert not bucket.take(0.0)
+    assert not bucket.take(0.25)
+    assert bucket.take(0.5)
+    assert not bucket.idle(0.5) and bucket.idle(1.5)
+
+
+def test_duplicates_are_dropped_within_the_window():
+    clock = Clock()
+    admission = PacketInAdmission(switch_rate=0, source_rate=0, duplicate_window=0.5, clock=clock)
+    assert admission.admit(1, frame())
+    assert not admission.admit(1, frame())
+    assert admission.admit(2, frame())  # another switch
+    clock.now += 0.6
+    assert admission.admit(1, frame())
+    assert admission.stats.as_dict() == {'admitted': 3, 'dropped': 1, 'duplicate': 1,
+                                         'source_rate': 0, 'switch_rate': 0}
+    assert admission.per_switch[1].duplicate == 1
+
+
+def test_source_and_switch_buckets():
+    clock = Clock()
+    admission = PacketInAdmission(switch_rate=3, source_rate=2, duplicate_window=0, clock=clock)
+    assert admission.admit(1, frame(src=1, tail=b'a'))
+    assert admission.admit(1, frame(src=1, tail=b'b'))
+    assert not admission.admit(1, frame(src=1, tail=b'c'))  # source bucket empty
+    assert admission.admit(1, frame(src=2))
+    assert not admission.admit(1, frame(src=3))  # switch bucket empty
+    assert admission.admit(2, frame(src=3))
+    assert admission.stats.source_rate == 1 and admission.stats.switch_rate == 1
+
+    clock.now += 1.0
+    assert admission.admit(1, frame(src=1, tail=b'd'))
+
+
+def test_sweep_and_forget_drop_old_state():
+    clock = Clock()
+    admission = PacketInAdmission(switch_rate=10, source_rate=10, duplicate_window=0.5, clock=clock)
+    admission.admit(1, frame(src=1))
+    admission.admit(2, frame(src=2))
+    clock.now += 5.0
+    admission.admit(2, frame(src=3))
+    assert list(admission.recent) == [(2, frame(src=3))]
+    assert list(admission.source_buckets) == [frame(src=3)[6:12]]
+
+    admission.forget(2)
+    assert 2 not in admission.switch_buckets and 2 not in admission.per_switch
+    assert admission.recent == {}
@@ -0,0 +1,48 @@
+import socket
+import struct
+
+from arp_responder import FRAME_LEN, ArpResponder
+from packet_parser import ARP_REPLY, ARP_REQUEST, ETH_TYPE_ARP, ETH_TYPE_IP, ip_text, mac_text, parse_frame
+
+
+def request(target_ip, sender_mac='00:00:00:00:00:01', sender_ip='10.0.0.1'):
+    sender = bytes.fromhex(sender_mac.replace(':', ''))
+    frame = b'\xff' * 6 + sender + struct.pack('!H', ETH_TYPE_ARP) + struct.pack(
+        '!HHBBH6s4s6s4s', 1, ETH_TYPE_IP, 6, 4, ARP_REQUEST, sender, socket.inet_aton(sender_ip),
+        bytes(6), socket.inet_aton(target_ip))
+    return parse_frame(frame)
+
+
+def test_reply_for_a_known_host():
+    arp = ArpResponder()
+    arp.learn('10.0.0.2', '00:00:00:00:00:02')
+    assert arp.lookup('10.0.0.2') == '00:00:00:00:00:02'
+
+    frame = arp.reply(request('10.0.0.2'))
+    assert len(frame) == FRAME_LEN
+    reply = parse_frame(bytes(frame))
+    assert mac_text(reply.eth_dst) == '00:00:00:00:00:01'
+    assert mac_text(reply.eth_src) == '00:00:00:00:00:02'
+    assert reply.arp_opcode == ARP_REPLY
+    assert mac_text(reply.arp_sha) == '00:00:00:00:00:02' and ip_text(reply.arp_spa) == '10.0.0.2'
+    assert mac_text(reply.arp_tha) == '00:00:00:00:00:01' and ip_text(reply.arp_tpa) == '10.0.0.1'
+    assert arp.replies == 1
+
+
+def test_reply_buffer_is_rewritten_for_each_request():
+    arp = ArpResponder()
+    arp.learn('10.0.0.2', '00:00:00:00:00:02')
+    arp.learn('10.0.0.3', '00:00:00:00:00:03')
+    arp.reply(request('10.0.0.2'))
+    reply = parse_frame(bytes(arp.reply(request('10.0.0.3', '00:00:00:00:00:04', '10.0.0.4'))))
+    assert mac_text(reply.arp_sha) == '00:00:00:00:00:03'
+    assert ip_text(reply.arp_tpa) == '10.0.0.4'
+
+
+def test_unknown_and_forgotten_hosts_are_misses():
+    arp = ArpResponder()
+    arp.learn('10.0.0.2', '00:00:00:00:00:02')
+    arp.forget('10.0.0.2')
+    assert arp.reply(request('10.0.0.2')) is None
+    assert arp.lookup('10.0.0.2') is None
+    assert arp.misses == 1 and arp.replies == 0
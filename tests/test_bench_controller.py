@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('ryu')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import bench_controller  # noqa: E402
+import topologies  # noqa: E402
+
+
+@pytest.mark.parametrize('version', sorted(bench_controller.VERSIONS))
+def test_benchmark_runs_on_every_openflow_version(version):
+    results = bench_controller.scenario(topologies.mesh(4), version)
+    cold, down = results['cold start'], results['link down']
+    # every switch gets one rule per remote host and the broadcast rules
+    assert cold['flow_mods'] >= 4 * 3
+    assert down['flow_mods'] > 0
+    if version == '1.3':
+        assert cold['group_mods'] > 0
@@ -0,0 +1,69 @@
+from broadcast_tree import SpanningTree, flood_rules, tree_ports
+
+
+def both_ways(edges):
+    return [(u, v) for a, b in edges for u, v in ((a, b), (b, a))]
+
+
+def test_every_tree_port_floods_to_the_other_tree_ports():
+    # Triangle 1-2-3 with the tree 1-2, 1-3; one host on switch 2
+    link_port_dict = {1: {2: 1, 3: 2}, 2: {1: 1, 3: 2}, 3: {1: 1, 2: 2}}
+    tree = [(1, 2), (2, 1), (1, 3), (3, 1)]
+    ports = tree_ports(tree, link_port_dict, {1: [], 2: [3], 3: []})
+    assert ports == {1: [1, 2], 2: [1, 3], 3: [1]}
+
+    rules = flood_rules(ports)
+    assert rules == {1: {1: (2,), 2: (1,)}, 2: {1: (3,), 3: (1,)}, 3: {1: ()}}
+    # The link 2-3 is off the tree: a broadcast coming in over it matches nothing
+    assert link_port_dict[2][3] not in rules[2] and link_port_dict[3][2] not in rules[3]
+
+
+def test_rule_count_does_not_grow_with_the_hosts():
+    link_port_dict = {1: {2: 1}, 2: {1: 1}}
+    tree = [(1, 2), (2, 1)]
+    one = flood_rules(tree_ports(tree, link_port_dict, {1: [2], 2: [2]}))
+    many = flood_rules(tree_ports(tree, link_port_dict, {1: [2, 3, 4, 5], 2: [2]}))
+    assert len(one[2]) == len(many[2]) == 2
+    assert many[1][1] == (2, 3, 4, 5)
+
+
+def spans(tree, nodes):
+    edges = tree.edges()
+    return len(edges) == 2 * (len(nodes) - 1) and tree.component(min(nodes)) == set(nodes)
+
+
+def test_tree_is_repaired_locally():
+    # Full mesh of 4: it stays connected after losing any two links
+    switches = [1, 2, 3, 4]
+    mesh = [(u, v) for u in switches for v in switches if u < v]
+    tree = SpanningTree()
+    tree.sync(switches, both_ways(mesh))
+    assert tree.rebuilds == 1 and spans(tree, switches)
+
+    # A link that is not on the tree changes no rule
+    off = next((u, v) for u, v in mesh if v not in tree.tree[u])
+    links = both_ways([link for link in mesh if link != off])
+    assert tree.sync(switches, links) == set()
+
+    # Losing a tree link: one replacement, only the ends of both links change
+    lost = next((u, v) for u, v in mesh if v in tree.tree[u])
+    links = both_ways([link for link in mesh if link not in (off, lost)])
+    changed = tree.sync(switches, links)
+    assert tree.repairs == 1 and tree.rebuilds == 1
+    assert spans(tree, switches)
+    assert set(lost) <= changed and len(changed) <= 4
+
+
+def test_one_way_links_and_partitions():
+    tree = SpanningTree()
+    tree.sync([1, 2, 3], [(1, 2), (2, 1), (2, 3)])
+    # 2 -> 3 was only discovered in one direction
+    assert sorted(tree.edges()) == [(1, 2), (2, 1)]
+
+    changed = tree.sync([1, 2, 3], [(1, 2), (2, 1), (2, 3), (3, 2)])
+    assert changed == {2, 3} and spans(tree, [1, 2, 3])
+
+    # Cutting the only link between two halves leaves a forest
+    tree.sync([1, 2, 3], both_ways([(1, 2)]))
+    assert tree.component(1) == {1, 2} and tree.component(3) == {3}
+    assert tree.repairs == 0
@@ -0,0 +1,96 @@
+import pytest
+
+pytest.importorskip('ryu')
+
+from coalescer import RecomputeScheduler  # noqa: E402
+
+
+class Clock():
+    """Fake time; sleeping runs the events scheduled for that moment"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.events = []  # (time, callable), sorted
+        self.spawned = []
+
+    def __call__(self):
+        return self.now
+
+    def at(self, when, fn):
+        self.events.append((when, fn))
+        self.events.sort(key=lambda event: event[0])
+
+    def sleep(self, seconds):
+        wake = self.now + seconds
+        while self.events and self.events[0][0] <= wake:
+            self.now, fn = self.events.pop(0)
+            fn()
+        self.now = wake
+
+    def spawn(self, fn):
+        self.spawned.append(fn)
+        return fn
+
+    def run(self):
+        while self.spawned:
+            self.spawned.pop(0)()
+
+
+def scheduler(clock, runs, **kwargs):
+    return RecomputeScheduler(lambda: runs.append(clock()), clock=clock,
+                              spawn=clock.spawn, sleep=clock.sleep, **kwargs)
+
+
+def test_burst_is_absorbed_by_one_recompute_after_the_quiet_period():
+    clock, runs = Clock(), []
+    sched = scheduler(clock, runs, quiet_period=0.2, max_delay=1.0)
+    for _ in range(3):
+        sched.mark_dirty()
+    clock.at(0.1, sched.mark_dirty)
+    assert len(clock.spawned) == 1 and sched.is_dirty()
+
+    clock.run()
+    assert runs == [pytest.approx(0.3)]
+    assert not sched.is_dirty()
+    assert sched.stats.recomputes == 1 and sched.stats.last_absorbed == 4
+    assert sched.stats.events_per_recompute() == 4
+    assert sched.stats.last_latency == pytest.approx(0.3)
+
+
+def test_steady_events_wait_at_most_the_max_delay():
+    clock, runs = Clock(), []
+    sched = scheduler(clock, runs, quiet_period=0.2, max_delay=0.5)
+    sched.mark_dirty()
+    for i in range(1, 8):
+        clock.at(0.15 * i, sched.mark_dirty)
+    clock.run()
+    # The events keep coming faster than the quiet period
+    assert runs == [pytest.approx(0.5)]
+    assert sched.stats.last_absorbed == 4
+
+    # The rest starts a new round, bounded the same way
+    clock.sleep(0.15)
+    clock.run()
+    assert runs[1] == pytest.approx(0.6 + 0.5)
+    assert sched.stats.events == 8 and sched.stats.max_latency == pytest.approx(0.5)
+
+
+def test_zero_quiet_period_recomputes_on_every_event():
+    clock, runs = Clock(), []
+    sched = scheduler(clock, runs, quiet_period=0)
+    sched.mark_dirty()
+    sched.mark_dirty()
+    assert len(runs) == 2 and clock.spawned == []
+
+
+def test_flush_runs_the_pending_recompute_now():
+    clock, runs = Clock(), []
+    sched = scheduler(clock, runs, quiet_period=0.2)
+    sched.flush()
+    assert runs == []
+    sched.mark_dirty()
+    sched.flush()
+    assert runs == [0.0] and not sched.is_dirty()
+    # The waiter finds nothing left to do
+    clock.run()
+    assert len(runs) == 1
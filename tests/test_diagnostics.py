@@ -0,0 +1,65 @@
+import os
+import sys
+
+import pytest
+
+import diagnostics
+from diagnostics import Snapshot
+
+
+def line_snapshot():
+    """1 - 2 - 3, one host on 1"""
+    link_port_dict = {1: {2: 2}, 2: {1: 1, 3: 2}, 3: {2: 1}}
+    hosts = {1: [(1, '00:00:00:00:00:01', ['10.0.0.1'])]}
+    next_hops = {1: {2: 2, 3: 2}, 2: {1: 1, 3: 3}, 3: {2: 2, 1: 2}}
+    return Snapshot([1, 2, 3], link_port_dict, hosts, [(1, 2), (2, 1), (2, 3), (3, 2)], next_hops)
+
+
+def test_snapshot_does_not_follow_later_changes():
+    link_port_dict = {1: {2: 2}, 2: {1: 1}}
+    hosts = {1: []}
+    snapshot = Snapshot([1, 2], link_port_dict, hosts, [], {1: {2: 2}, 2: {1: 1}})
+    link_port_dict[1][3] = 3
+    hosts[1].append((1, '00:00:00:00:00:01', []))
+    assert snapshot.link_port_dict == {1: {2: 2}, 2: {1: 1}}
+    assert snapshot.hosts == {1: []}
+
+
+def test_paths_from_the_next_hops():
+    snapshot = line_snapshot()
+    assert snapshot.path(1, 3) == [1, 2, 3]
+    assert snapshot.path(3, 3) == [3]
+    assert snapshot.path(1, 4) == []
+
+    lines = list(diagnostics.path_lines(snapshot, src=1, dst=3))
+    assert lines[1:-1] == ["* For Switch_1 :", "> Switch_1 to Switch_3 ", "[1, 2, 3]"]
+    # every pair: a header per source, two lines per destination
+    assert len(list(diagnostics.path_lines(snapshot))) == 2 + 3 * (1 + 2 * 3)
+
+
+def test_dump_only_the_asked_sections():
+    lines = list(diagnostics.dump_lines(line_snapshot(), ['topology', 'tree']))
+    assert lines[0].startswith("# snapshot taken ")
+    assert "Edge: switch_1/port_2 <-> switch 2/port_1" in lines
+    assert "Edge: switch_1/port_1<-> host_ip_['10.0.0.1']" in lines
+    assert str([(1, 2), (2, 1), (2, 3), (3, 2)]) in lines
+    assert not any("Shortest Path" in line for line in lines)
+
+
+def test_quiet_controller_prints_nothing_while_recomputing(capsys):
+    pytest.importorskip('ryu')
+    from ryu import cfg
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+    import bench_controller
+    import topologies
+
+    cfg.CONF.set_override('quiet', True)
+    try:
+        harness = bench_controller.Harness(topologies.linear(3, 1), '1.3')
+        harness.connect()
+        harness.recompute()
+    finally:
+        cfg.CONF.clear_override('quiet')
+    assert capsys.readouterr().out == ''
+    # the same dump is still available on demand
+    assert "[1, 2, 3]" in diagnostics.dump_lines(harness.app.diagnostics_snapshot())
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+
+import event_trace
+from event_trace import (HostRecord, LinkRecord, PacketInRecord, PortRecord, PortStateRecord, SwitchRecord,
+                         TraceReader, TraceWriter)
+
+
+class Clock():
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        self.now += 0.5
+        return self.now
+
+
+def port(dpid, port_no, live=True):
+    return SimpleNamespace(dpid=dpid, port_no=port_no, hw_addr='02:00:00:00:%02x:%02x' % (dpid, port_no),
+                           is_live=lambda: live)
+
+
+def record_all(path):
+    """One event of every kind, as the ryu objects the handlers get"""
+    writer = TraceWriter(path, clock=Clock())
+    switch = SimpleNamespace(dp=SimpleNamespace(id=1, ofproto=SimpleNamespace(OFP_VERSION=4)),
+                             ports=[port(1, 1), port(1, 2)])
+    writer.switch(event_trace.SWITCH_ENTER, switch)
+    writer.link(event_trace.LINK_ADD, SimpleNamespace(src=port(1, 2), dst=port(2, 1)))
+    host = SimpleNamespace(mac='00:00:00:00:00:01', port=port(1, 1), ipv4=['10.0.0.1'])
+    writer.host(host)
+    writer.port(port(2, 1, live=False))
+    writer.packet_in(1, 1, 0xffffffff, b'\xff' * 6 + b'frame')
+    writer.host(host, event_trace.HOST_DELETE)
+    writer.close()
+    return writer.records
+
+
+@pytest.mark.parametrize('name', ['events.trace', 'events.trace.gz'])
+def test_every_event_survives_a_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    assert record_all(path) == 6
+
+    records = list(TraceReader(path))
+    assert [record.time for record in records] == [0.5, 1.0, 1.5, 2.0, 2.5, 3.0]
+    host_port = PortRecord(1, 1, '02:00:00:00:01:01')
+    assert [(record.type, record.event) for record in records] == [
+        (event_trace.SWITCH_ENTER, SwitchRecord(1, 4, [(1, '02:00:00:00:01:01'), (2, '02:00:00:00:01:02')])),
+        (event_trace.LINK_ADD, LinkRecord(PortRecord(1, 2, '02:00:00:00:01:02'),
+                                          PortRecord(2, 1, '02:00:00:00:02:01'))),
+        (event_trace.HOST_ADD, HostRecord('00:00:00:00:00:01', host_port, ['10.0.0.1'])),
+        (event_trace.PORT_MODIFY, PortStateRecord(PortRecord(2, 1, '02:00:00:00:02:01'), False)),
+        (event_trace.PACKET_IN, PacketInRecord(1, 1, 0xffffffff, b'\xff' * 6 + b'frame')),
+        (event_trace.HOST_DELETE, HostRecord('00:00:00:00:00:01', host_port, ['10.0.0.1'])),
+    ]
+
+
+def test_a_trace_cut_short_keeps_its_complete_records(tmp_path):
+    path = tmp_path / 'events.trace'
+    record_all(str(path))
+    data = path.read_bytes()
+    path.write_bytes(data[:-3])
+    assert len(list(TraceReader(str(path)))) == 5
+
+    path.write_bytes(b'NOTATRACE' + data[9:])
+    with pytest.raises(ValueError):
+        TraceReader(str(path))
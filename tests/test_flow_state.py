@@ -0,0 +1,257 @@
+import struct
+from collections import namedtuple
+from types import SimpleNamespace
+
+import pytest
+
+from flow_state import (FlowMatch, FlowReconciler, build_actions, build_buckets, failover_group, group, output,
+                        parse_flow, parse_group, select_group, set_vlan, strip_vlan)
+
+try:
+    from ryu.lib import addrconv
+    from ryu.ofproto import ofproto_v1_0, ofproto_v1_0_parser, ofproto_v1_3, ofproto_v1_3_parser
+except ImportError:
+    ofproto_v1_0 = None
+
+needs_ryu = pytest.mark.skipif(ofproto_v1_0 is None, reason="needs ryu")
+
+Datapath = namedtuple('Datapath', ['ofproto', 'ofproto_parser'])
+
+# What Open vSwitch reports for a rule matching dl_dst only: everything
+# else wildcarded, with nw_src and nw_dst as 32 wildcarded bits
+OVS_DL_DST_ONLY = 0x3820f7
+
+
+class RecordingOfCtl():
+    """Records what FlowReconciler asks OfCtl to send, in order"""
+
+    def __init__(self, dpid):
+        # Just enough of an OpenFlow 1.3 datapath for build_actions / build_buckets
+        parser = SimpleNamespace(OFPActionOutput=lambda port: ('output', port),
+                                 OFPActionGroup=lambda group_id: ('group', group_id))
+        self.dp = SimpleNamespace(id=dpid, ofproto=SimpleNamespace(OFPGT_SELECT=1, OFPGT_FF=3),
+                                  ofproto_parser=parser)
+        self.sent = []
+        self.batch = None
+
+    def begin_batch(self):
+        self.batch = []
+
+    def add_barrier(self):
+        self.sent.append(('barrier',))
+
+    def send_batch(self, barriers):
+        self.batch = None
+        return 'batch'
+
+    def discard_batch(self):
+        self.batch = None
+
+    def make_match(self, **fields):
+        return fields
+
+    def set_flow(self, cookie, priority, actions, **fields):
+        self.sent.append(('set_flow', fields['dl_dst'], tuple(actions)))
+
+    def delete_flow(self, cookie=0, priority=0, match=None, strict=False):
+        self.sent.append(('delete_flow', match['dl_dst']))
+
+    def set_group(self, group_id, group_type, buckets):
+        self.sent.append(('set_group', group_id, group_type))
+
+    def delete_group(self, group_id):
+        self.sent.append(('delete_group', group_id))
+
+
+def host_rule(mac):
+    return FlowMatch(priority=1, dl_dst=mac)
+
+
+def test_reconcile_sends_only_the_difference():
+    reconciler = FlowReconciler(None)
+    ofctl = RecordingOfCtl(1)
+    desired = {host_rule('a'): (output(1),), host_rule('b'): (output(2),)}
+    count = reconciler.reconcile(ofctl, desired)
+    assert (count.add, count.modify, count.delete) == (2, 0, 0)
+
+    ofctl.sent = []
+    count = reconciler.reconcile(ofctl, dict(desired))
+    assert ofctl.sent == [] and count.unchanged == 2 and count.total() == 0
+
+    desired = {host_rule('a'): (output(3),), host_rule('c'): (output(2),)}
+    count = reconciler.reconcile(ofctl, desired)
+    assert (count.add, count.modify, count.delete) == (1, 1, 1)
+    # Deletes go first
+    assert ofctl.sent[0] == ('delete_flow', 'b')
+    assert reconciler.installed[1] == desired
+
+
+def test_groups_are_added_before_and_removed_after_their_flows():
+    reconciler = FlowReconciler(None)
+    ofctl = RecordingOfCtl(1)
+    gid = reconciler.group_id(1, select_group([3, 2]))
+    assert reconciler.group_id(1, select_group([2, 3])) == gid
+    reconciler.reconcile(ofctl, {host_rule('a'): (group(gid),)})
+    assert ofctl.sent == [('set_group', gid, 1), ('barrier',), ('set_flow', 'a', (('group', gid),))]
+
+    ofctl.sent = []
+    count = reconciler.reconcile(ofctl, {host_rule('a'): (output(2),)})
+    assert ofctl.sent == [('set_flow', 'a', (('output', 2),)), ('barrier',), ('delete_group', gid)]
+    assert count.group_delete == 1
+    assert reconciler.groups[1] == {}
+
+
+def test_update_touches_only_the_given_rules():
+    reconciler = FlowReconciler(None)
+    ofctl = RecordingOfCtl(1)
+    reconciler.reconcile(ofctl, {host_rule('a'): (output(1),), host_rule('b'): (output(2),)})
+
+    ofctl.sent = []
+    count = reconciler.update(ofctl, {host_rule('a'): None, host_rule('b'): (output(2),),
+                                      host_rule('c'): (output(4),)})
+    assert ofctl.sent == [('delete_flow', 'a'), ('set_flow', 'c', (('output', 4),))]
+    assert (count.add, count.delete, count.unchanged) == (1, 1, 1)
+    assert reconciler.installed[1] == {host_rule('b'): (output(2),), host_rule('c'): (output(4),)}
+
+
+def test_adopted_tables_are_not_sent_again():
+    reconciler = FlowReconciler(None)
+    ofctl = RecordingOfCtl(1)
+    failover = failover_group([2, 3])
+    reconciler.adopt(1, {host_rule('a'): (group(7),), host_rule('b'): (output(2),)}, {7: failover})
+    assert reconciler.group_id(1, failover) == 7
+    assert reconciler.group_id(1, select_group([2, 3])) == 8
+
+    count = reconciler.reconcile(ofctl, {host_rule('a'): (group(7),)})
+    assert ofctl.sent == [('delete_flow', 'b')]
+    assert count.delete == 1 and count.group_add == 0
+
+
+@needs_ryu
+def test_select_group_buckets_watch_their_port():
+    ofp, parser = ofproto_v1_3, ofproto_v1_3_parser
+    spec = select_group([3, 2])
+    assert spec == select_group([2, 3])
+    group_type, buckets = build_buckets(Datapath(ofp, parser), spec)
+    assert group_type == ofp.OFPGT_SELECT
+    assert [(actions[0].port, weight, watch) for actions, weight, watch in buckets] == [(2, 1, 2), (3, 1, 3)]
+    assert build_actions(Datapath(ofp, parser), (group(4),))[0].group_id == 4
+
+
+@needs_ryu
+def test_failover_group_buckets_keep_the_primary_first():
+    ofp, parser = ofproto_v1_3, ofproto_v1_3_parser
+    spec = failover_group([3, 2])
+    assert spec != failover_group([2, 3])
+    group_type, buckets = build_buckets(Datapath(ofp, parser), spec)
+    assert group_type == ofp.OFPGT_FF
+    # Fast failover buckets have no weight and are live while their port is up
+    assert [(actions[0].port, weight, watch) for actions, weight, watch in buckets] == [(3, 0, 3), (2, 0, 2)]
+
+
+def flow_stats_v1_0(wildcards, priority, actions, **fields):
+    """An OFPFlowStats parsed from the bytes a switch sends"""
+    ofp, parser = ofproto_v1_0, ofproto_v1_0_parser
+    for key in ('dl_src', 'dl_dst'):
+        fields[key] = addrconv.mac.text_to_bin(fields.get(key, '00:00:00:00:00:00'))
+    length = ofp.OFP_FLOW_STATS_SIZE + sum(action.len for action in actions)
+    buf = bytearray(length)
+    struct.pack_into(ofp.OFP_FLOW_STATS_0_PACK_STR, buf, 0, length, 0)
+    parser.OFPMatch(wildcards=wildcards, **fields).serialize(buf, ofp.OFP_FLOW_STATS_0_SIZE)
+    struct.pack_into(ofp.OFP_FLOW_STATS_1_PACK_STR, buf,
+                     ofp.OFP_FLOW_STATS_0_SIZE + ofp.OFP_MATCH_SIZE, 10, 0, priority, 0, 0, 0, 7, 700)
+    offset = ofp.OFP_FLOW_STATS_SIZE
+    for action in actions:
+        action.serialize(buf, offset)
+        offset += action.len
+    return parser.OFPFlowStats.parser(bytes(buf), 0)
+
+
+@needs_ryu
+def test_parse_flow_v1_0_with_nw_dst_wildcarded():
+    dp = Datapath(ofproto_v1_0, ofproto_v1_0_parser)
+    stats = flow_stats_v1_0(OVS_DL_DST_ONLY, 1, [ofproto_v1_0_parser.OFPActionOutput(2)],
+                            dl_dst='00:00:00:00:00:02')
+    assert parse_flow(dp, stats) == (FlowMatch(priority=1, dl_dst='00:00:00:00:00:02'), (output(2),))
+
+
+@needs_ryu
+def test_parse_flow_v1_0_arp_source_and_vlan():
+    ofp, parser = ofproto_v1_0, ofproto_v1_0_parser
+    dp = Datapath(ofp, parser)
+    wildcards = ofp.OFPFW_ALL & ~ofp.OFPFW_DL_TYPE & ~ofp.OFPFW_NW_SRC_MASK & ~ofp.OFPFW_IN_PORT
+    stats = flow_stats_v1_0(wildcards, 3, [parser.OFPActionVlanVid(5), parser.OFPActionOutput(1)],
+                            in_port=4, dl_type=0x0806, nw_src=0x0a000001)
+    assert parse_flow(dp, stats) == (FlowMatch(priority=3, dl_type=0x0806, nw_src='10.0.0.1', in_port=4),
+                                     (set_vlan(5), output(1)))
+
+
+@needs_ryu
+def test_parse_flow_v1_0_rejects_fields_we_do_not_install():
+    ofp, parser = ofproto_v1_0, ofproto_v1_0_parser
+    dp = Datapath(ofp, parser)
+    actions = [parser.OFPActionOutput(2)]
+    tp_dst = flow_stats_v1_0(OVS_DL_DST_ONLY & ~ofp.OFPFW_TP_DST, 1, actions, tp_dst=80)
+    assert parse_flow(dp, tp_dst) is None
+    nw_dst = flow_stats_v1_0(OVS_DL_DST_ONLY & ~ofp.OFPFW_NW_DST_MASK, 1, actions, nw_dst=0x0a000002)
+    assert parse_flow(dp, nw_dst) is None
+    nw_src_prefix = (OVS_DL_DST_ONLY & ~ofp.OFPFW_NW_SRC_MASK) | 8 << ofp.OFPFW_NW_SRC_SHIFT
+    assert parse_flow(dp, flow_stats_v1_0(nw_src_prefix, 1, actions, nw_src=0x0a000000)) is None
+
+
+def flow_stats_v1_3(priority, actions, **fields):
+    """An OFPFlowStats whose match went through the wire format"""
+    ofp, parser = ofproto_v1_3, ofproto_v1_3_parser
+    buf = bytearray()
+    parser.OFPMatch(**fields).serialize(buf, 0)
+    return parser.OFPFlowStats(priority=priority, match=parser.OFPMatch.parser(bytes(buf), 0),
+                               instructions=[parser.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, actions)])
+
+
+@needs_ryu
+def test_parse_flow_v1_3():
+    ofp, parser = ofproto_v1_3, ofproto_v1_3_parser
+    dp = Datapath(ofp, parser)
+    stats = flow_stats_v1_3(1, [parser.OFPActionOutput(2)], eth_dst='00:00:00:00:00:02')
+    assert parse_flow(dp, stats) == (FlowMatch(priority=1, dl_dst='00:00:00:00:00:02'), (output(2),))
+
+    # Label mode: edge switches push the label, the egress switch pops it
+    push = flow_stats_v1_3(1, [parser.OFPActionPushVlan(0x8100),
+                               parser.OFPActionSetField(vlan_vid=5 | ofp.OFPVID_PRESENT),
+                               parser.OFPActionGroup(3)], eth_dst='00:00:00:00:00:02')
+    assert parse_flow(dp, push)[1] == (set_vlan(5), group(3))
+    pop = flow_stats_v1_3(2, [parser.OFPActionPopVlan(), parser.OFPActionOutput(1)],
+                          vlan_vid=5 | ofp.OFPVID_PRESENT)
+    assert parse_flow(dp, pop) == (FlowMatch(priority=2, dl_vlan=5), (strip_vlan(), output(1)))
+
+    arp = flow_stats_v1_3(3, [parser.OFPActionOutput(ofp.OFPP_CONTROLLER)], in_port=1, eth_type=0x0806,
+                          arp_spa=('10.0.0.1', '255.255.255.255'))
+    assert parse_flow(dp, arp)[0] == FlowMatch(priority=3, dl_type=0x0806, nw_src='10.0.0.1', in_port=1)
+
+
+@needs_ryu
+def test_parse_flow_v1_3_rejects_foreign_flows():
+    ofp, parser = ofproto_v1_3, ofproto_v1_3_parser
+    dp = Datapath(ofp, parser)
+    actions = [parser.OFPActionOutput(2)]
+    assert parse_flow(dp, flow_stats_v1_3(1, actions, eth_type=0x0800, ip_proto=6, tcp_dst=80)) is None
+    assert parse_flow(dp, flow_stats_v1_3(1, actions, eth_type=0x0800,
+                                          ipv4_src=('10.0.0.0', '255.0.0.0'))) is None
+    meter = flow_stats_v1_3(1, actions, eth_dst='00:00:00:00:00:02')
+    meter.instructions.insert(0, parser.OFPInstructionMeter(1))
+    assert parse_flow(dp, meter) is None
+
+
+@needs_ryu
+def test_parse_group():
+    ofp, parser = ofproto_v1_3, ofproto_v1_3_parser
+    dp = Datapath(ofp, parser)
+
+    def desc(group_type, ports):
+        buckets = [parser.OFPBucket(watch_port=port, actions=[parser.OFPActionOutput(port)])
+                   for port in ports]
+        return parser.OFPGroupDescStats(type_=group_type, group_id=4, buckets=buckets)
+
+    assert parse_group(dp, desc(ofp.OFPGT_SELECT, [3, 2])) == (4, select_group([2, 3]))
+    assert parse_group(dp, desc(ofp.OFPGT_FF, [3, 2])) == (4, failover_group([3, 2]))
+    assert parse_group(dp, desc(ofp.OFPGT_ALL, [3, 2])) is None
@@ -0,0 +1,41 @@
+from graph_core import INF, Graph
+
+
+def both_ways(edges):
+    return [(u, v) for a, b in edges for u, v in ((a, b), (b, a))]
+
+
+def test_sparse_dpids_are_mapped_to_dense_indexes():
+    graph = Graph(both_ways([(100, 7), (7, 2 ** 40)]), nodes=[55])
+    assert graph.ids == [7, 55, 100, 2 ** 40]
+    assert len(graph) == 4
+    assert sorted(graph.neighbours(graph.index[7])) == [(2, 1.0), (3, 1.0)]
+    assert list(graph.neighbours(graph.index[55])) == []
+
+
+def test_dijkstra_and_first_hops_follow_the_weights():
+    # 1-2-3 costs 2, the direct link 1-3 costs 5
+    edges = both_ways([(1, 2), (2, 3), (1, 3), (3, 4)])
+    graph = Graph(edges, nodes=[9], weights={(1, 3): 5, (3, 1): 5})
+    dist, pred = graph.dijkstra(1)
+    ids, index = graph.ids, graph.index
+    assert {ids[i]: d for i, d in enumerate(dist)} == {1: 0, 2: 1, 3: 2, 4: 3, 9: INF}
+    assert pred[index[1]] == -1 and pred[index[9]] == -1
+    hops = graph.first_hops(1, dist, pred)
+    assert [ids[h] if h != -1 else None for h in hops] == [None, 2, 2, 2, None]
+
+
+def test_prim_spans_only_the_component_of_the_root():
+    graph = Graph(both_ways([(1, 2), (2, 3), (1, 3), (4, 5)]),
+                  weights={(1, 3): 3, (3, 1): 3})
+    ids = graph.ids
+    tree = sorted((ids[child], ids[parent]) for child, parent in graph.prim(1))
+    assert tree == [(2, 1), (3, 2)]
+
+
+def test_bfs_children_orients_the_tree_away_from_the_root():
+    graph = Graph(both_ways([(1, 2), (2, 3), (2, 4)]))
+    ids = graph.ids
+    children = graph.bfs_children(3)
+    assert {ids[i]: sorted(ids[j] for j in kids) for i, kids in enumerate(children)} == \
+        {1: [], 2: [1, 4], 3: [2], 4: []}
@@ -0,0 +1,46 @@
+from host_aging import HostAging
+
+
+def test_hosts_expire_in_last_seen_order():
+    now = [0.0]
+    aging = HostAging(10.0, clock=lambda: now[0])
+    aging.seen('a')
+    now[0] = 4.0
+    aging.seen('b')
+    now[0] = 8.0
+    aging.seen('a')  # seen again, so b is now the oldest
+    aging.seen('c')
+    aging.forget('c')
+    assert len(aging) == 2
+
+    now[0] = 14.0
+    assert aging.expire() == ['b']
+    now[0] = 18.0
+    assert aging.expire() == ['a']
+    assert aging.expire() == []
+    assert aging.expired_total == 2 and len(aging) == 0
+
+
+def test_hosts_behind_busy_ports_do_not_expire():
+    now = [0.0]
+    aging = HostAging(10.0, clock=lambda: now[0])
+    aging.seen('busy')
+    aging.seen('idle')
+    hosts = {(1, 1): ['busy'], (1, 2): ['idle']}
+    assert aging.ports({(1, 1): 100, (1, 2): 50}, hosts) == 0  # first poll, nothing to compare with
+
+    # The busy host only talks through its rules, never to the controller
+    for tick in range(1, 5):
+        now[0] = tick * 5.0
+        assert aging.ports({(1, 1): 100 + tick, (1, 2): 50}, hosts) == 1
+        expired = aging.expire()
+        assert 'busy' not in expired
+    assert aging.expired_total == 1
+    assert len(aging) == 1
+
+
+def test_port_counters_do_not_bring_back_forgotten_hosts():
+    aging = HostAging(10.0, clock=lambda: 0.0)
+    aging.ports({(1, 1): 1}, {})
+    assert aging.ports({(1, 1): 2}, {(1, 1): ['gone']}) == 0
+    assert len(aging) == 0
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('ryu')
+
+from ryu import cfg  # noqa: E402
+
+from broadcast_tree import BROADCAST  # noqa: E402
+from flow_state import output, set_vlan, strip_vlan  # noqa: E402
+from labels import LabelAllocator  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import bench_controller  # noqa: E402
+import shortest_paths  # noqa: E402
+import topologies  # noqa: E402
+
+
+def test_labels_are_stable_and_reused_after_release():
+    labels = LabelAllocator(first=10, last=12)
+    assert [labels.allocate(dpid) for dpid in (7, 3, 7)] == [10, 11, 10]
+    labels.release(7)
+    labels.release(99)
+    assert labels.allocate(5) == 10
+    assert labels.allocate(6) == 12
+    with pytest.raises(ValueError):
+        labels.allocate(8)
+
+
+@pytest.fixture
+def label_mode():
+    cfg.CONF.set_override('forwarding_mode', 'label')
+    yield
+    cfg.CONF.clear_override('forwarding_mode')
+
+
+def test_core_switches_forward_on_labels_only(label_mode):
+    # s1 is the core, s2 and s3 have two hosts each
+    harness = bench_controller.Harness(topologies.tree(2, 2), '1.3')
+    harness.connect()
+    harness.recompute()
+    app, installed = harness.app, harness.app.flows.installed
+    macs = {dpid: sorted(host.mac for host in app.state.hosts_of(dpid)) for dpid in (2, 3)}
+    label = {dpid: app.labels.labels[dpid] for dpid in (2, 3)}
+    ports = harness.topo.link_port_dict()
+
+    def rules(dpid, priority):
+        return {match: actions for match, actions in installed[dpid].items() if match.priority == priority}
+
+    core = rules(1, shortest_paths.PRIORITY_LABEL)
+    assert {match.dl_vlan: actions for match, actions in core.items()} == \
+        {label[2]: (output(ports[1][2]),), label[3]: (output(ports[1][3]),)}
+    # only the broadcast flood rules match on dl_dst
+    assert {match.dl_dst for match in rules(1, shortest_paths.PRIORITY_FORWARD)} == {BROADCAST}
+
+    # The edge switch tags the packets towards the other edge and pops its own label
+    edge = rules(2, shortest_paths.PRIORITY_FORWARD)
+    for mac in macs[3]:
+        assert edge[next(m for m in edge if m.dl_dst == mac)] == (set_vlan(label[3]), output(ports[2][1]))
+    egress = rules(2, shortest_paths.PRIORITY_LABEL)
+    assert sorted(m.dl_dst for m in egress if m.dl_vlan == label[2]) == macs[2]
+    assert all(actions[0] == strip_vlan() for m, actions in egress.items() if m.dl_dst)
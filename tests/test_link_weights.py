@@ -0,0 +1,55 @@
+import pytest
+
+from link_weights import LinkWeights, residual_weight, utilization_weight
+from path_engine import DynamicShortestPaths
+
+MBIT = 1e6 / 8  # bytes per second at 1 Mbit/s
+
+
+def test_weight_functions():
+    assert [utilization_weight(u) for u in (0, 0.3, 1)] == [1, 4, 11]
+    assert [residual_weight(u) for u in (0, 0.5, 0.9, 1)] == [1, 2, 10, 100]
+
+
+def test_utilization_is_smoothed_and_survives_counter_resets():
+    weights = LinkWeights(capacity=10e6, alpha=0.5)
+    weights.record(1, 1, 0, 0.0)
+    assert weights.utilization == {}
+    weights.record(1, 1, 10 * MBIT, 1.0)  # line rate
+    assert weights.utilization[(1, 1)] == pytest.approx(1.0)
+    weights.record(1, 1, 10 * MBIT, 2.0)  # idle
+    assert weights.utilization[(1, 1)] == pytest.approx(0.5)
+
+    # A reset counter or a stale sample only restarts the measurement
+    weights.record(1, 1, 0, 3.0)
+    weights.record(1, 1, 5 * MBIT, 3.0)
+    assert weights.utilization[(1, 1)] == pytest.approx(0.5)
+
+
+def test_weights_move_only_past_the_hysteresis_band():
+    weights = LinkWeights('utilization', capacity=10e6, alpha=1, hysteresis=1.0)
+    weights.utilization[(1, 2)] = 0.1  # candidate 2: not more than 100% above 1
+    assert not weights.refresh() and weights.weights == {}
+    weights.utilization[(1, 2)] = 0.5  # candidate 6
+    assert weights.refresh() and weights.weights == {(1, 2): 6}
+    weights.utilization[(1, 2)] = 0.4  # candidate 5: close to 6
+    assert not weights.refresh() and weights.weights == {(1, 2): 6}
+
+
+def test_loaded_link_is_routed_around():
+    # 1-2-3 against the longer 1-4-5-3, with port 2 of switch 1 towards 2
+    link_port_dict = {1: {2: 2, 4: 3}, 2: {1: 1, 3: 2}, 3: {2: 1, 5: 2}, 4: {1: 1, 5: 2}, 5: {4: 1, 3: 2}}
+    links = [(u, v) for u in link_port_dict for v in link_port_dict[u]]
+    weights = LinkWeights('utilization', capacity=10e6, alpha=1)
+    weights.record(1, 2, 0, 0.0)
+    weights.record(1, 2, 8 * MBIT, 1.0)
+    assert weights.refresh()
+    assert weights.link_weights(link_port_dict) == {(1, 2): 9}
+
+    engine = DynamicShortestPaths()
+    engine.rebuild(list(link_port_dict), links, weights.link_weights(link_port_dict))
+    assert engine.path(1, 3) == [1, 4, 5, 3]
+    assert engine.path(3, 1) == [3, 2, 1]
+
+    weights.forget(1)
+    assert weights.link_weights(link_port_dict) == {}
@@ -0,0 +1,56 @@
+import pytest
+
+from metrics import HANDLER_SECONDS, MESSAGES, PREFIX, Histogram, Metrics, timed
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+    assert histogram.count == 4 and histogram.sum == pytest.approx(3.65)
+
+
+def test_render_in_prometheus_text_format():
+    metrics = Metrics()
+    metrics.inc(MESSAGES, (('dpid', 2), ('type', 'flow_mod')), 3)
+    metrics.inc(MESSAGES, (('dpid', 1), ('type', 'flow_mod')))
+    metrics.observe(HANDLER_SECONDS, 0.0002, (('handler', 'packet_in'),))
+    metrics.add_collector(lambda: [('queue_depth', (('name', 'a "b"'),), 1.5)])
+    lines = metrics.render().splitlines()
+
+    name = PREFIX + MESSAGES
+    assert lines[lines.index('# TYPE {} counter'.format(name)) + 1:][:2] == [
+        name + '{dpid="1",type="flow_mod"} 1',
+        name + '{dpid="2",type="flow_mod"} 3']
+    name = PREFIX + HANDLER_SECONDS
+    assert '# TYPE {} histogram'.format(name) in lines
+    assert name + '_bucket{handler="packet_in",le="0.0001"} 0' in lines
+    assert name + '_bucket{handler="packet_in",le="0.00025"} 1' in lines
+    assert name + '_bucket{handler="packet_in",le="+Inf"} 1' in lines
+    assert name + '_count{handler="packet_in"} 1' in lines
+    # Values of collectors are read at scrape time; unknown names are untyped
+    assert '# TYPE {}queue_depth untyped'.format(PREFIX) in lines
+    assert PREFIX + 'queue_depth{name="a \\"b\\""} 1.5' in lines
+
+
+class Handler():
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    @timed(HANDLER_SECONDS, handler='test')
+    def handle(self, fail=False):
+        if fail:
+            raise RuntimeError
+        return 'done'
+
+
+def test_timed_observes_every_call_unless_metrics_are_off():
+    assert Handler(None).handle() == 'done'
+
+    metrics = Metrics()
+    handler = Handler(metrics)
+    assert handler.handle() == 'done'
+    with pytest.raises(RuntimeError):
+        handler.handle(fail=True)
+    assert metrics.histograms[(HANDLER_SECONDS, (('handler', 'test'),))].count == 2
@@ -0,0 +1,97 @@
+import random
+
+from network_state import HostEntry, NetworkState
+
+
+def line(n):
+    """Switches 1..n in a line, links both ways leaving on port 1 (left) and 2 (right)"""
+    state = NetworkState()
+    for dpid in range(1, n + 1):
+        state = state.add_switch(dpid)
+    for dpid in range(1, n):
+        state = state.add_link(dpid, dpid + 1, 2).add_link(dpid + 1, dpid, 1)
+    return state
+
+
+def test_updates_leave_older_states_alone():
+    before = line(2)
+    after = before.add_host('00:00:00:00:00:01', 1, 3, ['10.0.0.1'])
+    assert after.version == before.version + 1
+    assert before.hosts == {}
+    assert after.hosts['00:00:00:00:00:01'] == HostEntry('00:00:00:00:00:01', 1, 3, ('10.0.0.1',))
+    assert after.links is before.links  # not touched, so shared
+    assert after.add_host('00:00:00:00:00:01', 1, 3, ['10.0.0.1']) is after
+
+
+def test_host_add_move_and_remove():
+    mac = '00:00:00:00:00:01'
+    state = line(3).add_host(mac, 1, 3, ['10.0.0.1'])
+    assert state.changes.added_hosts == {mac}
+    assert state.hosts_of(1) == [state.hosts[mac]]
+    assert state.addresses == {'10.0.0.1': mac}
+
+    moved = state.add_host(mac, 3, 4, ['10.0.0.1'])
+    assert moved.changes.moved_hosts == {mac}
+    assert moved.switch_hosts[1] == () and moved.switch_hosts[3] == (mac,)
+    assert moved.host_ports(3) == [4]
+
+    removed = moved.remove_host(mac)
+    assert removed.changes.removed_hosts == {mac}
+    assert removed.hosts == {} and removed.addresses == {}
+    assert removed.switch_hosts[3] == ()
+
+
+def test_address_moves_to_the_host_that_claims_it():
+    state = line(1).add_host('00:00:00:00:00:01', 1, 3, ['10.0.0.1'])
+    state = state.add_host('00:00:00:00:00:02', 1, 4, ['10.0.0.1'])
+    assert state.addresses == {'10.0.0.1': '00:00:00:00:00:02'}
+    assert state.hosts['00:00:00:00:00:01'].ipv4 == ()
+
+
+def test_removing_a_switch_removes_its_links_and_hosts():
+    state = line(3).add_host('00:00:00:00:00:02', 2, 3, ['10.0.0.2'])
+    state = state.remove_switch(2)
+    assert state.switches == {1, 3}
+    assert state.links == {}
+    assert state.hosts == {} and state.addresses == {}
+    assert state.changes.removed_links == {(1, 2), (2, 1), (2, 3), (3, 2)}
+    assert state.changes.removed_hosts == {'00:00:00:00:00:02'}
+    assert not state.is_link_port(1, 2)
+
+
+def test_link_port_queries():
+    state = line(3)
+    assert state.link_port_dict() == {1: {2: 2}, 2: {1: 1, 3: 2}, 3: {2: 1}}
+    assert state.is_link_port(2, 1) and state.is_link_port(2, 2)
+    assert not state.is_link_port(2, 3)
+    rewired = state.add_link(1, 2, 5)
+    assert rewired.changes.added_links == {(1, 2)} and rewired.changes.removed_links == {(1, 2)}
+
+
+def test_diff_of_consecutive_states_matches_the_full_comparison():
+    rng = random.Random(11)
+    macs = ['00:00:00:00:00:{:02x}'.format(i) for i in range(1, 7)]
+    states = [line(4)]
+    for _ in range(200):
+        state = states[-1]
+        op = rng.randrange(5)
+        if op == 0:
+            state = state.add_host(rng.choice(macs), rng.randint(1, 4), rng.randint(3, 5),
+                                   ['10.0.0.{}'.format(rng.randint(1, 4))])
+        elif op == 1:
+            state = state.remove_host(rng.choice(macs))
+        elif op == 2:
+            u = rng.randint(1, 4)
+            state = state.add_link(u, u % 4 + 1, rng.randint(1, 3))
+        elif op == 3:
+            u = rng.randint(1, 4)
+            state = state.remove_link(u, u % 4 + 1)
+        else:
+            dpid = rng.randint(1, 5)
+            state = state.add_switch(dpid) if dpid not in state.switches else state.remove_switch(dpid)
+        states.append(state)
+
+    for old, new in zip(states, states[1:]):
+        # A copy that was not derived from old takes the mapping by mapping path
+        unrelated = NetworkState(new.version, new.switches, new.links, new.hosts)
+        assert new.diff(old) == unrelated.diff(old)
@@ -0,0 +1,105 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('ryu')
+
+from ryu.ofproto import ofproto_parser, ofproto_v1_0, ofproto_v1_0_parser  # noqa: E402
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser  # noqa: E402
+
+from ofctl_utils import OfCtl, complete_batch  # noqa: E402
+
+
+class Datapath():
+    """Serializes what would be written to the switch and parses it back"""
+
+    def __init__(self, ofp, parser):
+        self.id = 1
+        self.ofproto = ofp
+        self.ofproto_parser = parser
+        self.xid = 0
+        self.sent = []
+        self.headers = []  # (msg_type, xid) of everything sent
+        self.writes = 0
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        self.send(msg.buf)
+
+    def send(self, buf):
+        self.writes += 1
+        while buf:
+            version, msg_type, msg_len, xid = ofproto_parser.header(buf)
+            self.headers.append((msg_type, xid))
+            # Ryu only parses what switches send; a barrier request is just a header
+            if msg_type != self.ofproto.OFPT_BARRIER_REQUEST:
+                self.sent.append(ofproto_parser.msg(self, version, msg_type, msg_len, xid, buf[:msg_len]))
+            buf = buf[msg_len:]
+
+
+@pytest.mark.parametrize('ofp, parser', [(ofproto_v1_0, ofproto_v1_0_parser),
+                                         (ofproto_v1_3, ofproto_v1_3_parser)])
+def test_flow_mod_matching_a_mac_is_serialized(ofp, parser):
+    dp = Datapath(ofp, parser)
+    ofctl = OfCtl.factory(dp, logging.getLogger(__name__))
+    ofctl.set_flow(0, 1, dl_dst='00:00:00:00:00:02', actions=[parser.OFPActionOutput(2)])
+    ofctl.delete_flow(0, 1, match=ofctl.make_match(dl_dst='ff:ff:ff:ff:ff:ff', dl_vlan=5), strict=True)
+
+    add, delete = dp.sent
+    if ofp is ofproto_v1_0:
+        assert bytes(add.match.dl_dst).hex(':') == '00:00:00:00:00:02'
+        assert bytes(delete.match.dl_dst).hex(':') == 'ff:ff:ff:ff:ff:ff'
+    else:
+        assert dict(add.match.items()) == {'eth_dst': '00:00:00:00:00:02'}
+        assert dict(delete.match.items()) == {'eth_dst': 'ff:ff:ff:ff:ff:ff',
+                                              'vlan_vid': 5 | ofp.OFPVID_PRESENT}
+
+
+def test_batch_is_written_at_once_and_completed_by_its_barrier():
+    dp = Datapath(ofproto_v1_3, ofproto_v1_3_parser)
+    ofctl = OfCtl.factory(dp, logging.getLogger(__name__))
+    output = [ofproto_v1_3_parser.OFPActionOutput(2)]
+    ofctl.begin_batch()
+    ofctl.set_flow(0, 1, dl_dst='00:00:00:00:00:02', actions=output)
+    ofctl.add_barrier()
+    ofctl.delete_flow(0, 1, match=ofctl.make_match(dl_dst='00:00:00:00:00:03'), strict=True)
+    assert dp.headers == []
+
+    barriers = {}
+    completion = ofctl.send_batch(barriers)
+    assert dp.writes == 2  # the queued messages, then the closing barrier
+    flow_mod, barrier = ofproto_v1_3.OFPT_FLOW_MOD, ofproto_v1_3.OFPT_BARRIER_REQUEST
+    assert [msg_type for msg_type, _ in dp.headers] == [flow_mod, barrier, flow_mod, barrier]
+    assert completion.size == 3
+    last_barrier = dp.headers[-1][1]
+    assert list(barriers[dp.id]) == [last_barrier]
+
+    # Messages after the batch go out one by one again
+    ofctl.set_flow(0, 1, dl_dst='00:00:00:00:00:04', actions=output)
+    assert dp.writes == 3
+
+    reply = SimpleNamespace(datapath=dp, xid=last_barrier)
+    assert not completion.done()
+    assert complete_batch(barriers, reply) is completion
+    assert completion.done() and completion.latency >= 0
+    assert completion.wait(timeout=0)
+    assert complete_batch(barriers, reply) is None
+
+
+def test_discarded_batch_is_never_sent():
+    dp = Datapath(ofproto_v1_0, ofproto_v1_0_parser)
+    ofctl = OfCtl.factory(dp, logging.getLogger(__name__))
+    ofctl.begin_batch()
+    ofctl.set_flow(0, 1, dl_dst='00:00:00:00:00:02', actions=[ofproto_v1_0_parser.OFPActionOutput(2)])
+    ofctl.discard_batch()
+    assert dp.sent == []
+
+    ofctl.delete_flow(0, 1)
+    assert [type(msg).__name__ for msg in dp.sent] == ['OFPFlowMod']
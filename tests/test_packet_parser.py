@@ -0,0 +1,51 @@
+import socket
+import struct
+
+from packet_parser import (ARP_REQUEST, ETH_TYPE_8021Q, ETH_TYPE_ARP, ETH_TYPE_IP, ip_text, mac_text,
+                           parse_frame)
+
+SRC = bytes.fromhex('000000000001')
+BROADCAST = b'\xff' * 6
+
+
+def arp_request(sender_ip='10.0.0.1', target_ip='10.0.0.2'):
+    return struct.pack('!HHBBH6s4s6s4s', 1, ETH_TYPE_IP, 6, 4, ARP_REQUEST, SRC,
+                       socket.inet_aton(sender_ip), bytes(6), socket.inet_aton(target_ip))
+
+
+def ethernet(ethertype, payload, vlan_id=None):
+    header = BROADCAST + SRC
+    if vlan_id is not None:
+        header += struct.pack('!HH', ETH_TYPE_8021Q, vlan_id)
+    return header + struct.pack('!H', ethertype) + payload
+
+
+def test_untagged_arp_request():
+    info = parse_frame(ethernet(ETH_TYPE_ARP, arp_request()))
+    assert info.eth_dst == BROADCAST and mac_text(info.eth_src) == '00:00:00:00:00:01'
+    assert info.ethertype == ETH_TYPE_ARP and info.vlan_id is None and info.offset == 14
+    assert info.is_arp_request()
+    assert ip_text(info.arp_spa) == '10.0.0.1' and ip_text(info.arp_tpa) == '10.0.0.2'
+    assert info.arp_sha == SRC
+
+
+def test_tagged_arp_request():
+    info = parse_frame(ethernet(ETH_TYPE_ARP, arp_request(), vlan_id=0x2007))
+    assert info.vlan_id == 7  # without the priority bits
+    assert info.ethertype == ETH_TYPE_ARP and info.offset == 18
+    assert info.is_arp_request() and ip_text(info.arp_tpa) == '10.0.0.2'
+
+
+def test_other_protocols_keep_their_payload():
+    data = ethernet(ETH_TYPE_IP, b'\x45' + bytes(19), vlan_id=5)
+    info = parse_frame(data)
+    assert info.ethertype == ETH_TYPE_IP and info.arp_opcode is None
+    assert bytes(info.payload()) == data[18:]
+    assert not info.is_arp_request()
+
+
+def test_short_frames():
+    assert parse_frame(bytes(13)) is None
+    # An ARP frame cut short still yields the Ethernet fields
+    info = parse_frame(ethernet(ETH_TYPE_ARP, arp_request()[:10]))
+    assert info.ethertype == ETH_TYPE_ARP and info.arp_opcode is None
@@ -0,0 +1,39 @@
+from path_cache import PathCache
+
+
+def test_cached_paths_are_reused_until_invalidated():
+    lookups = []
+
+    def lookup(src, dst):
+        lookups.append((src, dst))
+        return [src, dst]
+
+    cache = PathCache(lookup)
+    assert cache.get(1, 2) == (1, 2)
+    assert cache.get(1, 2) == (1, 2)
+    assert lookups == [(1, 2)]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.invalidate()
+    assert cache.get(1, 2) == (1, 2)
+    assert lookups == [(1, 2), (1, 2)]
+
+
+def test_least_recently_used_path_is_evicted():
+    cache = PathCache(lambda src, dst: [src, dst], capacity=2)
+    cache.get(1, 2)
+    cache.get(1, 3)
+    cache.get(1, 2)  # now 1 -> 3 is the oldest
+    cache.get(1, 4)
+    assert len(cache) == 2
+    misses = cache.misses
+    cache.get(1, 2)
+    assert cache.misses == misses
+    cache.get(1, 3)
+    assert cache.misses == misses + 1
+
+
+def test_unreachable_and_zero_capacity():
+    cache = PathCache(lambda src, dst: [], capacity=0)
+    assert cache.get(1, 2) == ()
+    assert len(cache) == 0
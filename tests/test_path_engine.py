@@ -0,0 +1,122 @@
+import itertools
+import random
+
+from path_engine import DynamicShortestPaths
+
+
+def both_ways(edges):
+    return [(u, v) for a, b in edges for u, v in ((a, b), (b, a))]
+
+
+def grid(n):
+    """n x n grid, full of equal cost paths"""
+    edges = []
+    for r, c in itertools.product(range(n), repeat=2):
+        if c + 1 < n:
+            edges.append((r * n + c + 1, r * n + c + 2))
+        if r + 1 < n:
+            edges.append((r * n + c + 1, (r + 1) * n + c + 1))
+    return list(range(1, n * n + 1)), both_ways(edges)
+
+
+def next_hop_tables(engine, switches):
+    return {s: dict(engine.next_hops(s)) for s in switches}
+
+
+def test_incremental_updates_agree_with_a_rebuild():
+    rng = random.Random(5)
+    switches = list(range(1, 9))
+    weights = {}
+    engine = DynamicShortestPaths()
+    engine.rebuild(switches, [])
+    for _ in range(300):
+        a, b = rng.sample(switches, 2)
+        if (a, b) in weights and rng.random() < 0.4:
+            del weights[(a, b)], weights[(b, a)]
+        else:
+            weights[(a, b)] = weights[(b, a)] = rng.randint(1, 4)
+
+        before = next_hop_tables(engine, switches)
+        changed = engine.sync(switches, list(weights), weights)
+        after = next_hop_tables(engine, switches)
+
+        # The reported changes are exactly the next hops that differ
+        expected = {(s, d): (before[s].get(d), after[s].get(d))
+                    for s in switches for d in set(before[s]) | set(after[s])
+                    if before[s].get(d) != after[s].get(d)}
+        assert dict(changed) == expected
+
+        # Same distances as a fresh engine, and every next hop starts a shortest path
+        fresh = DynamicShortestPaths()
+        fresh.rebuild(switches, list(weights), weights)
+        assert engine.dist == fresh.dist
+        for s in switches:
+            for d, hop in after[s].items():
+                assert weights[(s, hop)] + engine.dist[hop][d] == engine.dist[s][d]
+
+
+def test_removing_a_switch_reroutes_around_it():
+    # 1-2-3 and a longer detour 1-4-5-3
+    switches, links = [1, 2, 3, 4, 5], both_ways([(1, 2), (2, 3), (1, 4), (4, 5), (5, 3)])
+    engine = DynamicShortestPaths()
+    engine.rebuild(switches, links)
+    assert engine.path(1, 3) == [1, 2, 3]
+
+    changed = engine.delete_switch(2)
+    assert changed[(1, 3)] == (2, 4)
+    assert changed[(3, 1)] == (2, 5)
+    assert engine.path(1, 3) == [1, 4, 5, 3]
+    assert 2 not in engine.next_hops(1)
+
+
+def test_path_follows_the_next_hops_when_costs_tie():
+    rng = random.Random(3)
+    switches, links = grid(4)
+    engine = DynamicShortestPaths()
+    engine.rebuild(switches, [])
+    # One by one, in random order, so the trees break ties differently
+    for u, v in rng.sample(links, len(links)):
+        engine.add_link(u, v)
+
+    for s, d in itertools.product(switches, repeat=2):
+        path = engine.path(s, d)
+        assert path[0] == s and path[-1] == d
+        assert len(path) - 1 == engine.dist[s][d]
+        for a, b in zip(path, path[1:]):
+            assert engine.next_hops(a)[d] == b
+
+
+def test_path_to_self_and_to_unreachable():
+    engine = DynamicShortestPaths()
+    engine.rebuild([1, 2, 3], both_ways([(1, 2)]))
+    assert engine.path(1, 1) == [1]
+    assert engine.path(1, 2) == [1, 2]
+    assert engine.path(1, 3) == []
+    assert engine.path(1, 4) == []
+
+
+def test_rebuild_does_not_depend_on_the_link_order():
+    rng = random.Random(7)
+    switches, links = grid(4)
+    weights = {link: 1 + (link[0] + link[1]) % 3 for link in links}
+    engine = DynamicShortestPaths()
+    engine.rebuild(switches, links, weights)
+    trees = engine.dist, engine.pre, engine.hop
+
+    assert engine.rebuild(switches[::-1], rng.sample(links, len(links)), weights) == {}
+    assert (engine.dist, engine.pre, engine.hop) == trees
+    for s, d in itertools.product(switches, repeat=2):
+        assert len(engine.path(s, d)) > 0
+
+
+def test_loop_free_alternates():
+    # Triangle: 3 reaches 2 directly, without coming back through 1
+    engine = DynamicShortestPaths()
+    engine.rebuild([1, 2, 3], both_ways([(1, 2), (2, 3), (1, 3)]))
+    assert engine.loop_free_alternates(1, 2) == [3]
+    assert engine.loop_free_alternates(1, 1) == []
+
+    # Square: the shortest path of 4 towards 2 may go back through 1
+    engine.rebuild([1, 2, 3, 4], both_ways([(1, 2), (2, 3), (3, 4), (4, 1)]))
+    assert engine.loop_free_alternates(1, 2) == []
+    assert engine.equal_cost_hops(1, 3) == [2, 4]
@@ -0,0 +1,72 @@
+import logging
+
+import pytest
+
+pytest.importorskip('ryu')
+
+from ryu.lib import hub  # noqa: E402
+
+import route_worker  # noqa: E402
+from route_worker import RouteOffloader, RouteTable, TopologySnapshot, compute_routes  # noqa: E402
+
+
+def square(epoch):
+    """1-2-3-4-1, two equal cost paths between opposite corners"""
+    links = []
+    for u, v in ((1, 2), (2, 3), (3, 4), (4, 1)):
+        links += [(u, v), (v, u)]
+    return TopologySnapshot(epoch, (1, 2, 3, 4), tuple(links), tuple((link, 1) for link in links))
+
+
+@pytest.fixture(autouse=True)
+def fresh_engine(monkeypatch):
+    monkeypatch.setattr(route_worker, '_engine', None)
+    monkeypatch.setattr(route_worker, '_engine_epoch', None)
+
+
+def test_table_answers_multipath_queries_from_the_workers():
+    table = RouteTable()
+    table.apply(compute_routes('incremental', None, square(1), ecmp=True, fast_failover=True))
+    assert table.equal_cost_hops(1, 3) == [2, 4]
+    assert table.equal_cost_hops(1, 2) == [2]
+    assert table.loop_free_alternates(1, 3) == []
+    assert table.path(1, 3) in ([1, 2, 3], [1, 4, 3])
+
+
+def test_table_answers_loop_free_alternates_from_the_workers():
+    links = ((1, 2), (2, 1), (2, 3), (3, 2), (1, 3), (3, 1))
+    triangle = TopologySnapshot(1, (1, 2, 3), links, tuple((link, 1) for link in links))
+    table = RouteTable()
+    table.apply(compute_routes('incremental', None, triangle, fast_failover=True))
+    assert table.equal_cost_hops(1, 2) == [2]
+    assert table.loop_free_alternates(1, 2) == [3]
+
+
+def test_multipath_sets_are_only_sent_when_asked():
+    result = compute_routes('incremental', None, square(1))
+    assert result.ecmp == {} and result.alternates == {}
+    table = RouteTable()
+    table.apply(result)
+    assert len(table.equal_cost_hops(1, 3)) == 1
+
+
+def test_offloader_delivers_on_the_ryu_hub():
+    delivered = []
+    done = hub.Event()
+
+    def on_result(changed, context):
+        delivered.append((changed, context))
+        done.set()
+
+    offloader = RouteOffloader(1, 'incremental', on_result, logging.getLogger(__name__))
+    try:
+        offloader.submit(square(1), 'context')
+        assert done.wait(timeout=60)
+        changed, context = delivered[0]
+        assert context == 'context'
+        assert changed[(1, 2)] == (None, 2)
+        assert offloader.table.epoch == 1
+        assert offloader.table.path(1, 2) == [1, 2]
+        assert offloader.pending == []
+    finally:
+        offloader.shutdown()
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+import sparse_paths
+
+pytestmark = pytest.mark.skipif(not sparse_paths.available(), reason="needs numpy and scipy")
+
+
+def both_ways(edges):
+    return [(u, v) for a, b in edges for u, v in ((a, b), (b, a))]
+
+
+def ports(links):
+    link_port_dict = {}
+    for u, v in links:
+        link_port_dict.setdefault(u, {})[v] = v
+    return link_port_dict
+
+
+def sync(engine, switches, links):
+    return dict(engine.sync(switches, links, ports(links)))
+
+
+def test_removed_next_hop_switch_is_reported():
+    engine = sparse_paths.SparsePaths()
+    links = both_ways([(1, 2), (2, 3)])
+    sync(engine, [1, 2, 3], links)
+
+    changed = sync(engine, [1, 3], [])
+    assert changed[(1, 3)] == (2, None)
+    assert changed[(3, 1)] == (2, None)
+    assert engine.path(1, 3) == []
+
+
+def test_changes_are_exactly_the_next_hops_that_differ():
+    rng = random.Random(7)
+    engine = sparse_paths.SparsePaths()
+    switches, edges = list(range(1, 9)), set()
+    for _ in range(300):
+        a, b = rng.sample(range(1, 11), 2)
+        edges ^= {(min(a, b), max(a, b))}
+        if rng.random() < 0.2:
+            switches = sorted(rng.sample(range(1, 11), rng.randint(2, 10)))
+        links = both_ways([(a, b) for a, b in edges if a in switches and b in switches])
+        before = {s: engine.next_hops(s) for s in switches}
+        changed = sync(engine, switches, links)
+        expected = {}
+        for s in switches:
+            for d in switches:
+                old, new = before[s].get(d), engine.next_hops(s).get(d)
+                if old != new:
+                    expected[(s, d)] = (old, new)
+        assert changed == expected
@@ -0,0 +1,23 @@
+from network_state import NetworkState
+from state_store import StateStore
+
+
+def test_saved_state_is_loaded_back(tmp_path):
+    path = str(tmp_path / 'state.db')
+    state = NetworkState().add_switch(1).add_switch(2).add_link(1, 2, 3).add_link(2, 1, 4)
+    state = state.add_host('00:00:00:00:00:01', 1, 5, ['10.0.0.1', '10.0.1.1'])
+    state = state.add_host('00:00:00:00:00:02', 2, 5)
+    store = StateStore(path)
+    assert store.save(state) == 6
+    assert store.save(state) == 0
+
+    # Only the rows that changed are written
+    changed = state.remove_host('00:00:00:00:00:02').add_link(1, 2, 6)
+    assert store.save(changed) == 2
+    store.close()
+
+    loaded = StateStore(path).load()
+    assert loaded.switches == changed.switches
+    assert dict(loaded.links) == dict(changed.links)
+    assert dict(loaded.hosts) == dict(changed.hosts)
+    assert dict(loaded.addresses) == dict(changed.addresses)
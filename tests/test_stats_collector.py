@@ -0,0 +1,79 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('ryu')
+
+from ryu.lib import hub  # noqa: E402
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser  # noqa: E402
+
+import ofctl_utils  # noqa: E402
+from stats_collector import StatsCollector  # noqa: E402
+
+MORE = ofproto_v1_3.OFPMPF_REPLY_MORE
+
+
+class Datapath():
+    """Answers every stats request with the given parts, from another green thread"""
+
+    def __init__(self, dpid, collector, parts, log):
+        self.id = dpid
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.xid = 0
+        self.collector = collector
+        self.parts = parts  # [(flags, body)] of the reply
+        self.log = log
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+
+    def send_msg(self, msg):
+        self.log.append(('request', self.id))
+        hub.spawn(self.reply, msg.xid)
+
+    def reply(self, xid):
+        hub.sleep(0.01)
+        self.log.append(('reply', self.id))
+        for flags, body in self.parts:
+            self.collector.handle_reply(SimpleNamespace(datapath=self, xid=xid, flags=flags, body=body))
+
+
+@pytest.fixture
+def collector(monkeypatch):
+    monkeypatch.setattr(ofctl_utils, 'OFP_REPLY_TIMER', 0.2)
+    return StatsCollector(logging.getLogger(__name__))
+
+
+def test_requests_go_out_at_once_and_multipart_replies_are_joined(collector):
+    log = []
+    dps = [Datapath(1, collector, [(MORE, ['a', 'b']), (0, ['c'])], log),
+           Datapath(2, collector, [(0, ['d'])], log),
+           Datapath(3, collector, [(0, [])], log)]
+    snapshot = collector.collect(dps, 'port')
+
+    assert [event for event, _ in log[:3]] == ['request'] * 3
+    assert snapshot.kind == 'port' and snapshot.timeouts == ()
+    assert snapshot.bodies == {1: ['a', 'b', 'c'], 2: ['d'], 3: []}
+    assert set(snapshot.latency) == {1, 2, 3}
+    assert collector.latest['port'] is snapshot
+    assert collector.waiters == {1: {}, 2: {}, 3: {}}
+    assert collector.switches[1].requests == 1 and collector.switches[1].timeouts == 0
+
+
+def test_silent_switches_and_unfinished_replies_time_out(collector):
+    log = []
+    dps = [Datapath(1, collector, [(0, ['a'])], log),
+           Datapath(2, collector, [], log),
+           Datapath(3, collector, [(MORE, ['b'])], log)]
+    snapshot = collector.collect(dps, 'flow')
+
+    assert snapshot.bodies == {1: ['a']}
+    assert snapshot.timeouts == (2, 3)
+    assert collector.switches[2].timeouts == 1 and collector.switches[2].mean_latency() == 0.0
+
+    # The rest of a reply that timed out is dropped
+    collector.handle_reply(SimpleNamespace(datapath=dps[2], xid=1, flags=0, body=['c']))
+    assert collector.waiters[3] == {}